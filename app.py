@@ -1,97 +1,115 @@
-from flask import Flask, request, redirect, url_for, send_file, current_app, render_template
+import time
+
+_inicio_import = time.perf_counter()
+
+from flask import Flask, request, current_app
 import os
 import json
 from datetime import datetime
 
-# Importación de servicios y librerías
-import firebase_admin
-from firebase_admin import credentials, firestore
-import mercadopago
-
-# Importación de Blueprints (Rutas)
-from routes.admin_routes import admin_bp
-from routes.wizard_routes import wizard_bp
-from routes.shop_routes import shop_bp 
+from services import arranque
+from services import clientes
 
 # ----------------------------------------------------
-# 1. INICIALIZACIÓN DE COMPONENTES GLOBALES
+# 1. FÁBRICA DE LA APLICACIÓN
 # ----------------------------------------------------
+# Importar la app no abre conexiones ni carga librerías pesadas: Firestore y
+# Mercado Pago se crean en el primer request de cada proceso (services/clientes.py)
+# y firebase_admin, mercadopago y PIL se importan en su primer uso. Es seguro con
+# gunicorn --preload (app:app) y también se puede usar "app:create_app()".
 
-# 🔐 Inicialización segura de Firebase
-try:
-    cred_dict = json.loads(os.getenv("FIREBASE_CREDENTIALS_JSON"))
-    cred = credentials.Certificate(cred_dict)
-    firebase_admin.initialize_app(cred)
-    db_client = firestore.client()
-    print("✅ Firebase inicializado")
-except Exception as e:
-    db_client = None
-    print(f"❌ Error CRÍTICO al cargar JSON de Firebase: {e}") 
-    
-# 🔑 Inicialización segura de Mercado Pago
-access_token = os.getenv("MERCADO_PAGO_TOKEN")
-sdk = mercadopago.SDK(access_token.strip()) if access_token and isinstance(access_token, str) else None
-if sdk:
-    print("✅ SDK de Mercado Pago inicializado globalmente")
-else:
-    print("⚠️ MERCADO_PAGO_TOKEN no configurado, SDK no inicializado")
-    
-# ----------------------------------------------------
-# 2. CONFIGURACIÓN DE FLASK
-# ----------------------------------------------------
+def create_app(config: dict = None) -> Flask:
+    inicio = time.perf_counter()
+    app = Flask(__name__)
 
-app = Flask(__name__)
+    # Configuración de seguridad y directorios
+    app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
+    app.secret_key = os.getenv("FLASK_SECRET_KEY") or "clave-secreta-temporal"
+    app.config['SESSION_COOKIE_SECURE'] = not app.debug
+    app.config['UPLOAD_FOLDER'] = 'static/img'
+    # "commit": el sitio completo se publica en un único commit (Git Data API)
+    # "archivos": un PUT por archivo con la contents API (modo anterior)
+    app.config['GITHUB_MODO_PUBLICACION'] = os.getenv("GITHUB_MODO_PUBLICACION") or "commit"
+    # Config web de Firebase (JSON público) que preview.html usa para el listener en vivo
+    app.config['FIREBASE_WEB_CONFIG'] = json.loads(os.getenv("FIREBASE_WEB_CONFIG_JSON") or "{}")
 
-# Configuración de seguridad y directorios
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024 
-app.secret_key = os.getenv("FLASK_SECRET_KEY") or "clave-secreta-temporal"
-app.config['SESSION_COOKIE_SECURE'] = not app.debug
-app.config['UPLOAD_FOLDER'] = 'static/img'
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    # 💡 CLAVE: los clientes globales se resuelven en el primer request (ver _clientes_perezosos).
+    # Quien los pase ya construidos en `config` (p. ej. el benchmark) los usa tal cual.
+    app.config['DB_CLIENT'] = None
+    app.config['MP_SDK'] = None
+    app.config.update(config or {})
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-# 💡 CLAVE: GUARDAR LOS CLIENTES GLOBALES
-app.config['DB_CLIENT'] = db_client
-app.config['MP_SDK'] = sdk
+    # Índice de versiones de imágenes para el filtro imgver (sin stat por render)
+    img_index = arranque.importar("services.img_index")
+    if 'IMG_INDEX' not in (config or {}):
+        app.config['IMG_INDEX'] = img_index.IndiceImagenes(
+            app.config['UPLOAD_FOLDER'],
+            intervalo_rescan=float(os.getenv("IMGVER_RESCAN_SEGUNDOS", "300")),
+            modo=os.getenv("IMGVER_MODO") or "mtime",
+        )
+        app.config['IMG_INDEX'].construir()
 
-# ----------------------------------------------------
-# 3. REGISTRO DE RUTAS (BLUEPRINTS)
-# ----------------------------------------------------
+    # Carpetas de uploads por usuario y su barrido en segundo plano (ver services/almacen_uploads.py)
+    almacen_uploads = arranque.importar("services.almacen_uploads")
+    if 'UPLOADS' not in (config or {}):
+        app.config['UPLOADS'] = almacen_uploads.AlmacenUploads(app.config['UPLOAD_FOLDER'], indice=app.config['IMG_INDEX'])
 
-app.register_blueprint(admin_bp)
-app.register_blueprint(wizard_bp)
-app.register_blueprint(shop_bp) 
+    # ------------------------------------------------
+    # 2. REGISTRO DE RUTAS (BLUEPRINTS)
+    # ------------------------------------------------
+    # Importados acá (y medidos) para que el reporte de arranque muestre el costo de cada uno
+    # metricas_bp va primero: su before_request arranca el reloj antes que los demás hooks
+    for modulo, blueprint in (("routes.metricas_routes", "metricas_bp"),
+                              ("routes.admin_routes", "admin_bp"),
+                              ("routes.wizard_routes", "wizard_bp"),
+                              ("routes.shop_routes", "shop_bp")):
+        app.register_blueprint(getattr(arranque.importar(modulo), blueprint))
 
-# ----------------------------------------------------
-# 4. FUNCIONES ÚNICAS DE HOOKS Y FILTROS
-# ----------------------------------------------------
+    # ------------------------------------------------
+    # 3. FUNCIONES ÚNICAS DE HOOKS Y FILTROS
+    # ------------------------------------------------
+
+    @app.before_request
+    def _clientes_perezosos():
+        # Primer request de cada worker: recién acá se conecta a Firestore (después del fork)
+        if app.config.get('DB_CLIENT') is None:
+            app.config['DB_CLIENT'] = clientes.obtener_db()
+
+    # Filtro imgver
+    @app.template_filter('imgver')
+    def imgver_filter(name):
+        # Lookup en el índice en memoria (ver services/img_index.py), sin syscalls por render
+        indice = current_app.config['IMG_INDEX']
+        indice.asegurar_rescan()
+        return indice.version(name)
+
+    # Handler after_request
+    @app.after_request
+    def cache(response):
+        if request.path.startswith("/static/img"):
+            one_year_seconds = 31536000
+            response.headers['Cache-Control'] = f'public, max-age={one_year_seconds}, immutable'
+            response.headers['Expires'] = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
 
-# Filtro imgver
-@app.template_filter('imgver')
-def imgver_filter(name):
-    # Usa current_app para acceder a UPLOAD_FOLDER
-    try:
-        return int(os.path.getmtime(os.path.join(current_app.config['UPLOAD_FOLDER'], name))) % 10_000
-    except Exception:
-        return 0
-        
-# Handler after_request
-@app.after_request
-def cache(response):
-    if request.path.startswith("/static/img"):
-        one_year_seconds = 31536000
-        response.headers['Cache-Control'] = f'public, max-age={one_year_seconds}, immutable'
-        response.headers['Expires'] = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
-    
-    if not request.path.startswith("/static/"):
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        
-    return response
+        # Las vistas que definen su propia política (p.ej. /preview pública con ETag) se respetan
+        if not request.path.startswith("/static/") and 'Cache-Control' not in response.headers:
+            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+            response.headers['Pragma'] = 'no-cache'
+            response.headers['Expires'] = '0'
+
+        return response
+
+    arranque.registrar("create_app", (time.perf_counter() - inicio) * 1000, "fabrica")
+    print(f"⏱️ App creada en {(time.perf_counter() - inicio) * 1000:.0f} ms; imports: {arranque.resumen()}")
+    return app
 
 # ----------------------------------------------------
-# 5. INICIO DE LA APLICACIÓN
+# 4. INICIO DE LA APLICACIÓN
 # ----------------------------------------------------
 
+arranque.registrar("app (flask y servicios base)", (time.perf_counter() - _inicio_import) * 1000, "arranque")
+app = create_app()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
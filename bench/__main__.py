@@ -0,0 +1,103 @@
+import argparse
+import json
+import sys
+
+from bench.escenarios import ESCENARIOS, SIN_TAMANO, Entorno
+
+# ----------------------------------------------------
+# CLI DEL BENCHMARK
+# ----------------------------------------------------
+# python -m bench                                  (todo, 10/1000/10000 productos)
+# python -m bench -e preview,admin -p 1000 -c 8 --latencia-firestore-ms 5
+# python -m bench --json base.json                 (guardar resultados)
+# python -m bench --comparar base.json             (marcar regresiones contra una corrida anterior)
+
+
+def _lista(texto: str, tipo=str) -> list:
+    return [tipo(x) for x in texto.split(",") if x.strip()]
+
+
+def _tabla(resultados: list):
+    columnas = ("escenario", "n", "concurrencia", "errores", "p50_ms", "p95_ms", "p99_ms", "max_ms", "req_s")
+    anchos = [max(len(c), *(len(str(r[c])) for r in resultados)) for c in columnas]
+    print("  ".join(c.ljust(a) for c, a in zip(columnas, anchos)))
+    print("  ".join("-" * a for a in anchos))
+    for r in resultados:
+        print("  ".join(str(r[c]).ljust(a) for c, a in zip(columnas, anchos)))
+        if r.get("etapas_p50_ms"):
+            print(f"    etapas p50: {r['etapas_p50_ms']}")
+        if r.get("por_imagen"):
+            print(f"    por imagen: {r['por_imagen']}")
+        if "pico_mb" in r:
+            print(f"    pico de memoria: {r['pico_mb']} MB")
+        if "drenado_ms" in r:
+            print(f"    cola drenada en {r['drenado_ms']} ms: {r['cola']['por_estado']}")
+        if r.get("primer_error"):
+            print(f"    ❌ {r['primer_error']}")
+
+
+def _comparar(resultados: list, ruta_base: str, umbral: float) -> int:
+    """Imprime la variación contra la corrida base. Devuelve la cantidad de regresiones."""
+    with open(ruta_base, encoding="utf-8") as f:
+        base = {r["escenario"]: r for r in json.load(f)["resultados"]}
+    regresiones = 0
+    print(f"\nComparación contra {ruta_base} (umbral {umbral:.0%}):")
+    for r in resultados:
+        anterior = base.get(r["escenario"])
+        if anterior is None:
+            continue
+        delta_p95 = (r["p95_ms"] - anterior["p95_ms"]) / anterior["p95_ms"] if anterior["p95_ms"] else 0.0
+        delta_rps = (r["req_s"] - anterior["req_s"]) / anterior["req_s"] if anterior["req_s"] else 0.0
+        regresion = delta_p95 > umbral or delta_rps < -umbral
+        regresiones += regresion
+        marca = "⚠️ " if regresion else "✅"
+        print(f"  {marca} {r['escenario']}: p95 {anterior['p95_ms']} -> {r['p95_ms']} ms ({delta_p95:+.1%}), "
+              f"req/s {anterior['req_s']} -> {r['req_s']} ({delta_rps:+.1%})")
+    return regresiones
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark offline (Firestore y GitHub falsos).")
+    parser.add_argument("-e", "--escenarios", default=",".join(ESCENARIOS), help="Lista separada por comas")
+    parser.add_argument("-p", "--productos", default="10,1000,10000", help="Tamaños de catálogo")
+    parser.add_argument("-n", "--repeticiones", type=int, default=50)
+    parser.add_argument("-c", "--concurrencia", type=int, default=8)
+    parser.add_argument("--latencia-firestore-ms", type=float, default=0.0)
+    parser.add_argument("--latencia-github-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-github-ms", type=float, default=10.0)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    parser.add_argument("--comparar", help="JSON de una corrida anterior")
+    parser.add_argument("--umbral", type=float, default=0.10, help="Variación que cuenta como regresión")
+    args = parser.parse_args(argv)
+
+    escenarios = _lista(args.escenarios)
+    desconocidos = [e for e in escenarios if e not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)} (hay: {', '.join(ESCENARIOS)})")
+
+    entorno = Entorno(args.latencia_firestore_ms, args.latencia_github_ms, args.jitter_github_ms)
+    resultados = []
+    try:
+        for nombre in escenarios:
+            tamanos = [0] if nombre in SIN_TAMANO else _lista(args.productos, int)
+            for productos in tamanos:
+                print(f"⏱️ {nombre}" + (f" con {productos} productos" if nombre not in SIN_TAMANO else ""), file=sys.stderr)
+                resultados.extend(ESCENARIOS[nombre](entorno, productos, args.repeticiones, args.concurrencia))
+    finally:
+        entorno.cerrar()
+
+    print()
+    _tabla(resultados)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"parametros": vars(args), "resultados": resultados}, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.json}")
+
+    errores = sum(r["errores"] for r in resultados)
+    regresiones = _comparar(resultados, args.comparar, args.umbral) if args.comparar else 0
+    return 1 if errores or regresiones else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,635 @@
+import io
+import os
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.fake_firestore import FakeFirestore
+from bench.fake_github import FakeGitHub
+from bench.fake_mercadopago import FakeMercadoPago
+
+# ----------------------------------------------------
+# ENTORNO DEL BENCHMARK
+# ----------------------------------------------------
+# La app se importa recién después de apuntar GitHub al stand-in local y las
+# bases sqlite (índice de publicación, cola de trabajos) a un directorio
+# temporal: nada del benchmark toca la red ni el static/img del repo.
+
+EMAIL = "bench@tienda.com"
+REPO = "appweb-bench"
+# Lo que step1/step2 dejan en usuarios/<email>/config/general (preview.html lo necesita)
+CONFIG_TIENDA = {
+    "titulo": "Tienda Bench",
+    "descripcion": "Catálogo sintético",
+    "estilo_visual": "Minimalista",
+    "fuente": "Roboto",
+    "logo": None,
+    "whatsapp": "5491100000000",
+    "instagram": "tienda.bench",
+    "facebook": "",
+    "sobre_mi": "",
+    "ubicacion": "",
+    "link_mapa": "",
+    "url": "",
+    "mercado_pago": False,
+    "public_key": "",
+}
+
+
+class Entorno:
+    def __init__(self, latencia_firestore_ms: float = 0.0, latencia_github_ms: float = 0.0,
+                 jitter_github_ms: float = 0.0):
+        self.directorio = tempfile.mkdtemp(prefix="bench-")
+        self.github = FakeGitHub(latencia_ms=latencia_github_ms, jitter_ms=jitter_github_ms, rate_limit=10 ** 9)
+        self.github.iniciar()
+        self.mercadopago = FakeMercadoPago(latencia_ms=latencia_github_ms, jitter_ms=jitter_github_ms)
+        self.mercadopago.iniciar()
+        os.environ["GITHUB_API_URL"] = self.github.url
+        os.environ.setdefault("GITHUB_TOKEN", "token-bench")
+        # El stand-in no limita: sin pacing del cliente de GitHub se mide sólo la app
+        os.environ.setdefault("GITHUB_TASA", "1000000")
+        os.environ.setdefault("GITHUB_ESCRITURAS_POR_MINUTO", "1000000")
+        os.environ["MERCADO_PAGO_API_URL"] = self.mercadopago.url
+        os.environ["MERCADO_PAGO_TOKEN"] = "TEST-token-bench"
+        os.environ["PUBLICACIONES_DB"] = os.path.join(self.directorio, "publicaciones.sqlite3")
+        os.environ["PUBLICACION_JOBS_DB"] = os.path.join(self.directorio, "jobs.sqlite3")
+        os.environ["PAGOS_MP_DB"] = os.path.join(self.directorio, "pagos_mp.sqlite3")
+
+        raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if raiz not in sys.path:
+            sys.path.insert(0, raiz)
+        from app import create_app
+        from services.img_index import IndiceImagenes
+
+        self.raiz = raiz
+        self.db = FakeFirestore(latencia_ms=latencia_firestore_ms)
+        self.carpeta = os.path.join(self.directorio, "img")
+        os.makedirs(self.carpeta)
+        self.app = create_app({
+            "DB_CLIENT": self.db,
+            "UPLOAD_FOLDER": self.carpeta,
+            "IMG_INDEX": IndiceImagenes(self.carpeta, intervalo_rescan=0),
+            "TESTING": True,
+        })
+        self.db.collection("usuarios").document(EMAIL).collection("config").document("general").set(CONFIG_TIENDA)
+
+    def cerrar(self):
+        self.github.detener()
+        self.mercadopago.detener()
+        shutil.rmtree(self.directorio, ignore_errors=True)
+
+    def cliente(self, admin: bool = False):
+        """Test client con la sesión de la tienda del benchmark (y admin si se pide)."""
+        cliente = self.app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion["email"] = EMAIL
+            sesion["repo_nombre"] = REPO
+            if admin:
+                sesion["logged_in"] = True
+        return cliente
+
+    def sembrar_catalogo(self, cantidad: int) -> list:
+        """Carga `cantidad` productos directo en el Firestore falso. Devuelve sus id_base."""
+        from services import firebase_service as fbs
+
+        productos_ref = self.db.collection("usuarios").document(EMAIL).collection("productos")
+        for doc in list(productos_ref.stream()):
+            doc.reference.delete()
+        ids, base = [], time.time()
+        for inicio in range(0, cantidad, 500):
+            batch = self.db.batch()
+            for i in range(inicio, min(inicio + 500, cantidad)):
+                producto = producto_sintetico(i)
+                doc_id, doc = fbs._armar_doc(producto, REPO, base + i * 1e-6)
+                batch.set(productos_ref.document(doc_id), doc)
+                ids.append(doc["id_base"])
+            batch.commit()
+        fbs.invalidar_catalogo(EMAIL)
+        return ids
+
+    def reiniciar_contadores(self):
+        self.db.reiniciar_estadisticas()
+        self.github.reiniciar_estadisticas()
+        self.mercadopago.reiniciar_estadisticas()
+
+    def contadores(self) -> dict:
+        return {"firestore": self.db.estadisticas(), "github": self.github.estadisticas(),
+                "mercadopago": self.mercadopago.estadisticas()}
+
+
+def producto_sintetico(i: int) -> dict:
+    return {
+        "id_base": f"prod-{i:06d}",
+        "nombre": f"Producto {i}",
+        "grupo": f"Grupo {i % 7}",
+        "subgrupo": f"Sub {i % 3}",
+        "precio": str(1000 + (i * 37) % 9000),
+        "talles_stock": '{"S": 3, "M": 5, "L": 2}',
+        "imagen_github": f"optimizado_{EMAIL}_{i:016x}_card.webp",
+        "orden": str(i % 50),
+    }
+
+
+def formulario_productos(cantidad: int, variacion: int = 0) -> dict:
+    """Campos de step3.html para `cantidad` productos (variacion cambia algunos precios)."""
+    form = {}
+    for i in range(cantidad):
+        p = producto_sintetico(i)
+        if variacion and i % 100 == 0:
+            p["precio"] = str(float(p["precio"]) + variacion)
+        form.update({
+            f"nombre_{i}": p["nombre"], f"grupo_{i}": p["grupo"], f"subgrupo_{i}": p["subgrupo"],
+            f"precio_{i}": p["precio"], f"talles_{i}": p["talles_stock"],
+            f"imagen_github_{i}": p["imagen_github"], f"id_base_{i}": p["id_base"], f"orden_{i}": p["orden"],
+        })
+    return form
+
+
+def imagen_jpeg(semilla: int, ancho: int = 1600, alto: int = 1200) -> bytes:
+    from PIL import Image
+
+    rnd = random.Random(semilla)
+    imagen = Image.new("RGB", (ancho, alto), (rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)))
+    # Algo de detalle para que el encoder trabaje como con una foto
+    for _ in range(200):
+        x, y = rnd.randrange(ancho - 50), rnd.randrange(alto - 50)
+        imagen.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), (x, y, x + 50, y + 50))
+    salida = io.BytesIO()
+    imagen.save(salida, "JPEG", quality=90)
+    return salida.getvalue()
+
+# ----------------------------------------------------
+# MEDICIÓN
+# ----------------------------------------------------
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p / 100.0
+    piso, techo = int(k), min(int(k) + 1, len(ordenados) - 1)
+    return ordenados[piso] + (ordenados[techo] - ordenados[piso]) * (k - piso)
+
+
+def medir(entorno: Entorno, nombre: str, operacion, repeticiones: int, concurrencia: int = 1,
+          admin: bool = False, calentamiento: int = 1, preparar=None) -> dict:
+    """
+    Corre `operacion(cliente, i)` `repeticiones` veces repartidas en `concurrencia` hilos
+    (un test client por hilo). La operación devuelve True si la respuesta fue la esperada.
+    `preparar(i)`, si se pasa, corre antes de cada repetición fuera de la medición.
+    """
+    local = threading.local()
+
+    def cliente():
+        if getattr(local, "cliente", None) is None:
+            local.cliente = entorno.cliente(admin=admin)
+        return local.cliente
+
+    for i in range(calentamiento):
+        operacion(cliente(), -1 - i)
+    entorno.reiniciar_contadores()
+
+    latencias, errores = [], []
+    lock = threading.Lock()
+
+    def una(i):
+        if preparar is not None:
+            preparar(i)
+        inicio = time.perf_counter()
+        try:
+            ok = operacion(cliente(), i)
+            error = None if ok else "respuesta inesperada"
+        except Exception as e:
+            ok, error = False, f"{type(e).__name__}: {e}"
+        duracion = (time.perf_counter() - inicio) * 1000
+        with lock:
+            latencias.append(duracion)
+            if not ok:
+                errores.append(error)
+
+    inicio_total = time.perf_counter()
+    if concurrencia <= 1:
+        for i in range(repeticiones):
+            una(i)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            list(pool.map(una, range(repeticiones)))
+    total = time.perf_counter() - inicio_total
+
+    return {
+        "escenario": nombre,
+        "n": repeticiones,
+        "concurrencia": concurrencia,
+        "errores": len(errores),
+        "primer_error": errores[0] if errores else None,
+        "p50_ms": round(percentil(latencias, 50), 2),
+        "p90_ms": round(percentil(latencias, 90), 2),
+        "p95_ms": round(percentil(latencias, 95), 2),
+        "p99_ms": round(percentil(latencias, 99), 2),
+        "max_ms": round(max(latencias), 2) if latencias else 0.0,
+        "media_ms": round(statistics.fmean(latencias), 2) if latencias else 0.0,
+        "req_s": round(repeticiones / total, 2) if total else 0.0,
+        "contadores": entorno.contadores(),
+    }
+
+# ----------------------------------------------------
+# ESCENARIOS
+# ----------------------------------------------------
+
+def escenario_preview(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """/preview con catálogo frío (lectura + render), caliente (cache) y revalidación 304."""
+    from services import firebase_service as fbs
+
+    entorno.sembrar_catalogo(productos)
+    resultados = []
+
+    def frio(cliente, i):
+        fbs.invalidar_catalogo(EMAIL)
+        return cliente.get("/preview").status_code == 200
+
+    def caliente(cliente, i):
+        return cliente.get("/preview").status_code == 200
+
+    etag = entorno.cliente().get("/preview").headers.get("ETag")
+
+    def revalidacion(cliente, i):
+        return cliente.get("/preview", headers={"If-None-Match": etag}).status_code == 304
+
+    # El frío serializa sobre el mismo catálogo: se mide sin concurrencia
+    resultados.append(medir(entorno, f"preview_frio[{productos}]", frio, max(3, repeticiones // 5)))
+    resultados.append(medir(entorno, f"preview_cache[{productos}]", caliente, repeticiones, concurrencia))
+    resultados.append(medir(entorno, f"preview_304[{productos}]", revalidacion, repeticiones, concurrencia))
+    return resultados
+
+
+def _esperar_trabajo(job_id: str, timeout: float = 600.0) -> dict:
+    from routes.wizard_routes import cola_publicacion
+
+    limite = time.time() + timeout
+    while time.time() < limite:
+        estado = cola_publicacion.estado(job_id)
+        if estado and estado["estado"] in ("ok", "error"):
+            return estado
+        time.sleep(0.02)
+    raise TimeoutError(f"Publicación {job_id} no terminó en {timeout}s")
+
+
+def escenario_contenido(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """
+    POST /contenido con N productos: latencia de encolado (202) y de punta a punta
+    (hasta que el trabajo termina), primero completa y después republicación con pocos cambios.
+    """
+    from services import publish_snapshot as pss
+
+    resultados = []
+    repeticiones = max(1, repeticiones if productos <= 1000 else min(repeticiones, 3))
+    etapas = {}
+
+    def publicar(variacion_fija=None):
+        def operacion(cliente, i):
+            variacion = variacion_fija if variacion_fija is not None else i + 2
+            form = formulario_productos(productos, variacion)
+            r = cliente.post("/contenido", data=form, headers={"Accept": "application/json"})
+            if r.status_code != 202:
+                return False
+            estado = _esperar_trabajo(r.get_json()["job_id"])
+            for etapa in estado["etapas"]:
+                etapas.setdefault(etapa["nombre"], []).append(etapa["duracion_ms"] or 0.0)
+            return estado["estado"] == "ok"
+        return operacion
+
+    def encolar(cliente, i):
+        r = cliente.post("/contenido", data=formulario_productos(productos), headers={"Accept": "application/json"})
+        return r.status_code == 202
+
+    # Publicación completa: tienda vacía y sin snapshot previo del repo
+    def desde_cero(i):
+        from services import github_service as ghs
+        entorno.sembrar_catalogo(0)
+        pss.snapshots.guardar(REPO, {"base_time": None, "productos": {}, "render": None, "artefactos": {}})
+        ghs.indice_publicacion.olvidar(REPO)
+
+    resultados.append(medir(entorno, f"contenido_completa[{productos}]", publicar(0), repeticiones,
+                            calentamiento=0, preparar=desde_cero))
+    resultados[-1]["etapas_p50_ms"] = {k: round(percentil(v, 50), 2) for k, v in etapas.items()}
+    etapas.clear()
+    resultados.append(medir(entorno, f"contenido_incremental[{productos}]", publicar(), repeticiones, calentamiento=0))
+    resultados[-1]["etapas_p50_ms"] = {k: round(percentil(v, 50), 2) for k, v in etapas.items()}
+    resultados.append(medir(entorno, f"contenido_encolar[{productos}]", encolar, repeticiones, concurrencia,
+                            calentamiento=0))
+    # Vaciar la cola antes del siguiente escenario
+    from routes.wizard_routes import cola_publicacion
+    while cola_publicacion._conexion().execute(
+            "SELECT COUNT(*) FROM trabajos WHERE estado IN ('pendiente', 'en_curso')").fetchone()[0]:
+        time.sleep(0.05)
+    return resultados
+
+
+def escenario_upload(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """/upload-image con imágenes distintas (codifica variantes) y repetidas (deduplicadas por hash)."""
+    imagenes = [imagen_jpeg(i) for i in range(min(repeticiones, 16))]
+    repetida = imagen_jpeg(10 ** 6)
+
+    def subir(contenido):
+        def operacion(cliente, i):
+            datos = {"imagen": (io.BytesIO(contenido(i)), "foto.jpg")}
+            r = cliente.post("/upload-image", data=datos, content_type="multipart/form-data")
+            return r.status_code == 200 and r.get_json().get("ok")
+        return operacion
+
+    def distinta(i):
+        # Cada repetición es una imagen nueva (mismo tamaño, distinto contenido)
+        base = imagenes[i % len(imagenes)]
+        return base + i.to_bytes(4, "big", signed=True) if i >= len(imagenes) else base
+
+    return [
+        medir(entorno, "upload_nueva", subir(distinta), repeticiones, concurrencia, calentamiento=0),
+        medir(entorno, "upload_repetida", subir(lambda i: repetida), repeticiones, concurrencia),
+    ]
+
+
+def escenario_upload_lote(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """20 imágenes nuevas: un /upload-images contra 20 /upload-image, publicando a GitHub (modo "archivos")."""
+    cantidad = 20
+    imagenes = [imagen_jpeg(i) for i in range(cantidad)]
+
+    def distinta(i, j):
+        # Cada repetición sube imágenes nuevas (mismo tamaño, distinto contenido)
+        return imagenes[j] + (i * cantidad + j).to_bytes(4, "big", signed=True)
+
+    def lote(cliente, i):
+        datos = {"imagenes": [(io.BytesIO(distinta(i, j)), f"foto{j}.jpg") for j in range(cantidad)]}
+        r = cliente.post("/upload-images", data=datos, content_type="multipart/form-data")
+        return r.status_code == 200 and r.get_json().get("correctos") == cantidad
+
+    def individuales(cliente, i):
+        for j in range(cantidad):
+            datos = {"imagen": (io.BytesIO(distinta(10 ** 4 + i, j)), f"foto{j}.jpg")}
+            r = cliente.post("/upload-image", data=datos, content_type="multipart/form-data")
+            if r.status_code != 200 or not r.get_json().get("ok"):
+                return False
+        return True
+
+    modo = entorno.app.config.get("GITHUB_MODO_PUBLICACION")
+    entorno.app.config["GITHUB_MODO_PUBLICACION"] = "archivos"
+    try:
+        resultados = [
+            medir(entorno, f"upload_lote_{cantidad}", lote, repeticiones, concurrencia, calentamiento=0),
+            medir(entorno, f"upload_individual_{cantidad}", individuales, repeticiones, concurrencia,
+                  calentamiento=0),
+        ]
+    finally:
+        entorno.app.config["GITHUB_MODO_PUBLICACION"] = modo
+    # Cada repetición sube `cantidad` imágenes en los dos casos: el costo comparable es por imagen
+    for resultado in resultados:
+        resultado["por_imagen"] = {"p50_ms": round(resultado["p50_ms"] / cantidad, 2),
+                                   "media_ms": round(resultado["media_ms"] / cantidad, 2),
+                                   "imagenes_s": round(resultado["req_s"] * cantidad, 2)}
+    return resultados
+
+
+def escenario_limpieza(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """GET / (descarta los uploads de la sesión) con N archivos de otros usuarios en la carpeta, y un barrido."""
+    almacen = entorno.app.config["UPLOADS"]
+    for i in range(productos):
+        email = f"otro{i // 20}@ejemplo.com"
+        nombre = f"optimizado_{email}_{i:016x}_card.webp"
+        with open(os.path.join(almacen.carpeta(email), nombre), "wb") as f:
+            f.write(b"x" * 256)
+        if i % 20 == 19 or i == productos - 1:
+            almacen.registrar(email, os.listdir(almacen.carpeta(email)))
+
+    def sembrar_propios(i):
+        nombres = []
+        for j in range(10):
+            nombres.append(f"optimizado_{EMAIL}_{j:016x}_card.webp")
+            with open(os.path.join(almacen.carpeta(EMAIL), nombres[-1]), "wb") as f:
+                f.write(b"x" * 256)
+        almacen.registrar(EMAIL, nombres)
+
+    def limpiar(cliente, i):
+        return cliente.get("/").status_code == 200
+
+    resultados = [medir(entorno, "limpieza_get", limpiar, repeticiones, 1, preparar=sembrar_propios)]
+
+    def barrer(cliente, i):
+        return almacen.barrer() is not None
+
+    resultados.append(medir(entorno, "limpieza_barrido", barrer, max(3, repeticiones // 10), calentamiento=0))
+    return resultados
+
+
+def escenario_descarga(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """/descargar (ZIP en streaming) con N productos y 50 imágenes; pico de memoria con tracemalloc."""
+    entorno.sembrar_catalogo(productos)
+    almacen = entorno.app.config["UPLOADS"]
+    for i in range(50):
+        with open(os.path.join(almacen.carpeta(EMAIL), f"optimizado_{EMAIL}_{i:016x}_card.webp"), "wb") as f:
+            f.write(random.Random(i).randbytes(200_000))
+
+    def descargar(cliente, i):
+        r = cliente.get("/descargar", buffered=False)
+        total = sum(len(trozo) for trozo in r.response)
+        r.close()
+        return r.status_code == 200 and total > 0
+
+    resultado = medir(entorno, f"descarga[{productos}]", descargar, repeticiones, concurrencia)
+    # Una descarga más medida aparte: el pico no debería crecer con el catálogo
+    tracemalloc.start()
+    descargar(entorno.cliente(), 0)
+    resultado["pico_mb"] = round(tracemalloc.get_traced_memory()[1] / 1e6, 2)
+    tracemalloc.stop()
+    return [resultado]
+
+
+def escenario_busqueda(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """/buscar sobre un catálogo de N productos: texto exacto, prefijo y filtros de precio/stock."""
+    entorno.sembrar_catalogo(productos)
+    consultas = ["producto 7", "prod 12", "grupo 3 sub", "zzz"]
+
+    def buscar(parametros):
+        def operacion(cliente, i):
+            r = cliente.get("/buscar", query_string={**parametros, "q": consultas[i % len(consultas)]})
+            return r.status_code == 200 and r.get_json().get("ok")
+        return operacion
+
+    return [
+        medir(entorno, f"busqueda[{productos}]", buscar({}), repeticiones, concurrencia),
+        medir(entorno, f"busqueda_filtros[{productos}]",
+              buscar({"precio_min": 2000, "precio_max": 5000, "en_stock": 1}), repeticiones, concurrencia),
+    ]
+
+
+def escenario_admin(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """Rutas de edición del modo admin sobre un catálogo de N productos."""
+    ids = entorno.sembrar_catalogo(productos)
+    rnd = random.Random(7)
+
+    def precio(cliente, i):
+        r = cliente.post("/actualizar-precio", json={"id": rnd.choice(ids), "nuevoPrecio": 1000 + i})
+        return r.status_code == 200
+
+    def talle(cliente, i):
+        r = cliente.post("/actualizar-talle", json={"id": rnd.choice(ids), "agregar": ["XL"], "quitar": ["S"]})
+        return r.status_code == 200
+
+    calientes = ids[:3]  # ráfagas sobre pocos productos: se agrupan en pocas escrituras
+
+    def stock(cliente, i):
+        r = cliente.post("/actualizar-stock", json={"id": calientes[i % len(calientes)], "deltas": {"M": -1, "L": 1}})
+        return r.status_code == 200
+
+    return [
+        medir(entorno, f"admin_precio[{productos}]", precio, repeticiones, concurrencia, admin=True),
+        medir(entorno, f"admin_talle[{productos}]", talle, repeticiones, concurrencia, admin=True),
+        medir(entorno, f"admin_stock[{productos}]", stock, repeticiones, concurrencia, admin=True),
+    ]
+
+
+def escenario_checkout(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """
+    /pagar con carritos de 5 productos: índice de precios caliente y sin índice (cada carrito se
+    lee de Firestore). Los dos casos corren con las mismas repeticiones, concurrencia y carritos.
+    """
+    from services import firebase_service as fbs
+
+    ids = entorno.sembrar_catalogo(max(productos, 5))
+    rnd = random.Random(11)
+
+    # El talle que manda la tienda: la opción que el select de cada tarjeta trae elegida
+    html = entorno.cliente().get("/preview").get_data(as_text=True)
+    talles = dict(re.findall(r'<select id="talle_([^"]+)"[^>]*>\s*<option value="([^"]*)"', html))
+
+    def carrito():
+        return [{"id_base": id_base, "talle": talles.get(id_base, ""), "cantidad": 1, "precio": 1, "nombre": "x"}
+                for id_base in rnd.sample(ids, 5)]
+
+    def pagar(cliente, i):
+        r = cliente.post("/pagar", json={"carrito": carrito()})
+        return r.status_code == 200 and bool(r.get_json().get("preference_id"))
+
+    # Carga el índice como lo haría la visita al preview
+    fbs.ver_productos(entorno.db, EMAIL)
+    resultados = [medir(entorno, f"checkout_indice[{productos}]", pagar, repeticiones, concurrencia)]
+
+    # Sin índice: uno con TTL 0 vence apenas se carga, así ningún hilo ve el que cargó otro
+    # (descartarlo antes de cada pago no alcanza con concurrencia)
+    indice = fbs.indice_precios
+    fbs.indice_precios = fbs.IndicePrecios(ttl=0.0)
+    rnd.seed(11)
+    try:
+        resultados.append(medir(entorno, f"checkout_sin_indice[{productos}]", pagar, repeticiones, concurrencia))
+    finally:
+        fbs.indice_precios = indice
+    return resultados
+
+
+def escenario_webhook(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """
+    Ráfaga de notificaciones de MP con duplicados: cada pago se notifica 4 veces en paralelo.
+    Mide el ack del webhook y el tiempo hasta que la cola aplicó todo; verifica que el stock
+    se descontó exactamente una vez por pago.
+    """
+    from services import mp_service as mps
+    from routes.shop_routes import cola_pagos
+
+    ids = entorno.sembrar_catalogo(max(productos, 1))
+    pagos = [entorno.mercadopago.crear_pago(EMAIL, [
+        {"id": mps.codificar_item_id(ids[i % len(ids)], "M"), "quantity": 1, "unit_price": 1000, "title": "x"},
+        {"id": mps.codificar_item_id(ids[(i + 1) % len(ids)], "S"), "quantity": 2, "unit_price": 500, "title": "y"},
+    ]) for i in range(repeticiones)]
+    duplicados = 4
+
+    def notificar(cliente, i):
+        payment_id = pagos[(i // duplicados) % len(pagos)] if i >= 0 else pagos[0]
+        r = cliente.post("/webhook_mp", json={"type": "payment", "action": "payment.updated",
+                                              "data": {"id": payment_id}})
+        return r.status_code == 200
+
+    resultado = medir(entorno, f"webhook_ack[{productos}]", notificar, repeticiones * duplicados, concurrencia,
+                      calentamiento=0)
+
+    inicio = time.perf_counter()
+    limite = time.time() + 120
+    while time.time() < limite:
+        por_estado = cola_pagos.estadisticas()["por_estado"]
+        if not por_estado.get("pendiente") and not por_estado.get("en_curso"):
+            break
+        time.sleep(0.02)
+    resultado["drenado_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+    resultado["cola"] = cola_pagos.estadisticas()
+
+    # Cada producto perdió exactamente lo que suman sus pagos (ni más por duplicados, ni menos)
+    esperado = {}
+    for i in range(repeticiones):
+        for id_base, talle, cantidad in ((ids[i % len(ids)], "M", 1), (ids[(i + 1) % len(ids)], "S", 2)):
+            esperado[(id_base, talle)] = esperado.get((id_base, talle), 0) + cantidad
+    productos_ref = entorno.db.collection("usuarios").document(EMAIL).collection("productos")
+    inicial = {"S": 3, "M": 5, "L": 2}
+    for doc in productos_ref.stream():
+        stock = doc.get("talles_stock")
+        for talle in ("S", "M"):
+            if stock[talle] != inicial[talle] - esperado.get((doc.get("id_base"), talle), 0):
+                resultado["errores"] += 1
+                resultado["primer_error"] = f"Stock de {doc.get('id_base')}/{talle} no coincide: {stock[talle]}"
+    return [resultado]
+
+
+# Proceso nuevo: importa la app y atiende un primer request (sin credenciales: sin red)
+_SCRIPT_ARRANQUE = """
+import time
+inicio = time.perf_counter()
+import app
+importado = time.perf_counter()
+app.app.test_client().get("/ver-productos")
+fin = time.perf_counter()
+print(f"{(importado - inicio) * 1000:.2f} {(fin - importado) * 1000:.2f}")
+"""
+
+
+def escenario_arranque(entorno: Entorno, productos: int, repeticiones: int, concurrencia: int) -> list:
+    """Cold start: import de app.py y primer request en un intérprete nuevo (un proceso por repetición)."""
+    entorno_proceso = {k: v for k, v in os.environ.items()
+                       if k not in ("FIREBASE_CREDENTIALS_JSON", "MERCADO_PAGO_TOKEN")}
+    etapas = {"import": [], "primer_request": []}
+
+    def arrancar(cliente, i):
+        salida = subprocess.run([sys.executable, "-c", _SCRIPT_ARRANQUE], cwd=entorno.directorio,
+                                env={**entorno_proceso, "PYTHONPATH": entorno.raiz},
+                                capture_output=True, text=True, timeout=120)
+        if salida.returncode != 0:
+            raise RuntimeError(salida.stderr.strip().splitlines()[-1])
+        importar_ms, primer_ms = (float(x) for x in salida.stdout.strip().splitlines()[-1].split())
+        if i >= 0:
+            etapas["import"].append(importar_ms)
+            etapas["primer_request"].append(primer_ms)
+        return True
+
+    resultado = medir(entorno, "arranque", arrancar, max(3, repeticiones // 10))
+    resultado["etapas_p50_ms"] = {k: round(percentil(v, 50), 2) for k, v in etapas.items()}
+    return [resultado]
+
+
+ESCENARIOS = {
+    "preview": escenario_preview,
+    "contenido": escenario_contenido,
+    "upload": escenario_upload,
+    "upload_lote": escenario_upload_lote,
+    "limpieza": escenario_limpieza,
+    "descarga": escenario_descarga,
+    "busqueda": escenario_busqueda,
+    "admin": escenario_admin,
+    "checkout": escenario_checkout,
+    "webhook": escenario_webhook,
+    "arranque": escenario_arranque,
+}
+# Los escenarios que no dependen del tamaño del catálogo corren una sola vez
+SIN_TAMANO = {"upload", "upload_lote", "arranque"}
@@ -0,0 +1,551 @@
+import copy
+import itertools
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import field_path as fp
+from google.cloud.firestore_v1 import transforms
+
+# ----------------------------------------------------
+# FIRESTORE EN MEMORIA (SUBCONJUNTO DEL CLIENTE)
+# ----------------------------------------------------
+# Implementa lo que usa la app del cliente de firebase_admin.firestore:
+# collection/document, set/get/update/delete, stream/where/order_by/limit/
+# start_after/select, batch, get_all, transaction (compatible con
+# @firestore.transactional), rutas de campo con comillas y transforms
+# (Increment, ArrayUnion, DELETE_FIELD...). Cada "RPC" puede tener una
+# latencia simulada y queda contada para los reportes del benchmark.
+
+LIMITE_OPS_BATCH = 500
+ASCENDING, DESCENDING = "ASCENDING", "DESCENDING"
+
+_secuencia_tx = itertools.count(1)
+
+
+def _partes(ruta) -> tuple:
+    """Partes de una ruta de campo: 'a.b', 'a.`M L`' o FieldPath."""
+    if isinstance(ruta, fp.FieldPath):
+        return tuple(ruta.parts)
+    return tuple(fp.parse_field_path(ruta))
+
+
+def _leer_campo(datos: dict, ruta):
+    actual = datos
+    for parte in _partes(ruta):
+        if not isinstance(actual, dict) or parte not in actual:
+            raise KeyError(ruta)
+        actual = actual[parte]
+    return actual
+
+
+def _aplicar_valor(destino: dict, partes: tuple, valor):
+    """Escribe un valor (o aplica un transform) en una ruta anidada."""
+    for parte in partes[:-1]:
+        siguiente = destino.get(parte)
+        if not isinstance(siguiente, dict):
+            siguiente = destino[parte] = {}
+        destino = siguiente
+    campo = partes[-1]
+    if valor is transforms.DELETE_FIELD:
+        destino.pop(campo, None)
+    elif valor is transforms.SERVER_TIMESTAMP:
+        destino[campo] = datetime.now(timezone.utc)
+    elif isinstance(valor, transforms.Increment):
+        actual = destino.get(campo)
+        destino[campo] = (actual if isinstance(actual, (int, float)) and not isinstance(actual, bool) else 0) + valor.value
+    elif isinstance(valor, transforms.Maximum):
+        actual = destino.get(campo)
+        destino[campo] = valor.value if not isinstance(actual, (int, float)) else max(actual, valor.value)
+    elif isinstance(valor, transforms.Minimum):
+        actual = destino.get(campo)
+        destino[campo] = valor.value if not isinstance(actual, (int, float)) else min(actual, valor.value)
+    elif isinstance(valor, transforms.ArrayUnion):
+        actual = list(destino.get(campo) or [])
+        destino[campo] = actual + [v for v in valor.values if v not in actual]
+    elif isinstance(valor, transforms.ArrayRemove):
+        destino[campo] = [v for v in (destino.get(campo) or []) if v not in valor.values]
+    elif isinstance(valor, dict):
+        # Un dict literal reemplaza el mapa, pero puede contener transforms adentro
+        nuevo = {}
+        for k, v in valor.items():
+            _aplicar_valor(nuevo, (k,), v)
+        destino[campo] = nuevo
+    else:
+        destino[campo] = copy.deepcopy(valor)
+
+
+def _fusionar(destino: dict, datos: dict):
+    """set(merge=True): mezcla mapas recursivamente."""
+    for k, v in datos.items():
+        if isinstance(v, dict) and isinstance(destino.get(k), dict):
+            _fusionar(destino[k], v)
+        else:
+            _aplicar_valor(destino, (k,), v)
+
+
+def _clave_valor(valor):
+    """Orden entre tipos como Firestore: null < bool < número < fecha < texto < bytes < lista < mapa."""
+    if valor is None:
+        return (0, 0)
+    if isinstance(valor, bool):
+        return (1, valor)
+    if isinstance(valor, (int, float)):
+        return (2, valor)
+    if isinstance(valor, datetime):
+        return (3, valor.timestamp())
+    if isinstance(valor, str):
+        return (4, valor)
+    if isinstance(valor, bytes):
+        return (5, valor)
+    if isinstance(valor, (list, tuple)):
+        return (6, [_clave_valor(v) for v in valor])
+    if isinstance(valor, dict):
+        return (7, sorted((k, _clave_valor(v)) for k, v in valor.items()))
+    return (8, str(valor))
+
+# ----------------------------------------------------
+# SNAPSHOTS Y REFERENCIAS
+# ----------------------------------------------------
+
+class DocumentSnapshot:
+    def __init__(self, referencia, datos, actualizado=None, campos=None):
+        self.reference = referencia
+        self.id = referencia.id
+        self._datos = datos
+        self.update_time = actualizado
+        self.create_time = actualizado
+        if datos is not None and campos:
+            self._datos = {}
+            for campo in campos:
+                try:
+                    _aplicar_valor(self._datos, _partes(campo), _leer_campo(datos, campo))
+                except KeyError:
+                    pass
+
+    @property
+    def exists(self) -> bool:
+        return self._datos is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._datos) if self._datos is not None else None
+
+    def get(self, campo):
+        if self._datos is None:
+            return None
+        return copy.deepcopy(_leer_campo(self._datos, campo))
+
+
+class DocumentReference:
+    def __init__(self, cliente, ruta: tuple):
+        self._cliente = cliente
+        self._ruta = ruta
+        self.id = ruta[-1]
+
+    @property
+    def path(self) -> str:
+        return "/".join(self._ruta)
+
+    @property
+    def parent(self):
+        return CollectionReference(self._cliente, self._ruta[:-1])
+
+    def collection(self, nombre: str):
+        return CollectionReference(self._cliente, self._ruta + (nombre,))
+
+    def __eq__(self, otro):
+        return isinstance(otro, DocumentReference) and otro._ruta == self._ruta
+
+    def __hash__(self):
+        return hash(self._ruta)
+
+    def get(self, field_paths=None, transaction=None):
+        if transaction is not None:
+            return transaction.get(self)
+        self._cliente._rpc("lecturas")
+        return self._cliente._snapshot(self, field_paths)
+
+    def create(self, document_data: dict):
+        self._cliente._rpc("escrituras")
+        self._cliente._aplicar([("create", self, document_data, {})])
+
+    def set(self, document_data: dict, merge=False):
+        self._cliente._rpc("escrituras")
+        self._cliente._aplicar([("set", self, document_data, {"merge": merge})])
+
+    def update(self, field_updates: dict, option=None):
+        self._cliente._rpc("escrituras")
+        self._cliente._aplicar([("update", self, field_updates, {})])
+
+    def delete(self, option=None):
+        self._cliente._rpc("escrituras")
+        self._cliente._aplicar([("delete", self, None, {})])
+
+
+class Query:
+    def __init__(self, cliente, ruta: tuple, filtros=(), ordenes=(), limite=None, desde=None,
+                 campos=None, offset=0):
+        self._cliente = cliente
+        self._ruta = ruta
+        self._filtros = tuple(filtros)
+        self._ordenes = tuple(ordenes)
+        self._limite = limite
+        self._desde = desde  # (valores, inclusivo)
+        self._campos = campos
+        self._offset = offset
+
+    def _copiar(self, **cambios):
+        args = dict(filtros=self._filtros, ordenes=self._ordenes, limite=self._limite,
+                    desde=self._desde, campos=self._campos, offset=self._offset)
+        args.update(cambios)
+        return Query(self._cliente, self._ruta, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copiar(filtros=self._filtros + ((_partes(field_path), op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copiar(ordenes=self._ordenes + ((_partes(field_path), direction),))
+
+    def limit(self, count: int):
+        return self._copiar(limite=count)
+
+    def offset(self, num_to_skip: int):
+        return self._copiar(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copiar(campos=list(field_paths))
+
+    def _cursor(self, valores):
+        if isinstance(valores, DocumentSnapshot):
+            datos = valores._datos or {}
+            return tuple(self._valor_orden(datos, partes) for partes, _d in self._ordenes), valores.id
+        if isinstance(valores, dict):
+            return tuple(self._valor_orden(valores, partes) for partes, _d in self._ordenes), None
+        return tuple(valores), None
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copiar(desde=(self._cursor(document_fields_or_snapshot), False))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copiar(desde=(self._cursor(document_fields_or_snapshot), True))
+
+    @staticmethod
+    def _valor_orden(datos: dict, partes: tuple):
+        try:
+            return _leer_campo(datos, fp.FieldPath(*partes))
+        except KeyError:
+            return None
+
+    @staticmethod
+    def _cumple(datos: dict, partes: tuple, op: str, valor) -> bool:
+        try:
+            actual = _leer_campo(datos, fp.FieldPath(*partes))
+        except KeyError:
+            return False  # un campo ausente no cumple ningún filtro (tampoco != / not-in)
+        if op == "==":
+            return actual == valor
+        if op == "!=":
+            return actual != valor
+        if op == "in":
+            return actual in valor
+        if op == "not-in":
+            return actual not in valor
+        if op == "array_contains":
+            return isinstance(actual, list) and valor in actual
+        if op == "array_contains_any":
+            return isinstance(actual, list) and any(v in actual for v in valor)
+        a, b = _clave_valor(actual), _clave_valor(valor)
+        if a[0] != b[0]:
+            return False  # las desigualdades no cruzan tipos
+        return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+    def _resolver(self):
+        """Ejecuta la consulta sobre una copia consistente de la colección."""
+        with self._cliente._lock:
+            documentos = list(self._cliente._colecciones.get(self._ruta, {}).items())
+        resultado = [(doc_id, datos) for doc_id, datos in documentos
+                     if all(self._cumple(datos, p, op, v) for p, op, v in self._filtros)]
+        # order_by excluye documentos sin el campo (como Firestore)
+        for partes, _d in self._ordenes:
+            resultado = [(i, d) for i, d in resultado if self._tiene(d, partes)]
+        resultado.sort(key=lambda item: _orden_item(item, self._ordenes, self._valor_orden))
+        if self._desde is not None:
+            (valores, doc_id_cursor), inclusivo = self._desde
+            resultado = [item for item in resultado
+                         if _despues_de(item, valores, doc_id_cursor, inclusivo, self._ordenes, self._valor_orden)]
+        resultado = resultado[self._offset:]
+        if self._limite is not None:
+            resultado = resultado[:self._limite]
+        return resultado
+
+    @staticmethod
+    def _tiene(datos, partes):
+        try:
+            _leer_campo(datos, fp.FieldPath(*partes))
+            return True
+        except KeyError:
+            return False
+
+    def stream(self, transaction=None):
+        if transaction is not None:
+            yield from transaction.get(self)
+            return
+        resultado = self._resolver()
+        self._cliente._rpc("consultas")
+        self._cliente._contar("lecturas", max(1, len(resultado)))
+        coleccion = CollectionReference(self._cliente, self._ruta)
+        for doc_id, datos in resultado:
+            yield DocumentSnapshot(coleccion.document(doc_id), copy.deepcopy(datos), campos=self._campos)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+
+def _orden_item(item, ordenes, valor_orden):
+    doc_id, datos = item
+    claves = []
+    for partes, direccion in ordenes:
+        k = _clave_valor(valor_orden(datos, partes))
+        claves.append(_Invertido(k) if direccion == DESCENDING else k)
+    claves.append(doc_id)
+    return claves
+
+
+class _Invertido:
+    __slots__ = ("k",)
+
+    def __init__(self, k):
+        self.k = k
+
+    def __lt__(self, otro):
+        return otro.k < self.k
+
+    def __eq__(self, otro):
+        return self.k == otro.k
+
+
+def _despues_de(item, valores, doc_id_cursor, inclusivo, ordenes, valor_orden) -> bool:
+    doc_id, datos = item
+    for (partes, direccion), cursor in zip(ordenes, valores):
+        a, b = _clave_valor(valor_orden(datos, partes)), _clave_valor(cursor)
+        if a != b:
+            return (a > b) if direccion != DESCENDING else (a < b)
+    if doc_id_cursor is not None and doc_id != doc_id_cursor:
+        return doc_id > doc_id_cursor
+    return inclusivo
+
+
+class CollectionReference(Query):
+    def __init__(self, cliente, ruta: tuple):
+        super().__init__(cliente, ruta)
+        self.id = ruta[-1]
+
+    def document(self, document_id: str = None):
+        return DocumentReference(self._cliente, self._ruta + (document_id or uuid.uuid4().hex[:20],))
+
+    def add(self, document_data: dict, document_id: str = None):
+        ref = self.document(document_id)
+        ref.create(document_data)
+        return datetime.now(timezone.utc), ref
+
+    def list_documents(self):
+        with self._cliente._lock:
+            ids = list(self._cliente._colecciones.get(self._ruta, {}))
+        return [self.document(i) for i in ids]
+
+# ----------------------------------------------------
+# ESCRITURAS AGRUPADAS Y TRANSACCIONES
+# ----------------------------------------------------
+
+class WriteBatch:
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._operaciones = []
+
+    def __len__(self):
+        return len(self._operaciones)
+
+    def create(self, reference, document_data):
+        self._operaciones.append(("create", reference, document_data, {}))
+
+    def set(self, reference, document_data, merge=False):
+        self._operaciones.append(("set", reference, document_data, {"merge": merge}))
+
+    def update(self, reference, field_updates, option=None):
+        self._operaciones.append(("update", reference, field_updates, {}))
+
+    def delete(self, reference, option=None):
+        self._operaciones.append(("delete", reference, None, {}))
+
+    def commit(self, **_kwargs):
+        if len(self._operaciones) > LIMITE_OPS_BATCH:
+            raise exceptions.InvalidArgument(f"maximum {LIMITE_OPS_BATCH} writes allowed per request")
+        self._cliente._rpc("commits")
+        self._cliente._contar("escrituras", len(self._operaciones))
+        self._cliente._aplicar(self._operaciones)
+        resultados = [object() for _ in self._operaciones]
+        self._operaciones = []
+        return resultados
+
+
+class Transaction(WriteBatch):
+    """Lecturas con control optimista: si un documento leído cambió antes del commit, Aborted."""
+
+    def __init__(self, cliente, max_attempts: int = 5, read_only: bool = False):
+        super().__init__(cliente)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+        self._leidos = {}
+
+    @property
+    def in_progress(self) -> bool:
+        return self._id is not None
+
+    def _clean_up(self):
+        self._operaciones = []
+        self._leidos = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = f"tx-{next(_secuencia_tx)}".encode()
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _commit(self):
+        if self._operaciones and self._read_only:
+            raise exceptions.InvalidArgument("Transacción de sólo lectura")
+        self._cliente._rpc("commits")
+        self._cliente._contar("escrituras", len(self._operaciones))
+        self._cliente._aplicar(self._operaciones, lecturas=self._leidos)
+        self._clean_up()
+        return []
+
+    def get(self, ref_or_query):
+        if isinstance(ref_or_query, DocumentReference):
+            self._cliente._rpc("lecturas")
+            snapshot = self._cliente._snapshot(ref_or_query)
+            self._leidos[ref_or_query._ruta] = self._cliente._revision(ref_or_query._ruta)
+            return snapshot
+        snapshots = ref_or_query.get()
+        for s in snapshots:
+            self._leidos[s.reference._ruta] = self._cliente._revision(s.reference._ruta)
+        return iter(snapshots)
+
+# ----------------------------------------------------
+# CLIENTE
+# ----------------------------------------------------
+
+class FakeFirestore:
+    """Reemplazo en memoria de firestore.client() para benchmarks y pruebas locales."""
+
+    def __init__(self, latencia_ms: float = 0.0):
+        self.latencia = latencia_ms / 1000.0
+        self._colecciones = defaultdict(dict)  # ruta_coleccion -> {doc_id: datos}
+        self._revisiones = {}                  # ruta_doc -> contador de escrituras
+        self._lock = threading.RLock()
+        self._contadores = Counter()
+
+    # --- API pública del cliente ---
+
+    def collection(self, nombre: str, *resto):
+        return CollectionReference(self, (nombre, *resto))
+
+    def document(self, *ruta):
+        partes = tuple("/".join(ruta).split("/"))
+        return DocumentReference(self, partes)
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5, read_only: bool = False):
+        return Transaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        referencias = list(references)
+        self._rpc("lecturas")
+        self._contar("lecturas", max(0, len(referencias) - 1))
+        for ref in referencias:
+            if transaction is not None:
+                transaction._leidos[ref._ruta] = self._revision(ref._ruta)
+            yield self._snapshot(ref, field_paths)
+
+    # --- Métricas del benchmark ---
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return dict(self._contadores)
+
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            self._contadores.clear()
+
+    def cantidad(self, *ruta_coleccion) -> int:
+        with self._lock:
+            return len(self._colecciones.get(tuple(ruta_coleccion), {}))
+
+    # --- Internos ---
+
+    def _contar(self, tipo: str, n: int = 1):
+        with self._lock:
+            self._contadores[tipo] += n
+
+    def _rpc(self, tipo: str):
+        self._contar("rpcs")
+        self._contar(tipo)
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _revision(self, ruta: tuple) -> int:
+        with self._lock:
+            return self._revisiones.get(ruta, 0)
+
+    def _snapshot(self, ref, field_paths=None):
+        with self._lock:
+            datos = self._colecciones.get(ref._ruta[:-1], {}).get(ref.id)
+            datos = copy.deepcopy(datos) if datos is not None else None
+        return DocumentSnapshot(ref, datos, datetime.now(timezone.utc), campos=field_paths)
+
+    def _aplicar(self, operaciones: list, lecturas: dict = None):
+        """Aplica las operaciones de forma atómica (todas o ninguna)."""
+        with self._lock:
+            if lecturas:
+                for ruta, revision in lecturas.items():
+                    if self._revisiones.get(ruta, 0) != revision:
+                        raise exceptions.Aborted(f"Documento modificado durante la transacción: {'/'.join(ruta)}")
+            # Validar antes de escribir para no dejar el lote a medias
+            existentes = {}
+            for tipo, ref, _datos, _extra in operaciones:
+                coleccion, doc_id = ref._ruta[:-1], ref.id
+                existe = existentes.get(ref._ruta, doc_id in self._colecciones.get(coleccion, {}))
+                if tipo == "update" and not existe:
+                    raise exceptions.NotFound(f"No document to update: {ref.path}")
+                if tipo == "create" and existe:
+                    raise exceptions.AlreadyExists(f"Document already exists: {ref.path}")
+                existentes[ref._ruta] = tipo != "delete"
+
+            for tipo, ref, datos, extra in operaciones:
+                coleccion = self._colecciones[ref._ruta[:-1]]
+                if tipo == "delete":
+                    coleccion.pop(ref.id, None)
+                elif tipo == "update":
+                    actual = copy.deepcopy(coleccion[ref.id])
+                    for campo, valor in datos.items():
+                        _aplicar_valor(actual, _partes(campo), valor)
+                    coleccion[ref.id] = actual
+                elif tipo == "set" and extra.get("merge") and ref.id in coleccion:
+                    actual = copy.deepcopy(coleccion[ref.id])
+                    _fusionar(actual, datos)
+                    coleccion[ref.id] = actual
+                else:
+                    nuevo = {}
+                    for campo, valor in datos.items():
+                        _aplicar_valor(nuevo, (campo,), valor)
+                    coleccion[ref.id] = nuevo
+                self._revisiones[ref._ruta] = self._revisiones.get(ref._ruta, 0) + 1
@@ -0,0 +1,275 @@
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ----------------------------------------------------
+# STAND-IN LOCAL DE LA API DE GITHUB
+# ----------------------------------------------------
+# Servidor HTTP en un hilo con lo que usa github_service: contents API
+# (GET/PUT), Git Data API (blobs, trees, commits, refs) y alta de repos.
+# Latencia configurable (base + jitter) y headers X-RateLimit-* para que el
+# benchmark mida lo mismo que contra api.github.com, pero sin red. Con
+# max_concurrentes simula el límite secundario (403 + Retry-After).
+
+
+def sha_git(contenido: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(contenido) + contenido).hexdigest()
+
+
+class _Repo:
+    def __init__(self):
+        self.archivos = {}  # ruta -> (sha, bytes)  (contents API)
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.refs = {}      # rama -> sha_commit
+
+
+class FakeGitHub:
+    """`with FakeGitHub(latencia_ms=40) as gh: os.environ['GITHUB_API_URL'] = gh.url`"""
+
+    def __init__(self, latencia_ms: float = 0.0, jitter_ms: float = 0.0, rate_limit: int = 5000,
+                 max_concurrentes: int = None):
+        self.latencia = latencia_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.rate_limit = rate_limit
+        self.max_concurrentes = max_concurrentes
+        self._restantes = rate_limit
+        self._en_vuelo = 0
+        self._repos = {}
+        self._lock = threading.Lock()
+        self._contadores = Counter()
+        self._servidor = None
+
+    # --- Ciclo de vida ---
+
+    def iniciar(self) -> str:
+        fake = self
+
+        class Handler(_Handler):
+            gh = fake
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name="fake-github", daemon=True).start()
+        return self.url
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    # --- Métricas ---
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return dict(self._contadores)
+
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            self._contadores.clear()
+
+    def archivos(self, repo_name: str) -> dict:
+        """Ruta -> sha de lo publicado en la rama main (commits + contents API)."""
+        with self._lock:
+            repo = self._repos.get(repo_name)
+            if repo is None:
+                return {}
+            publicados = {ruta: sha for ruta, (sha, _b) in repo.archivos.items()}
+            head = repo.refs.get("main")
+            tree = repo.trees.get(repo.commits.get(head, {}).get("tree"))
+            while tree is not None:
+                for entrada in tree["tree"]:
+                    publicados.setdefault(entrada["path"], entrada["sha"])
+                tree = repo.trees.get(tree.get("base_tree"))
+            return publicados
+
+    # --- Lógica de la API (se llama con el lock tomado) ---
+
+    def _repo(self, nombre: str) -> _Repo:
+        return self._repos.setdefault(nombre, _Repo())
+
+    def _inicializar_rama(self, repo: _Repo):
+        if "main" not in repo.refs:
+            sha_tree = hashlib.sha1(b"tree-vacio").hexdigest()
+            repo.trees[sha_tree] = {"tree": []}
+            sha_commit = hashlib.sha1(b"commit-inicial").hexdigest()
+            repo.commits[sha_commit] = {"tree": sha_tree, "parents": [], "message": "init"}
+            repo.refs["main"] = sha_commit
+
+    def atender(self, metodo: str, ruta: str, cuerpo: dict):
+        """Devuelve (status, json)."""
+        if metodo == "POST" and ruta == "/user/repos":
+            self._repo(cuerpo.get("name", "repo"))
+            return 201, {"name": cuerpo.get("name"), "full_name": f"fake/{cuerpo.get('name')}"}
+
+        m = re.match(r"^/repos/[^/]+/([^/]+)/(.*)$", ruta)
+        if not m:
+            return 404, {"message": "Not Found"}
+        repo_name, resto = m.group(1), m.group(2)
+        repo = self._repo(repo_name)
+
+        if resto.startswith("contents/"):
+            ruta_archivo = resto[len("contents/"):]
+            actual = repo.archivos.get(ruta_archivo)
+            if metodo == "GET":
+                if actual is None:
+                    return 404, {"message": "Not Found"}
+                return 200, {"sha": actual[0], "path": ruta_archivo,
+                             "content": base64.b64encode(actual[1]).decode("ascii"), "encoding": "base64"}
+            if metodo == "PUT":
+                if actual is not None and cuerpo.get("sha") != actual[0]:
+                    return 409, {"message": "sha does not match"}
+                contenido = base64.b64decode(cuerpo.get("content", ""))
+                sha = sha_git(contenido)
+                repo.archivos[ruta_archivo] = (sha, contenido)
+                self._inicializar_rama(repo)
+                return (200 if actual else 201), {"content": {"sha": sha, "path": ruta_archivo,
+                                                              "html_url": f"https://fake/{repo_name}/{ruta_archivo}"}}
+
+        if resto == "git/blobs" and metodo == "POST":
+            contenido = base64.b64decode(cuerpo.get("content", ""))
+            sha = sha_git(contenido)
+            repo.blobs[sha] = contenido
+            return 201, {"sha": sha}
+
+        if resto == "git/trees" and metodo == "POST":
+            if cuerpo.get("base_tree") and cuerpo["base_tree"] not in repo.trees:
+                return 422, {"message": "base_tree inválido"}
+            sha = hashlib.sha1(json.dumps(cuerpo, sort_keys=True).encode()).hexdigest()
+            repo.trees[sha] = cuerpo
+            return 201, {"sha": sha}
+
+        if resto == "git/commits" and metodo == "POST":
+            sha = hashlib.sha1(json.dumps(cuerpo, sort_keys=True).encode()).hexdigest()
+            repo.commits[sha] = cuerpo
+            return 201, {"sha": sha}
+
+        if resto.startswith("git/commits/") and metodo == "GET":
+            commit = repo.commits.get(resto[len("git/commits/"):])
+            if commit is None:
+                return 404, {"message": "Not Found"}
+            return 200, {"tree": {"sha": commit["tree"]}, "parents": [{"sha": p} for p in commit.get("parents", [])]}
+
+        if resto.startswith("git/ref/heads/") and metodo == "GET":
+            rama = resto[len("git/ref/heads/"):]
+            if rama not in repo.refs:
+                return 409, {"message": "Git Repository is empty."}
+            return 200, {"ref": f"refs/heads/{rama}", "object": {"sha": repo.refs[rama]}}
+
+        if resto.startswith("git/refs/heads/") and metodo == "PATCH":
+            rama = resto[len("git/refs/heads/"):]
+            nuevo = repo.commits.get(cuerpo.get("sha"))
+            if nuevo is None:
+                return 422, {"message": "Object does not exist"}
+            # Sin force, la rama sólo avanza si el commit desciende del head actual
+            if not cuerpo.get("force") and repo.refs.get(rama) not in nuevo.get("parents", []):
+                return 422, {"message": "Update is not a fast forward"}
+            repo.refs[rama] = cuerpo["sha"]
+            return 200, {"object": {"sha": cuerpo["sha"]}}
+
+        if resto == "git/refs" and metodo == "POST":
+            rama = cuerpo.get("ref", "").replace("refs/heads/", "")
+            if rama in repo.refs:
+                return 422, {"message": "Reference already exists"}
+            repo.refs[rama] = cuerpo.get("sha")
+            return 201, {"object": {"sha": cuerpo.get("sha")}}
+
+        return 404, {"message": "Not Found"}
+
+
+def _tipo_llamada(metodo: str, ruta: str) -> str:
+    """'PUT contents', 'POST git/blobs', 'GET git/ref'... para agrupar los contadores."""
+    partes = ruta.strip("/").split("/")
+    if len(partes) >= 4 and partes[0] == "repos":
+        tipo = partes[3] if partes[3] != "git" or len(partes) < 5 else f"git/{partes[4]}"
+        return f"{metodo} {tipo}"
+    return f"{metodo} {ruta}"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    gh: FakeGitHub = None
+    protocol_version = "HTTP/1.1"
+    # Keep-alive: sin esto Nagle + delayed ACK suman ~40 ms a cada respuesta reutilizada
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _atender(self, metodo: str):
+        gh = self.gh
+        largo = int(self.headers.get("Content-Length") or 0)
+        crudo = self.rfile.read(largo) if largo else b""
+        with gh._lock:
+            gh._en_vuelo += 1
+            gh._contadores["max_en_vuelo"] = max(gh._contadores["max_en_vuelo"], gh._en_vuelo)
+            excedido = gh.max_concurrentes is not None and gh._en_vuelo > gh.max_concurrentes
+        try:
+            if gh.latencia or gh.jitter:
+                time.sleep(gh.latencia + random.uniform(0, gh.jitter))
+        finally:
+            with gh._lock:
+                gh._en_vuelo -= 1
+
+        ruta = self.path.split("?", 1)[0]
+        extra = {}
+        with gh._lock:
+            gh._contadores["requests"] += 1
+            gh._contadores[_tipo_llamada(metodo, ruta)] += 1
+            gh._contadores["bytes_recibidos"] += len(crudo)
+            if excedido:
+                gh._contadores["limite_secundario"] += 1
+                status, cuerpo = 403, {"message": "You have exceeded a secondary rate limit."}
+                extra["Retry-After"] = "1"
+            elif gh._restantes <= 0:
+                status, cuerpo = 403, {"message": "API rate limit exceeded"}
+            else:
+                gh._restantes -= 1
+                try:
+                    status, cuerpo = gh.atender(metodo, ruta, json.loads(crudo) if crudo else {})
+                except (ValueError, KeyError) as e:
+                    status, cuerpo = 400, {"message": f"Request inválido: {e}"}
+            restantes = gh._restantes
+
+        datos = json.dumps(cuerpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.send_header("X-RateLimit-Limit", str(gh.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(max(0, restantes)))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        for nombre, valor in extra.items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def do_PUT(self):
+        self._atender("PUT")
+
+    def do_PATCH(self):
+        self._atender("PATCH")
@@ -0,0 +1,151 @@
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ----------------------------------------------------
+# STAND-IN LOCAL DE LA API DE MERCADO PAGO
+# ----------------------------------------------------
+# GET /v1/payments/<id> y POST /checkout/preferences, con latencia configurable.
+# Se usa con MERCADO_PAGO_API_URL apuntando a `url` (ver services/mp_service.py):
+# el SDK real arma las requests y este servidor las contesta.
+
+
+class FakeMercadoPago:
+    def __init__(self, latencia_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latencia = latencia_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self._pagos = {}
+        self._preferencias = {}
+        self._ids = itertools.count(10_000_000_001)
+        self._lock = threading.Lock()
+        self._contadores = Counter()
+        self._servidor = None
+
+    # --- Ciclo de vida ---
+
+    def iniciar(self) -> str:
+        fake = self
+
+        class Handler(_Handler):
+            mp = fake
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, name="fake-mercadopago", daemon=True).start()
+        return self.url
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def __enter__(self):
+        self.iniciar()
+        return self
+
+    def __exit__(self, *exc):
+        self.detener()
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    # --- Datos de prueba ---
+
+    def crear_pago(self, email: str, items: list, status: str = "approved") -> str:
+        """items: [{"id": "<id_base>|<talle>", "quantity": n, "unit_price": p, "title": t}]. Devuelve el payment id."""
+        with self._lock:
+            payment_id = str(next(self._ids))
+            self._pagos[payment_id] = {
+                "id": int(payment_id),
+                "status": status,
+                "external_reference": email,
+                "transaction_amount": sum(float(i.get("unit_price", 0)) * int(i.get("quantity", 1)) for i in items),
+                "date_approved": datetime.now(timezone.utc).isoformat() if status == "approved" else None,
+                "additional_info": {"items": items},
+            }
+        return payment_id
+
+    def cambiar_estado(self, payment_id: str, status: str):
+        with self._lock:
+            self._pagos[payment_id]["status"] = status
+            if status == "approved":
+                self._pagos[payment_id]["date_approved"] = datetime.now(timezone.utc).isoformat()
+
+    def preferencias(self) -> dict:
+        with self._lock:
+            return dict(self._preferencias)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return dict(self._contadores)
+
+    def reiniciar_estadisticas(self):
+        with self._lock:
+            self._contadores.clear()
+
+    # --- API ---
+
+    def atender(self, metodo: str, ruta: str, cuerpo: dict):
+        m = re.match(r"^/v1/payments/(\d+)$", ruta)
+        if metodo == "GET" and m:
+            pago = self._pagos.get(m.group(1))
+            return (200, pago) if pago else (404, {"message": "Payment not found", "status": 404})
+
+        if metodo == "POST" and ruta == "/checkout/preferences":
+            if not cuerpo.get("items"):
+                return 400, {"message": "items required", "status": 400}
+            pref_id = f"pref-{uuid.uuid4().hex[:12]}"
+            self._preferencias[pref_id] = cuerpo
+            return 201, {"id": pref_id, "init_point": f"https://fake-mp/checkout?pref_id={pref_id}",
+                         "items": cuerpo["items"], "external_reference": cuerpo.get("external_reference")}
+
+        return 404, {"message": "Not Found", "status": 404}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    mp: FakeMercadoPago = None
+    protocol_version = "HTTP/1.1"
+    # Keep-alive: sin esto Nagle + delayed ACK suman ~40 ms a cada respuesta reutilizada
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _atender(self, metodo: str):
+        mp = self.mp
+        largo = int(self.headers.get("Content-Length") or 0)
+        crudo = self.rfile.read(largo) if largo else b""
+        if mp.latencia or mp.jitter:
+            time.sleep(mp.latencia + random.uniform(0, mp.jitter))
+
+        ruta = self.path.split("?", 1)[0]
+        with mp._lock:
+            mp._contadores["requests"] += 1
+            mp._contadores[metodo + " " + re.sub(r"/\d+$", "/<id>", ruta)] += 1
+            try:
+                status, cuerpo = mp.atender(metodo, ruta, json.loads(crudo) if crudo else {})
+            except ValueError as e:
+                status, cuerpo = 400, {"message": f"Request inválido: {e}", "status": 400}
+
+        datos = json.dumps(cuerpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
@@ -1,10 +1,13 @@
 from flask import Blueprint, request, jsonify, session, current_app, redirect, url_for, render_template
 import os
-import json
 import functools # ¡IMPORTANTE! Lo añadimos aquí
 
 # Importar las funciones de servicio (ya modificadas para recibir db_client)
+from services import arranque
 from services import firebase_service as fbs
+from services import github_service as ghs
+from services.render_cache import render_cache
+from services.stock_coalescer import coalescedor_stock
 
 # Inicializamos el Blueprint
 admin_bp = Blueprint('admin_bp', __name__)
@@ -68,6 +71,8 @@ def login_admin():
         if fbs.login_admin(db_client, usuario, clave):
             session['logged_in'] = True
             session['email'] = usuario
+            # El modo admin arranca siempre con el catálogo fresco de Firestore
+            fbs.invalidar_catalogo(usuario)
             return redirect(url_for('wizard_bp.preview_site', admin='true')) # Redirijo a la vista previa en modo admin
         else:
             return redirect(url_for('wizard_bp.step1', error='login')) # Fallo: retorna al inicio con error
@@ -80,6 +85,25 @@ def logout_admin():
     session.pop('email', None)
     return redirect(url_for('wizard_bp.preview_site')) # Redirijo a la vista previa normal
 
+@admin_bp.route('/estado-cache', methods=['GET'])
+@requiere_admin
+def estado_cache():
+    """Devuelve los contadores de los caches de catálogo y de render (hits/misses)."""
+    return jsonify({'status': 'ok',
+                    'cache_catalogo': fbs.estadisticas_cache(),
+                    'cache_render': render_cache.estadisticas(),
+                    'stock': coalescedor_stock.estadisticas(),
+                    'indice_precios': fbs.indice_precios.estadisticas(),
+                    'indice_busqueda': fbs.indice_busqueda.estadisticas(),
+                    'github': ghs.cliente_github.estadisticas(),
+                    'uploads': current_app.config['UPLOADS'].estado()}), 200
+
+@admin_bp.route('/estado-arranque', methods=['GET'])
+@requiere_admin
+def estado_arranque():
+    """Tiempos de import de este proceso: al arrancar y los diferidos al primer uso."""
+    return jsonify({'status': 'ok', 'arranque': arranque.reporte()}), 200
+
 # ----------------------------------------------------
 # C. RUTAS DE ACTUALIZACIÓN DE PRODUCTOS
 # ----------------------------------------------------
@@ -87,36 +111,30 @@ def logout_admin():
 @admin_bp.route('/actualizar-precio', methods=['POST'])
 @requiere_admin
 def actualizar_precio():
-    """API para actualizar precio o stock (desde el modo admin de preview.html)."""
+    """
+    API para actualizar el precio (desde el modo admin de preview.html).
+    El stock no se edita acá: va por /actualizar-stock o /actualizar-talle, con deltas por talle.
+    """
     db_client = current_app.config.get('DB_CLIENT')
     email = session.get("email")
 
     data = request.get_json()
     id_base = data.get("id")
     nuevo_precio_raw = data.get("nuevoPrecio")
-    
-    campos_a_actualizar = {}
 
-    # Lógica de precio
-    if nuevo_precio_raw is not None:
-        try:
-            # Asegurar que el precio es un float
-            campos_a_actualizar['precio'] = float(nuevo_precio_raw) 
-        except ValueError:
-            return jsonify({'status': 'error', 'message': 'Precio inválido'}), 400
+    if data.get("nuevoStock") is not None:
+        # Reemplazar el mapa completo pisaba ediciones concurrentes de otros talles
+        return jsonify({'status': 'error', 'message': 'El stock se actualiza con /actualizar-stock (deltas por talle)'}), 400
 
-    # Lógica de stock
-    nuevo_stock = data.get("nuevoStock")
-    if nuevo_stock is not None:
-        # Se espera un JSON de talles/stock (e.g., {"S": 10, "M": 5})
-        try:
-             campos_a_actualizar['talles_stock'] = json.loads(nuevo_stock) 
-        except json.JSONDecodeError:
-             return jsonify({'status': 'error', 'message': 'Formato de stock JSON inválido'}), 400
-        
-    if not campos_a_actualizar:
+    if nuevo_precio_raw is None:
         return jsonify({'status': 'ok', 'message': 'Nada que actualizar'}), 200
 
+    try:
+        # Asegurar que el precio es un float
+        campos_a_actualizar = {'precio': float(nuevo_precio_raw)}
+    except (TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Precio inválido'}), 400
+
     # Llama al servicio
     if fbs.actualizar_firestore(db_client, id_base, campos_a_actualizar, email):
         return jsonify({'status': 'ok'}), 200
@@ -124,29 +142,91 @@ def actualizar_precio():
         return jsonify({'status': 'error', 'message': 'Error al actualizar producto'}), 500
 
 
+def _talle_invalido(talle) -> bool:
+    return not isinstance(talle, str) or not talle.strip() or len(talle) > 40
+
+
 @admin_bp.route('/actualizar-talle', methods=['POST'])
 @requiere_admin
 def actualizar_talle():
-    """API para actualizar talles/stock específicos."""
+    """
+    API para agregar o quitar talles: {"id": id_base, "agregar": ["XL"], "quitar": ["XS"]}.
+    Los talles nuevos arrancan con stock 0 y los existentes conservan el suyo: no se manda el
+    mapa completo, así no se pisa el stock que otra edición haya cambiado mientras tanto.
+    """
     db_client = current_app.config.get('DB_CLIENT')
     email = session.get("email")
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
+
+    if data.get("nuevoStock") is not None:
+        return jsonify({'status': 'error', 'message': 'El stock se actualiza con /actualizar-stock (deltas por talle)'}), 400
 
     id_base = data.get("id")
-    # Los datos de talle y stock ya deberían estar dentro del campo 'nuevoStock' 
-    # de actualizar_precio, pero mantengo esta ruta si se usa independientemente.
-    nuevo_stock_json = data.get("nuevoStock") 
-    
-    if not all([id_base, nuevo_stock_json]):
-         return jsonify({'status': 'error', 'message': 'Faltan datos (id, nuevoStock)'}), 400
+    agregar = data.get("agregar") or []
+    quitar = data.get("quitar") or []
+    if not id_base or not isinstance(agregar, list) or not isinstance(quitar, list):
+        return jsonify({'status': 'error', 'message': 'Faltan datos (id, agregar, quitar)'}), 400
+
+    for talle in agregar + quitar:
+        if _talle_invalido(talle):
+            return jsonify({'status': 'error', 'message': f'Talle inválido: "{talle}"'}), 400
+    quitar = {t.strip() for t in quitar}
+    agregar = {t.strip() for t in agregar} - quitar
+
+    if not agregar and not quitar:
+        return jsonify({'status': 'ok', 'message': 'Nada que actualizar'}), 200
 
-    try:
-        stock_data = json.loads(nuevo_stock_json)
-    except json.JSONDecodeError:
-        return jsonify({'status': 'error', 'message': 'Formato de stock JSON inválido'}), 400
+    resultado = fbs.aplicar_deltas_stock(db_client, email, id_base, {t: 0 for t in agregar}, quitar=sorted(quitar))
+    if not resultado.get("ok"):
+        estado = 404 if resultado.get("error") == "Producto no encontrado" else 500
+        return jsonify({'status': 'error', 'message': resultado.get("error")}), estado
+    return jsonify({'status': 'ok', 'talles_stock': resultado["talles_stock"]}), 200
 
-    # Se asume que el cliente envía el objeto talles_stock completo y actualizado
-    if fbs.actualizar_firestore(db_client, id_base, {'talles_stock': stock_data}, email):
-         return jsonify({'status': 'ok'}), 200
-    else:
-         return jsonify({'status': 'error', 'message': 'Error al actualizar talles'}), 500
+
+@admin_bp.route('/actualizar-stock', methods=['POST'])
+@requiere_admin
+def actualizar_stock():
+    """
+    API de stock por talle con deltas: {"id": id_base, "deltas": {"M": -1, "L": 2}, "nuevoPrecio": opcional}.
+    Cada talle se suma con Increment (no se pisa el mapa completo) y las ediciones
+    seguidas del mismo producto se agrupan en una sola escritura.
+    """
+    db_client = current_app.config.get('DB_CLIENT')
+    email = session.get("email")
+    data = request.get_json(silent=True) or {}
+
+    id_base = data.get("id")
+    deltas = data.get("deltas") or {}
+    if not id_base or not isinstance(deltas, dict):
+        return jsonify({'status': 'error', 'message': 'Faltan datos (id, deltas)'}), 400
+
+    # " M" y "M" son el mismo talle: se suman después de normalizar (no se pisa uno con otro)
+    normalizados = {}
+    for talle, delta in deltas.items():
+        if _talle_invalido(talle) or isinstance(delta, bool) or not isinstance(delta, int):
+            return jsonify({'status': 'error', 'message': f'Delta inválido para el talle "{talle}"'}), 400
+        normalizados[talle.strip()] = normalizados.get(talle.strip(), 0) + delta
+
+    campos = {}
+    if data.get("nuevoPrecio") is not None:
+        try:
+            campos['precio'] = float(data.get("nuevoPrecio"))
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'Precio inválido'}), 400
+
+    if not deltas and not campos:
+        return jsonify({'status': 'ok', 'message': 'Nada que actualizar'}), 200
+
+    resultado = coalescedor_stock.aplicar(db_client, email, id_base, normalizados, campos)
+    if resultado.get("pendiente"):
+        # Quedó dentro de una escritura en curso: se aplica, no hay que reintentarla
+        return jsonify({'status': 'pendiente', 'message': resultado.get("error")}), 202
+    if not resultado.get("ok"):
+        estado = 404 if resultado.get("error") == "Producto no encontrado" else 500
+        return jsonify({'status': 'error', 'message': resultado.get("error")}), estado
+
+    # Resultado de la ráfaga completa: deltas sumados, ediciones agrupadas y stock final
+    return jsonify({'status': 'ok',
+                    'talles_stock': resultado["talles_stock"],
+                    'deltas_aplicados': resultado["deltas"],
+                    'ediciones_agrupadas': resultado["ediciones"]}), 200
@@ -0,0 +1,27 @@
+from flask import Blueprint, Response, request
+import os
+import hmac
+
+from services import metricas
+
+metricas_bp = Blueprint('metricas_bp', __name__)
+
+# Si está definido, el scraper tiene que mandar "Authorization: Bearer <token>"
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN")
+
+@metricas_bp.before_app_request
+def _iniciar_medicion():
+    metricas.iniciar_request()
+
+@metricas_bp.after_app_request
+def _terminar_medicion(response):
+    return metricas.terminar_request(response)
+
+@metricas_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Histogramas por ruta y por operación de backend, en formato Prometheus."""
+    if METRICAS_TOKEN:
+        recibido = request.headers.get("Authorization", "")
+        if not hmac.compare_digest(recibido, f"Bearer {METRICAS_TOKEN}"):
+            return Response("No autorizado\n", status=401, mimetype="text/plain")
+    return Response(metricas.exposicion(), mimetype="text/plain; version=0.0.4; charset=utf-8")
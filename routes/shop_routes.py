@@ -1,9 +1,67 @@
-from flask import Blueprint, request, jsonify, redirect, url_for, current_app
+from flask import Blueprint, request, jsonify, redirect, url_for, current_app, session
 import os
 
-# shop_bp no necesita importar servicios si solo maneja redirecciones/webhooks
+from services import clientes
+from services import firebase_service as fbs
+from services import mp_service as mps
+from services import mp_webhook as mpw
+
 shop_bp = Blueprint('shop_bp', __name__)
 
+def _sdk_mp():
+    # Perezoso: el SDK (y su import) se crea con el primer pago de cada proceso
+    return current_app.config.get('MP_SDK') or clientes.obtener_sdk_mp()
+
+def _procesar_pago(payment_id: str):
+    # Corre en un hilo de la cola, dentro de un app_context
+    db_client = current_app.config.get('DB_CLIENT') or clientes.obtener_db()
+    return mpw.procesar_pago(db_client, _sdk_mp(), payment_id)
+
+cola_pagos = mpw.ColaPagos(_procesar_pago)
+
+@shop_bp.before_app_request
+def _iniciar_cola_pagos():
+    # Hilos por proceso: se arrancan en el primer request de cada worker (seguro con --preload)
+    cola_pagos.asegurar_workers(current_app._get_current_object())
+
+def _payment_id_notificado():
+    """Payment id de la notificación (webhook JSON o IPN por query string). None si no es de un pago."""
+    datos = request.get_json(silent=True) or {}
+    tipo = datos.get("type") or datos.get("topic") or request.args.get("type") or request.args.get("topic")
+    if tipo != "payment":
+        return None
+    payment_id = (datos.get("data") or {}).get("id") or request.args.get("data.id") or request.args.get("id")
+    payment_id = str(payment_id or "").strip()
+    return payment_id if payment_id.isdigit() else None
+
+@shop_bp.route('/pagar', methods=['POST'])
+def pagar():
+    """
+    Checkout del carrito de preview.html. Precios y stock salen del índice en memoria
+    (fbs.indice_precios), no del DOM; sólo los productos que falten se leen de Firestore.
+    """
+    email = session.get("email")
+    if not email:
+        return jsonify({'error': 'Sesión expirada'}), 401
+
+    carrito = (request.get_json(silent=True) or {}).get("carrito")
+    if not isinstance(carrito, list) or not carrito:
+        return jsonify({'error': 'Carrito vacío'}), 400
+
+    ids_base = {str((linea or {}).get("id_base") or "").strip() for linea in carrito if isinstance(linea, dict)}
+    precios = fbs.precios_para_checkout(current_app.config.get('DB_CLIENT'), email, [i for i in ids_base if i])
+    items, problemas = mps.validar_carrito([l for l in carrito if isinstance(l, dict)], precios)
+    if problemas or not items:
+        return jsonify({'error': 'El carrito cambió: revisá stock y productos', 'problemas': problemas}), 409
+
+    try:
+        preferencia = mps.crear_preferencia(_sdk_mp(), email, items, request.url_root)
+    except Exception as e:
+        print(f"❌ Error al crear la preferencia de pago para {email}: {e}")
+        return jsonify({'error': 'No se pudo crear el pago'}), 502
+    total = sum(item["unit_price"] * item["quantity"] for item in items)
+    return jsonify({**preferencia, 'total': total}), 200
+
 @shop_bp.route('/success', methods=['GET'])
 def mp_success():
     """Callback de éxito de Mercado Pago."""
@@ -22,11 +80,15 @@ def mp_pending():
 
 @shop_bp.route('/webhook_mp', methods=['POST'])
 def webhook_mp():
-    """Manejo de notificaciones de Mercado Pago."""
-    # En el código original, esta lógica usaba el SDK (sdk.payment().get).
-    # Aquí accedemos al SDK desde la configuración de la app.
-    sdk = current_app.config.get('MP_SDK')
-    # ... (Lógica para procesar el webhook y actualizar el estado de pago) ...
-    
+    """
+    Notificaciones de Mercado Pago: se encola el payment id (deduplicado) y se responde al instante.
+    La consulta del pago y el descuento de stock los hace la cola (services/mp_webhook.py).
+    """
+    payment_id = _payment_id_notificado()
+    if payment_id is None:
+        # merchant_order u otros tópicos: nada que hacer, pero 200 para que MP no reintente
+        return jsonify({'status': 'ok', 'encolado': False}), 200
+
+    encolado = cola_pagos.encolar(payment_id)
     # Debe devolver un 200 OK para que Mercado Pago no reintente.
-    return jsonify({'status': 'ok'}), 200
+    return jsonify({'status': 'ok', 'encolado': encolado}), 200
@@ -1,23 +1,170 @@
-from flask import Blueprint, render_template, request, session, redirect, jsonify, current_app, url_for
+from flask import Blueprint, render_template, request, session, redirect, jsonify, current_app, url_for, make_response, \
+    Response
 from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
 import json
-import pandas as pd
-from io import BytesIO
-from zipfile import ZipFile
-from concurrent.futures import ThreadPoolExecutor
-from PIL import Image
-import shortuuid
 import time
+import threading
 import traceback
 
 # Importar las funciones de servicio (CLAVE)
 from services import github_service as ghs
 from services import firebase_service as fbs
+from services import imagen_service as ims
+from services import catalogo_import as cim
+from services import catalogo_export as cex
+from services.render_cache import render_cache
+from services import publish_jobs as pj
+from services import catalogo_index as cix
+from services import publish_snapshot as pss
+from services import publish_assets as pa
+from services import zip_streaming as zs
+from services import subida_lote as sl
+from services.metricas import medir
 
 wizard_bp = Blueprint('wizard_bp', __name__)
-executor = ThreadPoolExecutor(max_workers=5)
 
+# Descargas de /descargar en curso por proceso: cada una ocupa un hilo hasta terminar de enviar
+DESCARGAS_MAX_CONCURRENTES = int(os.getenv("DESCARGAS_MAX_CONCURRENTES", "4"))
+descargas_en_curso = threading.BoundedSemaphore(DESCARGAS_MAX_CONCURRENTES)
+
+
+# ----------------------------------------------------
+# 0. PUBLICACIÓN EN SEGUNDO PLANO
+# ----------------------------------------------------
+
+def _clave_render(productos: list, config: dict) -> str:
+    """Identidad de un render: catálogo leído, config y versión de la plantilla."""
+    plantilla = os.path.join(current_app.root_path, current_app.template_folder, 'preview.html')
+    try:
+        st = os.stat(plantilla)
+        firma_plantilla = (st.st_mtime, st.st_size)
+    except OSError:
+        firma_plantilla = None
+    return pss.hash_contenido({
+        "productos": productos,
+        "config": config,
+        "plantilla": firma_plantilla,
+        "firebase": current_app.config.get('FIREBASE_WEB_CONFIG'),
+        "build": pa.VERSION_BUILD,
+    })
+
+def _ejecutar_publicacion(trabajo: dict, etapa):
+    """
+    Etapas de una publicación encolada por step3 (corre en un hilo de la cola).
+    Es incremental: sólo se escribe/renderiza/sube lo que cambió desde el último snapshot del repo.
+    """
+    db_client = current_app.config.get('DB_CLIENT')
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    email, repo_name, payload = trabajo["email"], trabajo["repo_name"], trabajo["payload"]
+    snapshot = pss.snapshots.obtener(repo_name)
+
+    # 1. Diff de productos contra la última publicación
+    with etapa("plan") as detalle:
+        plan = pss.planificar_productos(snapshot, payload["productos"], repo_name,
+                                        payload.get("borrar_faltantes", False))
+        resumen = pss.resumen_plan(plan)
+        detalle.update({k: (len(v) if isinstance(v, list) else v) for k, v in resumen.items()})
+
+    # 2. Firestore: altas, reemplazos (mismo doc_id) y bajas en lotes
+    with etapa("firestore") as detalle:
+        escrituras = [(i, doc_id, doc) for i, doc_id, doc, _c in plan["crear"] + plan["actualizar"]]
+        borrados = [datos["doc_id"] for _c, datos in plan["borrar"]]
+        resultado_db = fbs.aplicar_cambios_productos(db_client, email, escrituras, borrados)
+        snapshot["base_time"] = plan["base_time"]
+        snapshot["productos"] = pss.productos_publicados(plan, set(resultado_db["errores"]))
+        # Se guarda ya: si GitHub falla, el reintento no vuelve a escribir en Firestore
+        pss.snapshots.guardar(repo_name, snapshot)
+        detalle.update(escritos=resultado_db["escritos"], borrados=resultado_db["borrados"],
+                       sin_cambios=resumen["sin_cambios"], fallidos=len(resultado_db["errores"]),
+                       errores=resumen["invalidos"][:50])
+
+    # 3. Render de preview.html sólo si cambió el catálogo, la config o la plantilla
+    html = None
+    with etapa("render") as detalle:
+        productos_finales, config_data, version = _datos_tienda(db_client, email)
+        clave = _clave_render(productos_finales, config_data)
+        if clave != snapshot.get("render"):
+            # Sólo con el app_context del hilo: la plantilla no depende del request ni de la sesión
+            html = _render_tienda(email, productos_finales, config_data, version)
+        detalle.update(productos=len(productos_finales), omitido=html is None,
+                       bytes=len(html.encode('utf-8')) if html is not None else 0)
+
+    # 3b. Build del index.html: sin admin, fuentes recortadas, minificado y precomprimido
+    artefactos_index = {}
+    if html is not None:
+        with etapa("build") as detalle:
+            build = pa.construir_index(html)
+            artefactos_index = build["archivos"]
+            detalle.update(build["reporte"])
+            print(f"🗜️ index.html de {repo_name}: {build['reporte']['bytes_original']} -> "
+                  f"{build['reporte']['bytes_minificado']} bytes (gzip {build['reporte']['bytes_gzip']}, "
+                  f"brotli {build['reporte']['bytes_brotli']})")
+
+    # 4. Publicación en GitHub de los archivos que cambiaron
+    with etapa("github") as detalle:
+        archivos = ghs.recolectar_archivos_sitio(upload_folder, email, None, payload.get('logo'))
+        archivos.update(artefactos_index)
+        plan_archivos = pss.planificar_archivos(snapshot, archivos)
+        cambiados = {ruta: archivos[ruta] for ruta in plan_archivos["cambiados"]}
+        if payload.get("modo") == 'commit':
+            # HTML, iconos, logo e imágenes de productos en un único commit
+            publicacion = ghs.publicar_commit(repo_name, cambiados, mensaje=f"Publicar sitio ({len(productos_finales)} productos)")
+            if not publicacion.get("ok"):
+                raise RuntimeError(publicacion.get("error") or "Error al publicar en GitHub")
+            estadisticas = {k: publicacion.get(k, 0) for k in ("subidos", "omitidos", "bytes_subidos", "bytes_omitidos")}
+        else:
+            # Contents API: sólo index.html e iconos (las imágenes se suben en /upload-image)
+            publicables = set(artefactos_index) | {f"static/img/{nombre}" for nombre in ghs.ICONOS_FIJOS}
+            estadisticas = ghs.nuevas_estadisticas()
+            fallidos = set()
+            for ruta in publicables & set(cambiados):
+                resultado = ghs.subir_archivo(repo_name, cambiados[ruta], ruta)
+                if not resultado.get("ok"):
+                    if ruta == "index.html":
+                        raise RuntimeError(resultado.get("error") or "Error al subir index.html")
+                    fallidos.add(ruta)  # un icono que falla se reintenta la próxima vez
+                ghs.sumar_resultado(estadisticas, resultado)
+            plan_archivos["shas"] = {r: sha for r, sha in plan_archivos["shas"].items()
+                                     if r in publicables and r not in fallidos}
+        estadisticas["sin_cambios_snapshot"] = len(plan_archivos["sin_cambios"])
+        # Subidos vs. omitidos (sin cambios) de esta publicación
+        detalle.update(estadisticas)
+        print(f"📦 Publicación {repo_name}: {estadisticas}")
+
+    # 5. Snapshot completo: la próxima publicación parte de acá
+    snapshot["render"] = clave
+    snapshot["artefactos"] = {**snapshot.get("artefactos", {}), **plan_archivos["shas"]}
+    pss.snapshots.guardar(repo_name, snapshot)
+
+def _plan_publicacion(email: str, repo_name: str, productos: list, logo: str, borrar_faltantes: bool) -> dict:
+    """Dry-run: las operaciones que haría una publicación, sin escribir nada."""
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    snapshot = pss.snapshots.obtener(repo_name)
+    plan = pss.planificar_productos(snapshot, productos, repo_name, borrar_faltantes)
+    render = pss.hay_cambios_productos(plan) or snapshot.get("render") is None
+    archivos = ghs.recolectar_archivos_sitio(upload_folder, email, None, logo)
+    plan_archivos = pss.planificar_archivos(snapshot, archivos)
+    subir = plan_archivos["cambiados"] + (pa.rutas_index() if render else [])
+    return {
+        "ok": True,
+        "dry_run": True,
+        "repo_name": repo_name,
+        "primera_publicacion": not snapshot.get("productos") and snapshot.get("render") is None,
+        "firestore": pss.resumen_plan(plan),
+        # Sin cambios de productos igual se re-renderiza si cambió la config o la plantilla
+        "render": {"necesario": render},
+        "github": {"subir": subir, "sin_cambios": len(plan_archivos["sin_cambios"])},
+    }
+
+cola_publicacion = pj.ColaPublicacion(_ejecutar_publicacion)
+
+@wizard_bp.before_app_request
+def _iniciar_cola_publicacion():
+    # Hilos por proceso: se arrancan en el primer request de cada worker (seguro con --preload)
+    cola_publicacion.asegurar_workers(current_app._get_current_object())
+    current_app.config['UPLOADS'].asegurar_barrido()
 
 # ----------------------------------------------------
 # A. RUTAS DEL FLUJO DE PASOS (CON LÓGICA COMPLETA)
@@ -26,13 +173,12 @@ executor = ThreadPoolExecutor(max_workers=5)
 @wizard_bp.route('/', methods=['GET', 'POST'])
 def step1():
     """Paso 1: Configuración inicial del sitio y subida de logo."""
-    upload_folder = current_app.config.get('UPLOAD_FOLDER')
     email_session = session.get('email')
     
     if request.method == 'GET':
-        # Limpiar imágenes de la sesión anterior (si existía)
+        # Limpiar imágenes de la sesión anterior (si existía): un rename, el borrado lo hace el barrido
         if email_session:
-            ghs.limpiar_imagenes_usuario(upload_folder, email_session)
+            current_app.config['UPLOADS'].limpiar(email_session)
 
         status_pago = request.args.get('status')
         return render_template('step1.html', status_pago=status_pago)
@@ -47,9 +193,10 @@ def step1():
         # 2. Subida de logo
         logo = request.files.get('logo')
         if logo and logo.filename:
-            filename = f"logo_{email}"
-            logo.save(os.path.join(upload_folder, filename))
-            session['logo'] = filename
+            almacen = current_app.config['UPLOADS']
+            logo.save(os.path.join(almacen.carpeta(email), "logo"))
+            # Ruta relativa a upload_folder: la usan url_for('static') y la publicación
+            session['logo'] = almacen.registrar(email, ["logo"])[0]
         else:
             session['logo'] = None
             
@@ -74,7 +221,6 @@ def step2_5():
 @wizard_bp.route('/contenido', methods=['GET', 'POST'])
 def step3():
     """Paso 3: Subida final de contenido."""
-    db_client = current_app.config.get('DB_CLIENT') 
     email = session.get("email")
     
     if not email:
@@ -99,35 +245,65 @@ def step3():
                 }
                 productos.append(producto)
 
-        # 2. Lógica de Subida a DB en segundo plano
         repo_name = session.get("repo_nombre")
-        def subir_con_resultado(producto):
-            ok = fbs.subir_a_firestore(db_client, producto, email, repo_name)
-            return ok
-            
-        # Ejecutar y esperar la subida para asegurar que la data esté para /preview
-        future = executor.submit(lambda: [subir_con_resultado(p) for p in productos])
-        future.result() 
-        
-        # 3. Renderizar y subir el HTML a GitHub
-        
-        # 3.1 Cargar productos recién subidos para el renderizado (Opcional, pero más seguro)
-        productos_finales, config_data = fbs.ver_productos(db_client, email)
-        
-        # 3.2 Renderizar el template preview.html
-        html = render_template('preview.html', config=config_data, productos=productos_finales)
-        
-        # 3.3 Subir HTML
-        ghs.subir_archivo(repo_name, html.encode('utf-8'), 'index.html')
-        
-        # 3.4 Subir iconos (asumiendo existen localmente)
-        ghs.subir_iconos_png(repo_name, current_app.config.get('UPLOAD_FOLDER'))
-        
+        # Opt-in: sin esto publicar sólo agrega/actualiza (ver pss.planificar_productos)
+        borrar_faltantes = request.form.get('borrar_faltantes') in ('1', 'true', 'on')
+        if request.args.get('dry_run') in ('1', 'true'):
+            return jsonify(_plan_publicacion(email, repo_name, productos, session.get('logo'), borrar_faltantes))
+
+        # 2. Encolar la publicación (Firestore -> render -> GitHub) y responder al instante
+        job_id = cola_publicacion.encolar(email, repo_name, {
+            "productos": productos,
+            "logo": session.get('logo'),
+            "modo": current_app.config.get('GITHUB_MODO_PUBLICACION'),
+            "borrar_faltantes": borrar_faltantes,
+        })
         session['repo_creado'] = True
-        return redirect('/preview')
+        session['ultima_publicacion'] = job_id
+
+        status_url = url_for('wizard_bp.publish_status', job_id=job_id)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({"ok": True, "job_id": job_id, "status_url": status_url}), 202
+        return redirect(url_for('wizard_bp.preview_site', publicacion=job_id))
 
     return render_template('step3.html')
 
+def _render_tienda(email: str, productos: list, config: dict, version, modo_admin: bool = False) -> str:
+    """
+    Renderiza preview.html con el índice agrupado (grupo -> subgrupo -> productos) de esa versión.
+    Todo lo que usa la plantilla llega en el contexto (email incluido, no la sesión), así que
+    alcanza con un app_context: la publicación renderiza desde el hilo de la cola.
+    """
+    indice = cix.indice_para(email, productos, version)
+    with medir("render", "preview_admin" if modo_admin else "preview"):
+        return render_template('preview.html',
+                               productos=indice.por_orden, # Si esta lista está vacía, no se verán tarjetas
+                               grupos=indice.grupos,
+                               estructura_grupos=indice.estructura(),
+                               config=config,
+                               email=email,
+                               firebase_config=current_app.config.get('FIREBASE_WEB_CONFIG') or {},
+                               modoAdmin=modo_admin)
+
+def _datos_tienda(db_client, email: str):
+    """Catálogo, config y versión para renderizar la tienda, con la public_key de Mercado Pago en la config."""
+    productos, config, version = fbs.ver_productos_versionado(db_client, email)
+    mp_tokens = fbs.get_mp_token(db_client, email)
+    if mp_tokens:
+        config['public_key'] = mp_tokens.get('public_key')
+    return productos, config, version
+
+def _respuesta_tienda(html_bytes: bytes, etag: str):
+    """Respuesta cacheable en el navegador: revalidación con ETag (304 si ya la tiene)."""
+    response = make_response(html_bytes)
+    response.mimetype = 'text/html'
+    response.set_etag(etag)
+    # El contenido depende de la sesión (tienda): sólo el navegador del usuario la guarda,
+    # nunca un proxy o CDN compartido (aunque respete Vary, no hay que confiar en eso)
+    response.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
 @wizard_bp.route('/preview', methods=['GET'])
 def preview_site():
     """Ruta para ver la vista previa o la tienda final (CLAVE para el problema de las tarjetas)."""
@@ -137,31 +313,123 @@ def preview_site():
     if not email:
         return redirect(url_for('wizard_bp.step1'))
 
-    # 1. Obtener la data
-    productos, config = fbs.ver_productos(db_client, email)
-
-    # 2. Preparar el contexto de Mercado Pago
-    mp_tokens = fbs.get_mp_token(db_client, email)
-    if mp_tokens:
-        config['public_key'] = mp_tokens.get('public_key')
-    
-    # 3. Determinar Modo Admin
+    # Determinar Modo Admin (el modo admin nunca usa el cache de render)
     modo_admin = session.get('logged_in', False) or request.args.get('admin', 'false') == 'true'
 
-    # 4. Renderizar el template
-    return render_template('preview.html', 
-                           productos=productos, # Si esta lista está vacía, no se verán tarjetas
-                           config=config, 
-                           modoAdmin=modo_admin)
+    # 0. Render cacheado para la versión actual del catálogo
+    if not modo_admin:
+        cacheado = render_cache.obtener(email, fbs.version_catalogo(email))
+        if cacheado is not None:
+            return _respuesta_tienda(*cacheado)
+
+    # 1. Obtener la data (con el contexto de Mercado Pago)
+    productos, config, version = _datos_tienda(db_client, email)
+
+    # 2. Renderizar el template
+    html = _render_tienda(email, productos, config, version, modo_admin)
+    if modo_admin or version is None:
+        return html
+
+    html_bytes = html.encode('utf-8')
+    etag = render_cache.guardar(email, version, html_bytes)
+    return _respuesta_tienda(html_bytes, etag)
 
 # ----------------------------------------------------
 # B. RUTAS UTILITY (LÓGICA COMPLETA)
 # ----------------------------------------------------
 
+@wizard_bp.route('/ver-productos', methods=['GET'])
+def ver_productos():
+    """
+    Productos paginados por cursor sobre el índice del catálogo.
+    Parámetros: orden (orden | precio_asc | precio_desc), grupo, subgrupo, limite, cursor.
+    """
+    db_client = current_app.config.get('DB_CLIENT')
+    email = session.get("email")
+    if not email:
+        return jsonify({"ok": False, "error": "Sesión no válida"}), 400
+
+    try:
+        limite = min(max(int(request.args.get('limite', 24)), 1), 200)
+    except ValueError:
+        return jsonify({"ok": False, "error": "Límite inválido"}), 400
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        # El cursor fija orden y filtros de la primera página
+        try:
+            datos = cix.decodificar_cursor(cursor)
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+        orden, grupo, subgrupo, offset = datos.get("k", "orden"), datos.get("g"), datos.get("s"), datos["o"]
+    else:
+        orden = request.args.get('orden', 'orden')
+        grupo, subgrupo, offset = request.args.get('grupo'), request.args.get('subgrupo'), 0
+    if orden not in cix.ORDENES:
+        return jsonify({"ok": False, "error": "Orden inválido"}), 400
+
+    productos, _config, version = fbs.ver_productos_versionado(db_client, email)
+    indice = cix.indice_para(email, productos, version)
+    pagina, siguiente = indice.pagina(orden, grupo, subgrupo, offset, limite)
+
+    siguiente_cursor = None
+    if siguiente is not None:
+        siguiente_cursor = cix.codificar_cursor({"v": version, "k": orden, "g": grupo, "s": subgrupo, "o": siguiente})
+    return jsonify({
+        "ok": True,
+        "productos": pagina,
+        "total": len(indice.lista(orden, grupo, subgrupo)),
+        "siguiente_cursor": siguiente_cursor,
+        "version": version,
+        # El catálogo cambió desde la primera página: los offsets pueden haberse corrido
+        "version_cambio": bool(cursor) and datos.get("v") != version,
+    }), 200
+
+@wizard_bp.route('/buscar', methods=['GET'])
+def buscar():
+    """
+    Búsqueda de productos de la tienda sobre el índice en memoria (sin acentos ni mayúsculas, por prefijo).
+    Parámetros: q, precio_min, precio_max, en_stock (1/true), limite, offset.
+    """
+    db_client = current_app.config.get('DB_CLIENT')
+    email = session.get("email")
+    if not email:
+        return jsonify({"ok": False, "error": "Sesión no válida"}), 400
+
+    try:
+        limite = min(max(int(request.args.get('limite', 24)), 1), 100)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        precio_min = float(request.args['precio_min']) if request.args.get('precio_min') else None
+        precio_max = float(request.args['precio_max']) if request.args.get('precio_max') else None
+    except ValueError:
+        return jsonify({"ok": False, "error": "Parámetros inválidos"}), 400
+    texto = (request.args.get('q') or '')[:200]
+    solo_en_stock = request.args.get('en_stock') in ('1', 'true')
+
+    with medir("busqueda", "buscar"):
+        resultados = fbs.buscar_productos(db_client, email, texto, precio_min, precio_max, solo_en_stock)
+    return jsonify({
+        "ok": True,
+        "productos": resultados[offset:offset + limite],
+        "total": len(resultados),
+        "siguiente_offset": offset + limite if offset + limite < len(resultados) else None,
+    }), 200
+
+@wizard_bp.route('/publish-status/<job_id>', methods=['GET'])
+def publish_status(job_id):
+    """Estado de una publicación encolada: etapas, progreso y tiempos."""
+    email = session.get("email")
+    trabajo = cola_publicacion.estado(job_id)
+    # Sólo el dueño de la tienda puede ver sus trabajos
+    if trabajo is None or trabajo["email"] != email:
+        return jsonify({"ok": False, "error": "Trabajo no encontrado"}), 404
+    trabajo.pop("email")
+    return jsonify({"ok": True, **trabajo}), 200
+
 @wizard_bp.route('/upload-image', methods=['POST'])
 def upload_image():
     """Ruta para subir y optimizar imágenes."""
-    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    almacen = current_app.config['UPLOADS']
     repo_name = session.get("repo_nombre")
     email = session.get("email")
 
@@ -172,20 +440,183 @@ def upload_image():
     if not imagen_file or not imagen_file.filename:
         return jsonify({"ok": False, "error": "No se recibió archivo"}), 400
         
-    # Lógica de optimización y guardado local
-    filename = secure_filename(imagen_file.filename)
-    path_local = os.path.join(upload_folder, filename)
-    imagen_file.save(path_local)
-
-    # Lógica de subida a GitHub (usando el servicio)
-    with open(path_local, 'rb') as f:
-        contenido_bytes = f.read()
-    
-    resultado = ghs.subir_archivo(repo_name, contenido_bytes, f"img/{filename}")
-    
-    if resultado.get("ok"):
-        return jsonify({"ok": True, "url": filename}) # Devuelve SÓLO el nombre del archivo
-    else:
-        return jsonify({"ok": False, "error": resultado.get("error")}), 500
+    # Optimización: se lee el archivo una sola vez y el pool de procesos genera las variantes WebP
+    contenido = imagen_file.read()
+    optimizada = ims.optimizar_imagen(contenido, email, almacen.carpeta(email))
+    if not optimizada.get("ok"):
+        return jsonify({"ok": False, "error": optimizada.get("error")}), 400
+
+    archivos = optimizada["archivos"]
+    almacen.registrar(email, archivos.values())
+
+    # En modo "commit" las imágenes viajan en el commit de publicación de /contenido
+    if current_app.config.get('GITHUB_MODO_PUBLICACION') == 'commit':
+        return jsonify({"ok": True, "url": archivos["card"], "thumb": archivos["thumb"]})
+
+    # Subida a GitHub de las variantes ya en memoria (sin releer del disco)
+    for variante, nombre in archivos.items():
+        resultado = ghs.subir_archivo(repo_name, optimizada["contenidos"][variante], f"img/{nombre}")
+        if not resultado.get("ok"):
+            return jsonify({"ok": False, "error": resultado.get("error")}), 500
+
+    # Devuelve SÓLO nombres de archivo: "url" es la variante para las tarjetas
+    return jsonify({"ok": True, "url": archivos["card"], "thumb": archivos["thumb"]})
+
+@wizard_bp.route('/upload-images', methods=['POST'])
+def upload_images():
+    """
+    Subida en lote: muchas imágenes en un solo multipart, con un resultado por archivo.
+    Cada parte se escribe a disco una vez mientras se hashea; las variantes codificadas
+    pasan de memoria a la publicación (un único commit para todo el lote en modo "archivos").
+    """
+    almacen = current_app.config['UPLOADS']
+    repo_name = session.get("repo_nombre")
+    email = session.get("email")
+
+    if not all([repo_name, email]):
+        return jsonify({"ok": False, "error": "Sesión no válida"}), 400
+
+    # El cuerpo se lee acá con los límites del lote (no con MAX_CONTENT_LENGTH, que es para los formularios)
+    carpeta = almacen.carpeta(email)
+    try:
+        lote = sl.recibir_lote(request.environ, carpeta)
+    except RequestEntityTooLarge:
+        return jsonify({"ok": False, "error": f"El lote supera los {sl.LOTE_MAX_MB:g} MB"}), 413
+    except ValueError:
+        return jsonify({"ok": False, "error": "Formulario inválido"}), 400
+
+    with lote:
+        partes = [p for p in lote.partes if p.nombre_original]
+        if not partes:
+            return jsonify({"ok": False, "error": "No se recibieron archivos"}), 400
+
+        validas = [(p.ruta, p.hash) for p in partes if p.descartada is None and p.tamano > 0]
+        # Mismo orden que `partes`: se consumen en el loop de abajo
+        optimizadas = iter(ims.optimizar_archivos(validas, email, carpeta))
+
+    resultados, variantes = [], {}
+    for parte in partes:
+        if parte.descartada == "sobrante":
+            optimizada = {"ok": False, "error": f"Se admiten hasta {sl.LOTE_MAX_ARCHIVOS} archivos por lote"}
+        elif parte.descartada == "excedido":
+            optimizada = {"ok": False, "error": f"El archivo supera los {sl.LOTE_MAX_MB_ARCHIVO:g} MB"}
+        elif not parte.tamano:
+            optimizada = {"ok": False, "error": "Archivo vacío"}
+        else:
+            optimizada = next(optimizadas)
+        if optimizada.get("ok"):
+            archivos = optimizada["archivos"]
+            for variante, nombre in archivos.items():
+                variantes[nombre] = optimizada["contenidos"][variante]
+            resultados.append({"archivo": parte.nombre_original, "ok": True,
+                               "url": archivos["card"], "thumb": archivos["thumb"]})
+        else:
+            resultados.append({"archivo": parte.nombre_original, "ok": False, "error": optimizada.get("error")})
+
+    if variantes:
+        almacen.registrar(email, variantes.keys())
+
+    # En modo "commit" las imágenes viajan en el commit de publicación de /contenido
+    if variantes and current_app.config.get('GITHUB_MODO_PUBLICACION') != 'commit':
+        publicado = ghs.publicar_commit(repo_name, {f"img/{n}": datos for n, datos in variantes.items()},
+                                        mensaje=f"Subir {len(variantes)} imágenes")
+        if not publicado.get("ok"):
+            for resultado in resultados:
+                if resultado["ok"]:
+                    resultado.update(ok=False, error=publicado.get("error") or "No se pudo subir a GitHub")
+                    resultado.pop("url"), resultado.pop("thumb")
+
+    correctos = sum(1 for r in resultados if r["ok"])
+    return jsonify({"ok": correctos == len(resultados), "correctos": correctos,
+                    "errores": len(resultados) - correctos, "resultados": resultados}), 200
+
+@wizard_bp.route('/importar-catalogo', methods=['POST'])
+def importar_catalogo():
+    """Importa un CSV/XLSX de productos directo a Firestore (streaming) y devuelve el reporte por fila."""
+    db_client = current_app.config.get('DB_CLIENT')
+    repo_name = session.get("repo_nombre")
+    email = session.get("email")
+
+    if not all([repo_name, email]):
+        return jsonify({"ok": False, "error": "Sesión no válida"}), 400
+
+    # Igual que /upload-images: el cuerpo se lee con el límite de la importación, no con MAX_CONTENT_LENGTH
+    try:
+        archivos = cim.recibir_archivo(request.environ)
+    except RequestEntityTooLarge:
+        return jsonify({"ok": False, "error": f"El archivo supera los {cim.IMPORTAR_MAX_MB:g} MB"}), 413
+    except ValueError:
+        return jsonify({"ok": False, "error": "Formulario inválido"}), 400
+
+    try:
+        archivo = archivos.get('archivo')
+        if not archivo or not archivo.filename:
+            return jsonify({"ok": False, "error": "No se recibió archivo"}), 400
+
+        reporte = cim.importar_catalogo(db_client, archivo.stream, archivo.filename, email, repo_name)
+    finally:
+        for archivo in archivos.values():
+            archivo.close()
+    return jsonify(reporte), (200 if reporte.get("ok") else 400)
+
+@wizard_bp.route('/exportar-catalogo', methods=['GET'])
+def exportar_catalogo():
+    """Catálogo actual en XLSX (?formato=xlsx, por defecto) o CSV, leído por páginas y enviado en streaming."""
+    db_client = current_app.config.get('DB_CLIENT')
+    email = session.get("email")
+    if not email:
+        return jsonify({"ok": False, "error": "Sesión no válida"}), 400
+    if not db_client:
+        return jsonify({"ok": False, "error": "Base de datos no disponible"}), 503
+
+    formato = (request.args.get('formato') or 'xlsx').lower()
+    if formato not in cex.MIMETYPES:
+        return jsonify({"ok": False, "error": "Formato no soportado. Usá xlsx o csv"}), 400
+
+    response = Response(cex.exportar_catalogo(db_client, email, formato), mimetype=cex.MIMETYPES[formato])
+    nombre = session.get("repo_nombre") or "catalogo"
+    response.headers['Content-Disposition'] = f'attachment; filename="{nombre}-catalogo.{formato}"'
+    return response
+
+@wizard_bp.route('/descargar', methods=['GET'])
+def descargar_sitio():
+    """
+    ZIP del sitio tal como se publica (index.html, iconos, logo e imágenes de productos).
+    El index.html pasa por el mismo build que la publicación (sin bloques de admin, fuentes
+    recortadas, minificado); los archivos se leen y comprimen en streaming, así la memoria
+    no crece con las imágenes.
+    """
+    db_client = current_app.config.get('DB_CLIENT')
+    upload_folder = current_app.config.get('UPLOAD_FOLDER')
+    email = session.get("email")
+    if not email:
+        return redirect(url_for('wizard_bp.step1'))
+
+    if not descargas_en_curso.acquire(blocking=False):
+        response = jsonify({"ok": False, "error": "Hay muchas descargas en curso, probá de nuevo en unos segundos"})
+        response.headers['Retry-After'] = '5'
+        return response, 429
+
+    try:
+        # El render de esta versión, si está en cache; si no, se renderiza
+        cacheado = render_cache.obtener(email, fbs.version_catalogo(email))
+        if cacheado is not None:
+            html = cacheado[0].decode('utf-8')
+        else:
+            productos, config_data, version = _datos_tienda(db_client, email)
+            html = _render_tienda(email, productos, config_data, version)
+        index_html = pa.construir_index(html)["archivos"]["index.html"]
+        archivos = ghs.rutas_archivos_sitio(upload_folder, email, session.get('logo'))
+        entradas = [("index.html", index_html)] + sorted(archivos.items())
+
+        response = Response(zs.generar_zip(entradas), mimetype='application/zip')
+    except Exception:
+        descargas_en_curso.release()
+        raise
+    # El cupo se libera cuando el servidor cierra la respuesta (enviada completa o cortada)
+    response.call_on_close(descargas_en_curso.release)
+    nombre = session.get("repo_nombre") or "sitio"
+    response.headers['Content-Disposition'] = f'attachment; filename="{nombre}.zip"'
+    return response
 
-# ... (Incluir aquí descargar_sitio y crear_repo completas)
+# ... (Incluir aquí crear_repo completa)
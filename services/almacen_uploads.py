@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import fcntl
+import threading
+from contextlib import contextmanager
+
+# ----------------------------------------------------
+# ALMACÉN DE UPLOADS POR USUARIO
+# ----------------------------------------------------
+# Cada usuario tiene su carpeta: <upload_folder>/usuarios/<id>/ (id = hash corto
+# del email) con un manifiesto (.manifiesto.json: archivos, bytes, última escritura).
+# Limpiar a un usuario es renombrar su carpeta a la papelera (O(1) en el request)
+# y listar lo suyo es O(archivos del usuario), no O(archivos de todos).
+# Un barrido en segundo plano vacía la papelera, desaloja las carpetas sin
+# escrituras hace más de UPLOADS_EDAD_MAX_HORAS y, si el total supera
+# UPLOADS_CUOTA_MB, desaloja las menos recientes hasta bajar de la cuota.
+# Con varios workers sólo barre el que toma el lock de archivo; los demás pasan.
+
+UPLOADS_EDAD_MAX_HORAS = float(os.getenv("UPLOADS_EDAD_MAX_HORAS", "72"))
+UPLOADS_CUOTA_MB = float(os.getenv("UPLOADS_CUOTA_MB", "1024"))
+UPLOADS_BARRIDO_SEGUNDOS = float(os.getenv("UPLOADS_BARRIDO_SEGUNDOS", "600"))
+# Carpetas con escrituras más recientes que esto no se desalojan por cuota (wizard en curso)
+UPLOADS_PROTECCION_MINUTOS = float(os.getenv("UPLOADS_PROTECCION_MINUTOS", "15"))
+
+SUBCARPETA = "usuarios"
+PAPELERA = ".papelera"
+MANIFIESTO = ".manifiesto.json"
+LOCK = ".lock"
+# Archivos sueltos del esquema anterior (todo en la carpeta raíz)
+PREFIJOS_PLANOS = ("optimizado_", "logo_")
+
+
+def id_usuario(email: str) -> str:
+    """Nombre de la carpeta del usuario (estable, sin caracteres del email)."""
+    return hashlib.sha1(email.strip().lower().encode("utf-8")).hexdigest()[:16]
+
+
+def ruta_relativa(email: str, nombre: str) -> str:
+    """Ruta de un archivo del usuario relativa a upload_folder (la que usan imgver y url_for)."""
+    return f"{SUBCARPETA}/{id_usuario(email)}/{nombre}"
+
+
+def carpeta_usuario(upload_folder: str, email: str) -> str:
+    return os.path.join(upload_folder, SUBCARPETA, id_usuario(email))
+
+
+def listar_usuario(upload_folder: str, email: str) -> dict:
+    """{nombre: ruta} de los archivos del usuario (sin temporales ni el manifiesto)."""
+    carpeta = carpeta_usuario(upload_folder, email)
+    try:
+        with os.scandir(carpeta) as entradas:
+            return {e.name: e.path for e in entradas
+                    if e.is_file() and not e.name.startswith(".") and not e.name.endswith(".tmp")}
+    except FileNotFoundError:
+        return {}
+
+
+def _leer_manifiesto(carpeta: str) -> dict:
+    try:
+        with open(os.path.join(carpeta, MANIFIESTO), encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        if isinstance(manifiesto.get("archivos"), dict):
+            return manifiesto
+    except (OSError, ValueError, AttributeError):
+        pass
+    # Sin manifiesto (o corrupto): se reconstruye con un scandir de la carpeta del usuario
+    archivos, actualizado = {}, 0.0
+    try:
+        with os.scandir(carpeta) as entradas:
+            for e in entradas:
+                if e.is_file() and not e.name.startswith("."):
+                    st = e.stat()
+                    archivos[e.name] = st.st_size
+                    actualizado = max(actualizado, st.st_mtime)
+    except FileNotFoundError:
+        pass
+    return {"archivos": archivos, "actualizado": actualizado}
+
+
+def _bytes_manifiesto(manifiesto: dict) -> int:
+    return sum(manifiesto["archivos"].values())
+
+
+class AlmacenUploads:
+    """Carpetas por usuario dentro de upload_folder, su manifiesto y el barrido de lo viejo."""
+
+    def __init__(self, upload_folder: str, indice=None, edad_max_horas: float = UPLOADS_EDAD_MAX_HORAS,
+                 cuota_mb: float = UPLOADS_CUOTA_MB, intervalo: float = UPLOADS_BARRIDO_SEGUNDOS):
+        self.upload_folder = upload_folder
+        self.raiz = os.path.join(upload_folder, SUBCARPETA)
+        self.papelera = os.path.join(self.raiz, PAPELERA)
+        self.indice = indice  # IndiceImagenes (imgver) a mantener al día, opcional
+        self.edad_max = edad_max_horas * 3600
+        self.cuota = int(cuota_mb * 1024 * 1024)
+        self.intervalo = intervalo
+        self._barrido_pid = None
+        self._lock = threading.Lock()
+        self._ultimo_barrido = None
+        os.makedirs(self.papelera, exist_ok=True)
+
+    # --- Escritura ---
+
+    def carpeta(self, email: str) -> str:
+        """Carpeta del usuario (se crea si no existe)."""
+        carpeta = carpeta_usuario(self.upload_folder, email)
+        os.makedirs(carpeta, exist_ok=True)
+        return carpeta
+
+    @contextmanager
+    def _bloqueo(self, carpeta: str):
+        # flock y no threading.Lock: el mismo usuario puede subir por varios workers a la vez
+        with open(os.path.join(carpeta, LOCK), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def registrar(self, email: str, nombres) -> list:
+        """
+        Anota en el manifiesto archivos recién escritos en la carpeta del usuario
+        y los actualiza en el índice imgver. Devuelve sus rutas relativas.
+        """
+        carpeta = self.carpeta(email)
+        relativos = []
+        with self._bloqueo(carpeta):
+            manifiesto = _leer_manifiesto(carpeta)
+            for nombre in nombres:
+                try:
+                    manifiesto["archivos"][nombre] = os.path.getsize(os.path.join(carpeta, nombre))
+                except OSError:
+                    manifiesto["archivos"].pop(nombre, None)
+                relativos.append(ruta_relativa(email, nombre))
+            manifiesto["actualizado"] = time.time()
+            tmp = os.path.join(carpeta, f"{MANIFIESTO}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(manifiesto, f)
+            os.replace(tmp, os.path.join(carpeta, MANIFIESTO))
+        if self.indice is not None:
+            for relativo in relativos:
+                self.indice.actualizar(relativo)
+        return relativos
+
+    def limpiar(self, email: str) -> bool:
+        """Descarta los uploads del usuario: un rename a la papelera; el borrado lo hace el barrido."""
+        if not email:
+            return False
+        carpeta = carpeta_usuario(self.upload_folder, email)
+        nombres = list(listar_usuario(self.upload_folder, email))
+        if not self._a_papelera(carpeta):
+            return False
+        if self.indice is not None:
+            for nombre in nombres:
+                self.indice.eliminar(ruta_relativa(email, nombre))
+        return True
+
+    def _a_papelera(self, carpeta: str) -> bool:
+        destino = os.path.join(self.papelera, f"{os.path.basename(carpeta)}.{time.time_ns()}")
+        try:
+            os.replace(carpeta, destino)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"❌ Error al descartar uploads en {carpeta}: {e}")
+            return False
+
+    # --- Barrido en segundo plano ---
+
+    def asegurar_barrido(self):
+        """Arranca (una vez por proceso) el hilo del barrido periódico."""
+        if self.intervalo <= 0 or self._barrido_pid == os.getpid():
+            return
+        with self._lock:
+            if self._barrido_pid == os.getpid():
+                return
+            # Tras un fork el hilo del padre no existe en el hijo: se arranca uno por PID
+            self._barrido_pid = os.getpid()
+        threading.Thread(target=self._bucle_barrido, name="uploads-barrido", daemon=True).start()
+
+    def _bucle_barrido(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.barrer()
+            except Exception as e:
+                print(f"⚠️ Error en el barrido de uploads: {e}")
+
+    def barrer(self, ahora: float = None) -> dict:
+        """Una pasada: papelera, desalojo por edad y por cuota. None si otro proceso está barriendo."""
+        ahora = time.time() if ahora is None else ahora
+        os.makedirs(self.raiz, exist_ok=True)
+        with open(os.path.join(self.raiz, ".barrido.lock"), "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            try:
+                resultado = self._barrer(ahora)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        with self._lock:
+            self._ultimo_barrido = {"momento": ahora, **resultado}
+        if resultado["por_edad"] or resultado["por_cuota"] or resultado["planos"]:
+            print(f"🧹 Barrido de uploads: {resultado}")
+        return resultado
+
+    def _barrer(self, ahora: float) -> dict:
+        resultado = {"papelera": self._vaciar_papelera(), "por_edad": 0, "por_cuota": 0,
+                     "planos": self._barrer_planos(ahora), "usuarios": 0, "bytes": 0}
+
+        carpetas = []  # (actualizado, bytes, id, ruta)
+        with os.scandir(self.raiz) as entradas:
+            for e in entradas:
+                if e.is_dir() and not e.name.startswith("."):
+                    manifiesto = _leer_manifiesto(e.path)
+                    carpetas.append((manifiesto.get("actualizado") or 0.0, _bytes_manifiesto(manifiesto), e.name, e.path))
+
+        vigentes = []
+        for actualizado, tamano, id_, ruta in carpetas:
+            if ahora - actualizado > self.edad_max and self._desalojar(id_, ruta):
+                resultado["por_edad"] += 1
+            else:
+                vigentes.append((actualizado, tamano, id_, ruta))
+
+        total = sum(c[1] for c in vigentes)
+        protegidas_desde = ahora - UPLOADS_PROTECCION_MINUTOS * 60
+        # Las menos recientes primero hasta quedar bajo la cuota
+        for actualizado, tamano, id_, ruta in sorted(vigentes):
+            if total <= self.cuota or actualizado >= protegidas_desde:
+                break
+            if self._desalojar(id_, ruta):
+                resultado["por_cuota"] += 1
+                total -= tamano
+
+        resultado["usuarios"] = len(vigentes) - resultado["por_cuota"]
+        resultado["bytes"] = total
+        if resultado["por_edad"] or resultado["por_cuota"]:
+            resultado["papelera"] += self._vaciar_papelera()
+        return resultado
+
+    def _desalojar(self, id_: str, ruta: str) -> bool:
+        nombres = [n for n in os.listdir(ruta) if not n.startswith(".")] if os.path.isdir(ruta) else []
+        if not self._a_papelera(ruta):
+            return False
+        if self.indice is not None:
+            for nombre in nombres:
+                self.indice.eliminar(f"{SUBCARPETA}/{id_}/{nombre}")
+        return True
+
+    def _vaciar_papelera(self) -> int:
+        borradas = 0
+        try:
+            with os.scandir(self.papelera) as entradas:
+                rutas = [e.path for e in entradas]
+        except FileNotFoundError:
+            return 0
+        for ruta in rutas:
+            shutil.rmtree(ruta, ignore_errors=True)
+            borradas += 1
+        return borradas
+
+    def _barrer_planos(self, ahora: float) -> int:
+        """Archivos del esquema anterior (optimizado_*/logo_* sueltos en la raíz) que ya vencieron."""
+        borrados = 0
+        with os.scandir(self.upload_folder) as entradas:
+            for e in entradas:
+                if not e.is_file() or not e.name.startswith(PREFIJOS_PLANOS):
+                    continue
+                try:
+                    if ahora - e.stat().st_mtime > self.edad_max:
+                        os.remove(e.path)
+                        borrados += 1
+                        if self.indice is not None:
+                            self.indice.eliminar(e.name)
+                except OSError as err:
+                    print(f"❌ Error al borrar archivo {e.name}: {err}")
+        return borrados
+
+    def estado(self) -> dict:
+        with self._lock:
+            ultimo = dict(self._ultimo_barrido) if self._ultimo_barrido else None
+        return {
+            "edad_max_horas": self.edad_max / 3600,
+            "cuota_mb": self.cuota / (1024 * 1024),
+            "intervalo_segundos": self.intervalo,
+            "ultimo_barrido": ultimo,
+        }
@@ -0,0 +1,81 @@
+import importlib
+import os
+import threading
+import time
+
+# ----------------------------------------------------
+# COSTO DE ARRANQUE: IMPORTS MEDIDOS Y MÓDULOS PEREZOSOS
+# ----------------------------------------------------
+# create_app() importa rutas y servicios con importar() y las librerías pesadas
+# (firebase_admin, mercadopago, PIL) se cargan con modulo_perezoso() recién en
+# el primer uso. Todo queda en reporte() para seguir el costo del cold start.
+# Los tiempos son inclusivos: un módulo incluye lo que importó por primera vez.
+# Para el árbol completo: python -X importtime -c "import app".
+
+_registros = []  # {"modulo", "ms", "fase", "pid"}
+_lock = threading.Lock()
+_inicio_proceso = time.perf_counter()
+
+
+def registrar(modulo: str, ms: float, fase: str):
+    with _lock:
+        _registros.append({"modulo": modulo, "ms": round(ms, 2), "fase": fase, "pid": os.getpid()})
+
+
+def importar(nombre: str, fase: str = "arranque"):
+    """importlib.import_module que anota cuánto tardó (sólo la primera vez que se importa)."""
+    inicio = time.perf_counter()
+    modulo = importlib.import_module(nombre)
+    ms = (time.perf_counter() - inicio) * 1000
+    if ms >= 0.05:  # Ya estaba importado: no se anota
+        registrar(nombre, ms, fase)
+    return modulo
+
+
+class ModuloPerezoso:
+    """Proxy de un módulo que se importa en el primer acceso a un atributo."""
+
+    def __init__(self, nombre: str):
+        self._nombre = nombre
+        self._modulo = None
+        self._lock = threading.Lock()
+
+    def _cargar(self):
+        with self._lock:
+            if self._modulo is None:
+                self._modulo = importar(self._nombre, fase="diferido")
+        return self._modulo
+
+    def __getattr__(self, atributo):
+        modulo = self._modulo if self._modulo is not None else self._cargar()
+        return getattr(modulo, atributo)
+
+    def __repr__(self):
+        estado = "cargado" if self._modulo is not None else "sin cargar"
+        return f"<módulo perezoso {self._nombre} ({estado})>"
+
+
+def modulo_perezoso(nombre: str) -> ModuloPerezoso:
+    return ModuloPerezoso(nombre)
+
+
+def reporte() -> dict:
+    """Imports medidos de este proceso, de más lento a más rápido, separados por fase."""
+    with _lock:
+        propios = [r for r in _registros if r["pid"] == os.getpid()]
+    por_fase = {}
+    for r in sorted(propios, key=lambda r: r["ms"], reverse=True):
+        por_fase.setdefault(r["fase"], []).append({"modulo": r["modulo"], "ms": r["ms"]})
+    return {
+        "pid": os.getpid(),
+        "desde_inicio_ms": round((time.perf_counter() - _inicio_proceso) * 1000, 2),
+        "total_ms": {fase: round(sum(r["ms"] for r in lista), 2) for fase, lista in por_fase.items()},
+        "modulos": por_fase,
+    }
+
+
+def resumen(fase: str = "arranque", cantidad: int = 5) -> str:
+    """Una línea para el log: total de la fase y los módulos más lentos."""
+    datos = reporte()
+    lentos = ", ".join(f"{r['modulo']} {r['ms']:.0f} ms" for r in datos["modulos"].get(fase, [])[:cantidad])
+    return f"{datos['total_ms'].get(fase, 0):.0f} ms ({lentos})"
@@ -0,0 +1,258 @@
+import re
+import bisect
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# ----------------------------------------------------
+# ÍNDICE DE BÚSQUEDA POR TIENDA (/buscar)
+# ----------------------------------------------------
+# Índice invertido término -> {id_base: peso} sobre nombre, descripción, grupo
+# y subgrupo, con el texto normalizado (sin acentos ni mayúsculas: "Camión" y
+# "camion" son el mismo término). El vocabulario se guarda ordenado para
+# resolver prefijos con bisect ("rem" encuentra "remera"). Se carga con el
+# catálogo que lee ver_productos y lo mantiene al día el cache de catálogo, que
+# le reenvía sus altas, parches e invalidaciones (CatalogoCache.suscribir_indice);
+# igual que el índice de precios, vive en memoria del proceso con LRU + TTL.
+
+# Peso de cada campo: una coincidencia en el nombre pesa más que en la descripción
+PESOS_CAMPOS = {"nombre": 3, "grupo": 2, "subgrupo": 2, "descripcion": 1}
+# Una coincidencia exacta vale el doble que una por prefijo
+FACTOR_EXACTO = 2
+MAX_TERMINOS_CONSULTA = 8
+# Términos más cortos que esto sólo coinciden exactos ("3" no trae 30, 300, 3000...)
+MIN_PREFIJO = 2
+
+_RE_TERMINO = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto) -> str:
+    """Minúsculas y sin diacríticos (á -> a, ñ -> n, ü -> u)."""
+    texto = str(texto or "")
+    if texto.isascii():
+        return texto.lower()
+    descompuesto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def terminos(texto) -> list:
+    return _RE_TERMINO.findall(normalizar(texto))
+
+
+def en_stock(producto: dict) -> bool:
+    """Como en el checkout: sin talles no hay control de stock; con talles, alguno > 0."""
+    talles = producto.get("talles_stock") or {}
+    if not isinstance(talles, dict) or not talles:
+        return True
+    return any(int(v or 0) > 0 for v in talles.values())
+
+
+class _TiendaBusqueda:
+    """Índice invertido de una tienda. No es thread-safe: lo protege el lock de IndiceBusqueda."""
+
+    def __init__(self):
+        self.productos = {}   # id_base -> producto
+        self.terminos = {}    # id_base -> {termino: peso} (para poder desindexar)
+        self.invertido = {}   # termino -> {id_base: peso}
+        self.vocabulario = [] # términos ordenados (búsqueda por prefijo)
+
+    def indexar(self, producto: dict, ordenar: bool = True):
+        """Agrega o reemplaza un producto. Con ordenar=False el vocabulario se ordena después (carga masiva)."""
+        id_base = producto.get("id_base")
+        if not id_base:
+            return
+        self.quitar(id_base)
+        pesos = {}
+        for campo, peso in PESOS_CAMPOS.items():
+            for termino in terminos(producto.get(campo)):
+                pesos[termino] = max(pesos.get(termino, 0), peso)
+        self.productos[id_base] = producto
+        self.terminos[id_base] = pesos
+        for termino, peso in pesos.items():
+            posting = self.invertido.get(termino)
+            if posting is None:
+                posting = self.invertido[termino] = {}
+                if ordenar:
+                    bisect.insort(self.vocabulario, termino)
+            posting[id_base] = peso
+
+    @classmethod
+    def desde(cls, productos: list):
+        indice = cls()
+        for p in productos:
+            indice.indexar(p, ordenar=False)
+        indice.vocabulario = sorted(indice.invertido)
+        return indice
+
+    def quitar(self, id_base: str):
+        pesos = self.terminos.pop(id_base, None)
+        self.productos.pop(id_base, None)
+        for termino in pesos or ():
+            posting = self.invertido.get(termino)
+            if posting is None:
+                continue
+            posting.pop(id_base, None)
+            if not posting:
+                del self.invertido[termino]
+                i = bisect.bisect_left(self.vocabulario, termino)
+                if i < len(self.vocabulario) and self.vocabulario[i] == termino:
+                    del self.vocabulario[i]
+
+    def _coincidencias(self, termino: str) -> list:
+        """[(término del vocabulario, factor)] de los que empiezan con `termino`."""
+        if len(termino) < MIN_PREFIJO:
+            return [(termino, FACTOR_EXACTO)] if termino in self.invertido else []
+        coincidencias = []
+        i = bisect.bisect_left(self.vocabulario, termino)
+        while i < len(self.vocabulario) and self.vocabulario[i].startswith(termino):
+            candidato = self.vocabulario[i]
+            coincidencias.append((candidato, FACTOR_EXACTO if candidato == termino else 1))
+            i += 1
+        return coincidencias
+
+    def _puntaje(self, id_base: str, coincidencias: list) -> int:
+        mejor = 0
+        for candidato, factor in coincidencias:
+            peso = self.invertido[candidato].get(id_base)
+            if peso is not None and peso * factor > mejor:
+                mejor = peso * factor
+        return mejor
+
+    def _union(self, coincidencias: list) -> dict:
+        """{id_base: mejor puntaje} de todos los productos de esos términos."""
+        puntajes = {}
+        for candidato, factor in coincidencias:
+            for id_base, peso in self.invertido[candidato].items():
+                if peso * factor > puntajes.get(id_base, 0):
+                    puntajes[id_base] = peso * factor
+        return puntajes
+
+    def buscar(self, consulta: list, precio_min=None, precio_max=None, solo_en_stock=False) -> list:
+        """Productos que tienen todos los términos (por prefijo), ordenados por puntaje y orden de catálogo."""
+        if consulta:
+            # Primero el término con menos productos; los demás se cruzan con esos candidatos
+            por_termino = []
+            for termino in consulta:
+                coincidencias = self._coincidencias(termino)
+                if not coincidencias:
+                    return []
+                por_termino.append((sum(len(self.invertido[c]) for c, _ in coincidencias), coincidencias))
+            por_termino.sort(key=lambda t: t[0])
+
+            acumulado = self._union(por_termino[0][1])
+            for total, coincidencias in por_termino[1:]:
+                if len(acumulado) * len(coincidencias) <= total:
+                    # Pocos candidatos: se prueban contra cada término (dict lookups)
+                    extras = {i: self._puntaje(i, coincidencias) for i in acumulado}
+                else:
+                    # Prefijo con muchos términos (p. ej. "1"): más barato unir sus listas una vez
+                    extras = self._union(coincidencias)
+                acumulado = {i: p + extras[i] for i, p in acumulado.items() if extras.get(i)}
+                if not acumulado:
+                    return []
+        else:
+            acumulado = dict.fromkeys(self.productos, 0)
+
+        resultados = []
+        for id_base, puntaje in acumulado.items():
+            producto = self.productos[id_base]
+            precio = float(producto.get("precio") or 0.0)
+            if precio_min is not None and precio < precio_min:
+                continue
+            if precio_max is not None and precio > precio_max:
+                continue
+            if solo_en_stock and not en_stock(producto):
+                continue
+            resultados.append((-puntaje, producto.get("orden", 9999), producto.get("orden_time", 0), id_base))
+        resultados.sort()
+        return [self.productos[r[3]] for r in resultados]
+
+
+class IndiceBusqueda:
+    """Índices de búsqueda por tienda, acotados (LRU + TTL)."""
+
+    def __init__(self, max_tiendas: int = 256, ttl: float = 300.0):
+        self.max_tiendas = max_tiendas
+        self.ttl = ttl
+        self._tiendas = OrderedDict()  # email -> {"indice": _TiendaBusqueda, "expira": t}
+        self._lock = threading.Lock()
+        self._consultas = 0
+        self._sin_indice = 0
+        self._cargas = 0
+        self._parches = 0
+
+    def _vigente(self, email: str):
+        tienda = self._tiendas.get(email)
+        if tienda is not None and tienda["expira"] <= time.monotonic():
+            del self._tiendas[email]
+            return None
+        return tienda
+
+    # --- Carga y parches ---
+
+    def cargar(self, email: str, productos: list):
+        """Reemplaza el índice de la tienda con el catálogo completo."""
+        indice = _TiendaBusqueda.desde(productos)
+        with self._lock:
+            self._tiendas[email] = {"indice": indice, "expira": time.monotonic() + self.ttl}
+            self._tiendas.move_to_end(email)
+            while len(self._tiendas) > self.max_tiendas:
+                self._tiendas.popitem(last=False)
+            self._cargas += 1
+
+    def esta_cargada(self, email: str) -> bool:
+        with self._lock:
+            return self._vigente(email) is not None
+
+    def agregar(self, email: str, productos: list):
+        """Indexa productos recién escritos (sólo si la tienda ya está indexada)."""
+        with self._lock:
+            tienda = self._vigente(email)
+            if tienda is None:
+                return
+            for p in productos:
+                tienda["indice"].indexar(p)
+            self._parches += 1
+
+    def parchear(self, email: str, id_base: str, campos: dict):
+        """Reindexa el producto con `campos` aplicados; si no estaba indexado no hace nada."""
+        with self._lock:
+            tienda = self._vigente(email)
+            if tienda is None or id_base not in tienda["indice"].productos:
+                return
+            tienda["indice"].indexar({**tienda["indice"].productos[id_base], **campos})
+            self._parches += 1
+
+    def descartar(self, email: str):
+        """Olvida la tienda: la próxima búsqueda reconstruye el índice desde el catálogo."""
+        with self._lock:
+            self._tiendas.pop(email, None)
+
+    # --- Consulta ---
+
+    def buscar(self, email: str, texto: str, precio_min: float = None, precio_max: float = None,
+               solo_en_stock: bool = False):
+        """Lista de productos que coinciden, o None si la tienda no está indexada."""
+        consulta = list(dict.fromkeys(terminos(texto)))[:MAX_TERMINOS_CONSULTA]
+        with self._lock:
+            tienda = self._vigente(email)
+            if tienda is None:
+                self._sin_indice += 1
+                return None
+            self._tiendas.move_to_end(email)
+            self._consultas += 1
+            return tienda["indice"].buscar(consulta, precio_min, precio_max, solo_en_stock)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "consultas": self._consultas,
+                "sin_indice": self._sin_indice,
+                "cargas": self._cargas,
+                "parches": self._parches,
+                "tiendas": len(self._tiendas),
+                "terminos": sum(len(t["indice"].invertido) for t in self._tiendas.values()),
+                "max_tiendas": self.max_tiendas,
+                "ttl": self.ttl,
+            }
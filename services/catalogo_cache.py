@@ -0,0 +1,209 @@
+import threading
+import time
+import itertools
+from collections import OrderedDict
+
+# ----------------------------------------------------
+# CACHE DE CATÁLOGO POR TIENDA (LRU + TTL)
+# ----------------------------------------------------
+# Cada entrada guarda la lista de productos y la config general de una tienda
+# (clave: email). El cache vive en memoria del proceso: con varios workers de
+# gunicorn cada uno tiene el suyo, por eso el TTL acota cuánto puede quedar
+# desactualizado un worker que no recibió la escritura.
+
+# Contador global: cada llenado o modificación recibe una versión nueva y nunca
+# se reutiliza, aunque la entrada haya sido desalojada.
+_versiones = itertools.count(1)
+
+
+class CatalogoCache:
+    """Cache acotado (LRU + TTL) de productos y configuración por tienda."""
+
+    def __init__(self, max_tiendas: int = 256, ttl: float = 300.0):
+        self.max_tiendas = max_tiendas
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # email -> dict(productos, config, version, expira)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._expirados = 0
+        self._desalojados = 0
+        self._invalidaciones = 0
+        self._parches = 0
+        self._suscriptores = []
+        self._indices = []
+        # email -> cantidad de escrituras vistas; permite descartar lecturas que
+        # se cruzaron con una escritura (ver guardar()).
+        self._escrituras = {}
+
+    def suscribir(self, callback):
+        """Registra callback(email) que se llama cada vez que cambia el catálogo de una tienda."""
+        self._suscriptores.append(callback)
+
+    def suscribir_indice(self, indice):
+        """
+        Registra un índice derivado del catálogo (precios, búsqueda) con la interfaz
+        agregar(email, docs) / parchear(email, id_base, campos) / descartar(email):
+        recibe las mismas altas y parches que el cache y se descarta cuando se invalida.
+        """
+        self._indices.append(indice)
+
+    def _a_indices(self, metodo: str, email: str, *args):
+        for indice in self._indices:
+            try:
+                getattr(indice, metodo)(email, *args)
+            except Exception as e:
+                print(f"⚠️ Error actualizando índice del catálogo ({metodo}): {e}")
+
+    def _notificar(self, email: str):
+        with self._lock:
+            self._escrituras[email] = self._escrituras.get(email, 0) + 1
+        # Fuera del lock: los suscriptores pueden consultar el cache
+        for callback in self._suscriptores:
+            try:
+                callback(email)
+            except Exception as e:
+                print(f"⚠️ Error en suscriptor del cache de catálogo: {e}")
+
+    # --- Lectura ---
+
+    def obtener(self, email: str):
+        """Devuelve (productos, config, version) o None si no hay entrada vigente."""
+        with self._lock:
+            entrada = self._entradas.get(email)
+            if entrada is None:
+                self._misses += 1
+                return None
+            if entrada["expira"] <= time.monotonic():
+                del self._entradas[email]
+                self._expirados += 1
+                self._misses += 1
+                return None
+            self._entradas.move_to_end(email)
+            self._hits += 1
+            # Copias superficiales: quien llama puede modificar la lista o la config
+            # (p.ej. preview agrega public_key) sin tocar el cache.
+            return list(entrada["productos"]), dict(entrada["config"]), entrada["version"]
+
+    def version(self, email: str):
+        """Versión actual del catálogo cacheado de la tienda (None si no está en cache)."""
+        with self._lock:
+            entrada = self._entradas.get(email)
+            if entrada is None or entrada["expira"] <= time.monotonic():
+                return None
+            return entrada["version"]
+
+    def marca_escritura(self, email: str) -> int:
+        """Marca a tomar antes de leer de Firestore y pasar luego a guardar()."""
+        with self._lock:
+            return self._escrituras.get(email, 0)
+
+    # --- Escritura ---
+
+    def guardar(self, email: str, productos: list, config: dict, marca: int = None):
+        """
+        Guarda el catálogo leído de Firestore y devuelve su versión. Si desde `marca`
+        hubo una escritura, la lectura puede estar vieja: no se cachea y devuelve None.
+        """
+        version = next(_versiones)
+        with self._lock:
+            if marca is not None and self._escrituras.get(email, 0) != marca:
+                return None
+            self._entradas[email] = {
+                "productos": list(productos),
+                "config": dict(config),
+                "version": version,
+                "expira": time.monotonic() + self.ttl,
+            }
+            self._entradas.move_to_end(email)
+            while len(self._entradas) > self.max_tiendas:
+                self._entradas.popitem(last=False)
+                self._desalojados += 1
+        return version
+
+    def invalidar(self, email: str):
+        """Descarta el catálogo de la tienda; la próxima lectura va a Firestore."""
+        with self._lock:
+            if self._entradas.pop(email, None) is not None:
+                self._invalidaciones += 1
+        self._a_indices("descartar", email)
+        self._notificar(email)
+
+    def agregar_productos(self, email: str, docs: list):
+        """Agrega productos recién subidos al final del catálogo (orden_time creciente)."""
+        with self._lock:
+            entrada = self._entradas.get(email)
+            if entrada is not None:
+                entrada["productos"] = entrada["productos"] + list(docs)
+                entrada["version"] = next(_versiones)
+                self._parches += 1
+        self._a_indices("agregar", email, list(docs))
+        self._notificar(email)
+
+    def parchear_producto(self, email: str, id_base: str, campos: dict) -> bool:
+        """Aplica `campos` al producto `id_base` en cache. Devuelve False si no estaba."""
+        parcheado = False
+        with self._lock:
+            entrada = self._entradas.get(email)
+            if entrada is not None:
+                productos = entrada["productos"]
+                for i, producto in enumerate(productos):
+                    if producto.get("id_base") == id_base:
+                        # Copy-on-write: las listas ya entregadas siguen viendo el dict viejo.
+                        nuevos = list(productos)
+                        nuevos[i] = {**producto, **campos}
+                        entrada["productos"] = nuevos
+                        entrada["version"] = next(_versiones)
+                        self._parches += 1
+                        parcheado = True
+                        break
+                else:
+                    # El producto no está en la copia cacheada: mejor releer todo.
+                    del self._entradas[email]
+                    self._invalidaciones += 1
+        # Los índices se parchean aunque el cache no tenga la tienda (si no la tienen, no hacen nada)
+        self._a_indices("parchear", email, id_base, campos)
+        self._notificar(email)
+        return parcheado
+
+    def sumar_stock(self, email: str, deltas: dict):
+        """
+        Refleja un Increment ya escrito en Firestore: suma {id_base: {talle: delta}} al
+        talles_stock cacheado y parchea cada producto (y los índices) con el resultado.
+        Si la tienda o alguno de los productos no está en cache se invalida todo: sin el
+        stock de partida no hay valor absoluto con qué parchear los índices.
+        """
+        nuevos = {}
+        with self._lock:
+            entrada = self._entradas.get(email)
+            for producto in (entrada["productos"] if entrada is not None else ()):
+                por_talle = deltas.get(producto.get("id_base"))
+                if por_talle:
+                    stock = dict(producto.get("talles_stock") or {})
+                    for talle, delta in por_talle.items():
+                        stock[talle] = stock.get(talle, 0) + delta
+                    nuevos[producto["id_base"]] = stock
+        if len(nuevos) < len(deltas):
+            self.invalidar(email)
+            return
+        for id_base, stock in nuevos.items():
+            self.parchear_producto(email, id_base, {"talles_stock": stock})
+
+    # --- Métricas ---
+
+    def estadisticas(self) -> dict:
+        """Contadores de uso del cache (hits, misses, tamaño, etc.)."""
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / total, 4) if total else 0.0,
+                "expirados": self._expirados,
+                "desalojados": self._desalojados,
+                "invalidaciones": self._invalidaciones,
+                "parches": self._parches,
+                "tiendas": len(self._entradas),
+                "max_tiendas": self.max_tiendas,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,150 @@
+import io
+import os
+import csv
+import json
+import re
+import tempfile
+
+from services import firebase_service as fbs
+
+# ----------------------------------------------------
+# EXPORTACIÓN DE CATÁLOGO (CSV / XLSX) EN STREAMING
+# ----------------------------------------------------
+# Contraparte de catalogo_import: los productos se leen de Firestore por páginas
+# y cada fila se escribe apenas llega. El CSV sale al cliente a medida que se
+# arma; el XLSX se escribe con openpyxl en modo write-only (las filas van a un
+# temporal en disco) y el archivo terminado se envía por bloques.
+# Las columnas coinciden con los alias del importador, así que el archivo
+# exportado se puede volver a importar tal cual (también los textos del CSV que
+# se escapan con "'" para que la planilla no los tome como fórmula). Además, cada talle de
+# talles_stock tiene su propia columna "Stock <talle>".
+
+EXPORTAR_TAM_PAGINA = int(os.getenv("EXPORTAR_TAM_PAGINA", "500"))
+BLOQUE_ENVIO = 64 * 1024
+
+COLUMNAS = [
+    ("id", "id_base"), ("grupo", "grupo"), ("subgrupo", "subgrupo"), ("nombre", "nombre"),
+    ("descripcion", "descripcion"), ("precio", "precio"), ("talles", None),
+    ("imagen", "imagen_github"), ("orden", "orden"),
+]
+# Orden habitual de los talles con letra; los numéricos van de menor a mayor
+ORDEN_TALLES = ["XXS", "XS", "S", "M", "L", "XL", "XXL", "XXXL", "UNICO"]
+
+# Un texto que empieza con alguno de estos la planilla lo toma como fórmula (CSV injection)
+INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+MIMETYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def _talles(producto: dict) -> dict:
+    """talles_stock como dict (en documentos viejos puede ser un JSON string)."""
+    talles = producto.get("talles_stock") or {}
+    if isinstance(talles, str):
+        try:
+            talles = json.loads(talles)
+        except ValueError:
+            return {}
+    return talles if isinstance(talles, dict) else {}
+
+
+def _clave_talle(talle: str):
+    texto = str(talle).strip().upper()
+    if re.fullmatch(r"\d+([.,]\d+)?", texto):
+        return (0, float(texto.replace(",", ".")), "")
+    if texto in ORDEN_TALLES:
+        return (1, ORDEN_TALLES.index(texto), "")
+    return (2, 0, texto)
+
+
+def talles_del_catalogo(db_client, email: str) -> list:
+    """Primera pasada sólo con talles_stock: el conjunto de talles define las columnas."""
+    talles = set()
+    for producto in fbs.paginar_productos(db_client, email, campos=["talles_stock"], tam_pagina=EXPORTAR_TAM_PAGINA):
+        talles.update(str(t) for t in _talles(producto))
+    return sorted(talles, key=_clave_talle)
+
+
+def encabezado(talles: list) -> list:
+    return [nombre for nombre, _ in COLUMNAS] + [f"Stock {t}" for t in talles]
+
+
+def fila_producto(producto: dict, talles: list) -> list:
+    stock = {str(k): v for k, v in _talles(producto).items()}
+    fila = []
+    for nombre, campo in COLUMNAS:
+        if campo is None:
+            # Mismo formato que acepta el importador: "S:3, M:5"
+            fila.append(", ".join(f"{t}:{c}" for t, c in sorted(stock.items(), key=lambda kv: _clave_talle(kv[0]))))
+        else:
+            fila.append(producto.get(campo, ""))
+    return fila + [stock.get(t, "") for t in talles]
+
+
+def filas(db_client, email: str):
+    """Encabezado y una fila por producto, en el orden de carga, sin tener el catálogo en memoria."""
+    talles = talles_del_catalogo(db_client, email)
+    yield encabezado(talles)
+    for producto in fbs.paginar_productos(db_client, email, tam_pagina=EXPORTAR_TAM_PAGINA):
+        yield fila_producto(producto, talles)
+
+# ----------------------------------------------------
+# ESCRITORES
+# ----------------------------------------------------
+
+def neutralizar_formula(valor):
+    """Antepone "'" a los textos que una planilla ejecutaría como fórmula (el importador lo quita)."""
+    if isinstance(valor, str) and valor.startswith(INICIO_FORMULA):
+        return "'" + valor
+    return valor
+
+
+def generar_csv(db_client, email: str):
+    """Bytes del CSV (UTF-8 con BOM para que Excel respete los acentos) por bloques."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write("\ufeff")
+    for fila in filas(db_client, email):
+        escritor.writerow([neutralizar_formula(v) for v in fila])
+        if buffer.tell() >= BLOQUE_ENVIO:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def generar_xlsx(db_client, email: str):
+    """
+    Arma el XLSX con openpyxl write-only en un temporal y produce sus bytes por bloques.
+    El temporal se borra al terminar (o si el cliente corta la descarga).
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    def celda(valor):
+        # Un texto que empieza con "=" sería una fórmula: se fuerza a texto
+        if isinstance(valor, str) and valor.startswith("="):
+            valor = WriteOnlyCell(hoja, valor)
+            valor.data_type = "s"
+        return valor
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet("Catálogo")
+    for fila in filas(db_client, email):
+        hoja.append([celda(v) for v in fila])
+
+    with tempfile.TemporaryFile(suffix=".xlsx") as temporal:
+        libro.save(temporal)
+        temporal.seek(0)
+        yield from iter(lambda: temporal.read(BLOQUE_ENVIO), b"")
+
+
+def exportar_catalogo(db_client, email: str, formato: str):
+    """Generador de bytes del catálogo en `formato` ("csv" o "xlsx")."""
+    if formato == "csv":
+        return generar_csv(db_client, email)
+    if formato == "xlsx":
+        return generar_xlsx(db_client, email)
+    raise ValueError(f"Formato no soportado: {formato!r}")
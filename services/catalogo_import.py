@@ -0,0 +1,290 @@
+import io
+import os
+import csv
+import json
+import re
+import unicodedata
+import zipfile
+from itertools import chain
+
+from werkzeug.formparser import FormDataParser
+
+from services import firebase_service as fbs
+
+# ----------------------------------------------------
+# IMPORTACIÓN DE CATÁLOGO (CSV / XLSX) EN STREAMING
+# ----------------------------------------------------
+# Las filas se leen de a una (csv / openpyxl read-only) y se suben a Firestore
+# en bloques: la memoria depende del tamaño del bloque, no del archivo.
+
+# Productos por bloque enviado a subir_productos_batch (varios WriteBatch en paralelo)
+TAM_BLOQUE = fbs.LIMITE_OPS_BATCH * 4
+# Tope de errores detallados en el reporte (el total se cuenta siempre)
+MAX_ERRORES_REPORTE = 1000
+# Límite propio del archivo importado (el MAX_CONTENT_LENGTH global de la app es para los formularios)
+IMPORTAR_MAX_MB = float(os.getenv("IMPORTAR_MAX_MB", "50"))
+
+# Encabezados aceptados (mismos alias que el importador de step3.html), ya normalizados
+ALIAS_COLUMNAS = {
+    "grupo": "grupo", "categoria": "grupo",
+    "subgrupo": "subgrupo", "subcategoria": "subgrupo",
+    "nombre": "nombre", "producto": "nombre",
+    "descripcion": "descripcion",
+    "precio": "precio",
+    "talles": "talles", "talle": "talles", "stock": "talles",
+    "imagen": "imagen_github", "imagen_github": "imagen_github",
+    "orden": "orden",
+    "id": "id_base", "id_base": "id_base",
+}
+
+
+def _normalizar_encabezado(valor) -> str:
+    texto = unicodedata.normalize("NFKD", str(valor or "")).encode("ascii", "ignore").decode("ascii")
+    return texto.strip().lower().replace(" ", "_")
+
+
+def _parsear_precio(valor) -> float:
+    """Acepta números y textos tipo '$ 1.234,50', '1234.5' o '1,234.50'."""
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = re.sub(r"[^\d,.\-]", "", str(valor or ""))
+    if not texto:
+        raise ValueError("precio vacío")
+    if "," in texto and "." in texto:
+        # El separador que aparece último es el decimal
+        if texto.rfind(",") > texto.rfind("."):
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    elif "," in texto:
+        texto = texto.replace(",", ".")
+    elif re.fullmatch(r"-?\d{1,3}(\.\d{3})+", texto):
+        # 1.234 / 12.345.678 -> separador de miles
+        texto = texto.replace(".", "")
+    return float(texto)
+
+
+def _parsear_talles(valor) -> dict:
+    """'S,M,L' -> {S: 0, ...}; 'S:3, M:5' -> {S: 3, M: 5}; también acepta JSON."""
+    if valor is None or str(valor).strip() == "":
+        return {}
+    texto = str(valor).strip()
+    if texto.startswith("{"):
+        datos = json.loads(texto)
+        return {str(k): int(v) for k, v in datos.items()}
+    talles = {}
+    for parte in re.split(r"[,;/|]", texto):
+        parte = parte.strip()
+        if not parte:
+            continue
+        if ":" in parte or "=" in parte:
+            talle, cantidad = re.split(r"[:=]", parte, maxsplit=1)
+            talles[talle.strip()] = int(float(cantidad.strip() or 0))
+        else:
+            talles[parte] = 0
+    return talles
+
+
+def validar_fila(fila: dict):
+    """Convierte una fila cruda en producto para Firestore. Devuelve (producto | None, [errores])."""
+    errores = []
+    texto = {k: ("" if v is None else str(v).strip()) for k, v in fila.items()}
+
+    if not texto.get("nombre"):
+        errores.append("Falta el nombre")
+    if not (texto.get("grupo") and texto.get("subgrupo")):
+        errores.append("Falta grupo/subgrupo")
+
+    precio = None
+    try:
+        precio = _parsear_precio(fila.get("precio"))
+        if precio < 0:
+            errores.append("Precio negativo")
+    except ValueError:
+        errores.append(f"Precio inválido: {texto.get('precio')!r}")
+
+    talles = {}
+    try:
+        talles = _parsear_talles(fila.get("talles"))
+        if any(v < 0 for v in talles.values()):
+            errores.append("Stock negativo")
+    except (ValueError, TypeError, AttributeError):
+        errores.append(f"Talles inválidos: {texto.get('talles')!r}")
+
+    orden = 9999
+    if texto.get("orden"):
+        try:
+            orden = int(float(texto["orden"]))
+        except ValueError:
+            errores.append(f"Orden inválido: {texto['orden']!r}")
+
+    if errores:
+        return None, errores
+
+    producto = {
+        "nombre": texto["nombre"],
+        "grupo": texto["grupo"],
+        "subgrupo": texto["subgrupo"],
+        "descripcion": texto.get("descripcion") or "Sin descripción",
+        "precio": precio,
+        "talles_stock": json.dumps(talles),  # subir_a_firestore espera JSON string
+        "imagen_github": texto.get("imagen_github", ""),
+        "orden": orden,
+    }
+    if texto.get("id_base"):
+        producto["id_base"] = texto["id_base"]
+    return producto, []
+
+# ----------------------------------------------------
+# LECTORES (GENERADORES DE DICTS)
+# ----------------------------------------------------
+
+def _filas_con_encabezado(filas):
+    """Mapea encabezados a campos conocidos y produce (numero_fila, dict) por fila de datos."""
+    columnas = None
+    for numero, valores in enumerate(filas, start=1):
+        if columnas is None:
+            if not any(v not in (None, "") for v in valores):
+                continue  # filas vacías antes del encabezado
+            columnas = [ALIAS_COLUMNAS.get(_normalizar_encabezado(v)) for v in valores]
+            continue
+        if not any(v not in (None, "") for v in valores):
+            continue
+        fila = {}
+        for campo, valor in zip(columnas, valores):
+            if campo and campo not in fila:
+                fila[campo] = valor
+        yield numero, fila
+
+
+def _sin_escape_formula(valor: str) -> str:
+    """Quita el "'" con que la exportación escapa los textos que parecen fórmula ("'=x" -> "=x")."""
+    if valor[:1] == "'" and valor[1:2] and valor[1] in "=+-@\t\r":
+        return valor[1:]
+    return valor
+
+
+def iterar_filas_csv(stream, encoding: str = "utf-8-sig"):
+    """Lee un CSV/TXT (',', ';' o tab) sin cargarlo entero en memoria."""
+    texto = io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+    primera = texto.readline()
+    delimitador = max([",", ";", "\t"], key=primera.count)
+    lector = csv.reader(chain([primera], texto), delimiter=delimitador)
+    yield from _filas_con_encabezado([_sin_escape_formula(v) for v in fila] for fila in lector)
+
+
+def iterar_filas_xlsx(stream):
+    """Lee la primera hoja de un XLSX en modo read-only (filas en streaming)."""
+    from openpyxl import load_workbook
+
+    libro = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        yield from _filas_con_encabezado(hoja.iter_rows(values_only=True))
+    finally:
+        libro.close()
+
+# Lo que puede lanzar un lector con un archivo dañado, mal codificado o que no es del formato
+ERRORES_LECTURA = (csv.Error, UnicodeError, zipfile.BadZipFile, KeyError, ValueError, EOFError, OSError)
+
+
+class ArchivoIlegible(Exception):
+    """El archivo no se pudo leer o parsear."""
+
+
+class ErrorEscritura(Exception):
+    """Firestore rechazó o no respondió a un bloque de la importación."""
+
+
+def _filas_legibles(filas, errores_lectura=ERRORES_LECTURA):
+    """
+    Las filas del lector; sus errores de lectura salen como ArchivoIlegible.
+    Sólo se envuelve el next() del lector, así un error al escribir en Firestore
+    nunca se confunde con un archivo corrupto.
+    """
+    while True:
+        try:
+            fila = next(filas)
+        except StopIteration:
+            return
+        except errores_lectura as e:
+            raise ArchivoIlegible(str(e)) from e
+        yield fila
+
+# ----------------------------------------------------
+# IMPORTACIÓN
+# ----------------------------------------------------
+
+def recibir_archivo(environ, max_mb: float = IMPORTAR_MAX_MB):
+    """
+    Lee el multipart del request directo del stream WSGI con el límite de la importación
+    (los archivos grandes se vuelcan a un temporal, no quedan en memoria). Devuelve los
+    archivos recibidos; hay que cerrarlos. Lanza RequestEntityTooLarge si el cuerpo supera
+    max_mb y ValueError si está mal formado.
+    """
+    parser = FormDataParser(max_content_length=int(max_mb * 1024 * 1024), silent=False)
+    _, _form, archivos = parser.parse_from_environ(environ)
+    return archivos
+
+
+def importar_catalogo(db_client, stream, nombre_archivo: str, email: str, repo_name: str,
+                      tam_bloque: int = TAM_BLOQUE) -> dict:
+    """Valida y sube a Firestore un CSV/XLSX en bloques. Devuelve el reporte por fila."""
+    extension = (nombre_archivo or "").rsplit(".", 1)[-1].lower()
+    if extension in ("csv", "txt"):
+        filas = _filas_legibles(iterar_filas_csv(stream))
+    elif extension in ("xlsx", "xlsm"):
+        from openpyxl.utils.exceptions import InvalidFileException
+        filas = _filas_legibles(iterar_filas_xlsx(stream), ERRORES_LECTURA + (InvalidFileException,))
+    else:
+        return {"ok": False, "error": "Formato no soportado. Subí CSV, TXT o Excel (.xlsx)"}
+
+    reporte = {"ok": True, "filas": 0, "importados": 0, "con_error": 0, "errores": [], "errores_truncados": False}
+
+    def registrar_error(numero, errores):
+        reporte["con_error"] += 1
+        if len(reporte["errores"]) < MAX_ERRORES_REPORTE:
+            reporte["errores"].append({"fila": numero, "errores": errores})
+        else:
+            reporte["errores_truncados"] = True
+
+    def subir_bloque(bloque):
+        try:
+            resultado = fbs.subir_productos_batch(db_client, [p for _, p in bloque], email, repo_name)
+        except Exception as e:
+            # Falla de Firestore/red: las filas del bloque no se guardaron y se corta la importación
+            for numero, _ in bloque:
+                registrar_error(numero, ["No se pudo guardar en la base de datos"])
+            raise ErrorEscritura(str(e)) from e
+        reporte["importados"] += resultado["subidos"]
+        for (numero, _), r in zip(bloque, resultado["resultados"]):
+            if not r["ok"]:
+                registrar_error(numero, [r["error"]])
+
+    bloque = []
+    try:
+        for numero, fila in filas:
+            reporte["filas"] += 1
+            producto, errores = validar_fila(fila)
+            if errores:
+                registrar_error(numero, errores)
+                continue
+            bloque.append((numero, producto))
+            if len(bloque) >= tam_bloque:
+                subir_bloque(bloque)
+                bloque = []
+        if bloque:
+            subir_bloque(bloque)
+    except ArchivoIlegible as e:
+        # Archivo corrupto / ilegible: se reporta lo que se llegó a importar
+        print(f"❌ Error leyendo catálogo {nombre_archivo} para {email}: {e}")
+        reporte["ok"] = False
+        reporte["error"] = f"No se pudo leer el archivo: {e}"
+    except ErrorEscritura as e:
+        print(f"❌ Error guardando catálogo {nombre_archivo} para {email}: {e}")
+        reporte["ok"] = False
+        reporte["error"] = (f"Error al guardar en la base de datos (se importaron {reporte['importados']} "
+                            f"productos antes del error): {e}")
+
+    print(f"✅ Importación {nombre_archivo}: {reporte['importados']}/{reporte['filas']} filas para {email}")
+    return reporte
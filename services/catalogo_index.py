@@ -0,0 +1,129 @@
+import os
+import json
+import base64
+import threading
+from collections import OrderedDict
+
+from services import firebase_service as fbs
+
+# ----------------------------------------------------
+# ÍNDICE AGRUPADO Y ORDENADO DEL CATÁLOGO
+# ----------------------------------------------------
+# Se construye una vez por versión del catálogo (ver catalogo_cache) y sirve
+# tanto al render de preview.html (grupo -> subgrupo -> productos) como a la
+# paginación por cursor de /ver-productos.
+
+ORDENES = ("orden", "precio_asc", "precio_desc")
+GRUPO_DEFAULT = "General"
+SUBGRUPO_DEFAULT = "General"
+
+
+def _clave_orden(p: dict):
+    return (p.get("orden", 9999), p.get("orden_time", 0))
+
+
+class IndiceCatalogo:
+    """Vistas pre-ordenadas (orden, precio) y agrupadas de los productos de una tienda."""
+
+    def __init__(self, productos: list, version=None):
+        self.version = version
+        self.por_orden = sorted(productos, key=_clave_orden)
+        # sorted es estable: a igual precio se respeta el orden de carga
+        self.por_precio = sorted(self.por_orden, key=lambda p: p.get("precio") or 0.0)
+        self.grupos = self._agrupar(self.por_orden)
+        self._filtrados = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _agrupar(productos: list) -> OrderedDict:
+        grupos = OrderedDict()
+        for p in productos:
+            grupo = (p.get("grupo") or GRUPO_DEFAULT).strip()
+            subgrupo = (p.get("subgrupo") or SUBGRUPO_DEFAULT).strip()
+            grupos.setdefault(grupo, OrderedDict()).setdefault(subgrupo, []).append(p)
+        return grupos
+
+    def estructura(self) -> dict:
+        """{grupo: {subgrupo: cantidad}}: lo que el JS necesita sin mandar los productos."""
+        return {g: {s: len(ps) for s, ps in subs.items()} for g, subs in self.grupos.items()}
+
+    def lista(self, orden: str = "orden", grupo: str = None, subgrupo: str = None) -> list:
+        """Lista ordenada (y opcionalmente filtrada). Las combinaciones se memorizan."""
+        clave = (orden, grupo, subgrupo)
+        with self._lock:
+            if clave in self._filtrados:
+                return self._filtrados[clave]
+        if orden == "precio_asc":
+            base = self.por_precio
+        elif orden == "precio_desc":
+            base = self.por_precio[::-1]
+        else:
+            base = self.por_orden
+        if grupo is not None or subgrupo is not None:
+            base = [
+                p for p in base
+                if (grupo is None or (p.get("grupo") or GRUPO_DEFAULT).strip() == grupo)
+                and (subgrupo is None or (p.get("subgrupo") or SUBGRUPO_DEFAULT).strip() == subgrupo)
+            ]
+        with self._lock:
+            self._filtrados[clave] = base
+        return base
+
+    def pagina(self, orden: str, grupo: str, subgrupo: str, offset: int, limite: int):
+        """Devuelve (productos, siguiente_offset | None)."""
+        lista = self.lista(orden, grupo, subgrupo)
+        fin = offset + limite
+        return lista[offset:fin], (fin if fin < len(lista) else None)
+
+# ----------------------------------------------------
+# CURSORES OPACOS
+# ----------------------------------------------------
+
+def codificar_cursor(datos: dict) -> str:
+    crudo = json.dumps(datos, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(crudo).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor: str) -> dict:
+    """Lanza ValueError si el cursor no es válido."""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except Exception as e:
+        raise ValueError("Cursor inválido") from e
+    if not isinstance(datos, dict) or not isinstance(datos.get("o"), int) or datos["o"] < 0:
+        raise ValueError("Cursor inválido")
+    return datos
+
+# ----------------------------------------------------
+# CACHE DE ÍNDICES POR TIENDA
+# ----------------------------------------------------
+
+_indices = OrderedDict()  # email -> IndiceCatalogo
+_indices_lock = threading.Lock()
+MAX_INDICES = int(os.getenv("CATALOGO_INDICE_MAX_TIENDAS", "256"))
+
+
+def indice_para(email: str, productos: list, version) -> IndiceCatalogo:
+    """Índice de la tienda para esa versión; sólo se reconstruye si la versión cambió."""
+    with _indices_lock:
+        indice = _indices.get(email)
+        if indice is not None and version is not None and indice.version == version:
+            _indices.move_to_end(email)
+            return indice
+    indice = IndiceCatalogo(productos, version)
+    if version is not None:
+        with _indices_lock:
+            _indices[email] = indice
+            _indices.move_to_end(email)
+            while len(_indices) > MAX_INDICES:
+                _indices.popitem(last=False)
+    return indice
+
+
+def _descartar(email: str):
+    with _indices_lock:
+        _indices.pop(email, None)
+
+
+fbs.catalogo_cache.suscribir(_descartar)
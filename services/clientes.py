@@ -0,0 +1,74 @@
+import os
+import json
+import threading
+import time
+
+from services import arranque
+
+# ----------------------------------------------------
+# CLIENTES EXTERNOS PEREZOSOS (FIRESTORE Y MERCADO PAGO)
+# ----------------------------------------------------
+# Se construyen en el primer uso y una vez por proceso: con gunicorn --preload
+# el master importa la app sin abrir conexiones (los canales gRPC de Firestore
+# no sobreviven a un fork) y cada worker arma las suyas en su primer request.
+# Si la inicialización falla se recuerda el None y no se reintenta en cada request.
+
+_clientes = {}  # nombre -> (pid, cliente)
+_lock = threading.Lock()
+
+
+def _por_proceso(nombre: str, construir):
+    pid = os.getpid()
+    entrada = _clientes.get(nombre)
+    if entrada is not None and entrada[0] == pid:
+        return entrada[1]
+    with _lock:
+        entrada = _clientes.get(nombre)
+        if entrada is not None and entrada[0] == pid:
+            return entrada[1]
+        inicio = time.perf_counter()
+        cliente = construir()
+        arranque.registrar(f"cliente:{nombre}", (time.perf_counter() - inicio) * 1000, "diferido")
+        _clientes[nombre] = (pid, cliente)
+        return cliente
+
+
+def _crear_db():
+    # 🔐 Inicialización segura de Firebase
+    try:
+        firebase_admin = arranque.importar("firebase_admin", fase="diferido")
+        credentials = arranque.importar("firebase_admin.credentials", fase="diferido")
+        firestore = arranque.importar("firebase_admin.firestore", fase="diferido")
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            cred_dict = json.loads(os.getenv("FIREBASE_CREDENTIALS_JSON"))
+            firebase_admin.initialize_app(credentials.Certificate(cred_dict))
+        db_client = firestore.client()
+        print("✅ Firebase inicializado")
+        return db_client
+    except Exception as e:
+        print(f"❌ Error CRÍTICO al cargar JSON de Firebase: {e}")
+        return None
+
+
+def _crear_sdk_mp():
+    # 🔑 Inicialización segura de Mercado Pago
+    from services.mp_service import crear_sdk
+
+    sdk = crear_sdk(os.getenv("MERCADO_PAGO_TOKEN"))  # MERCADO_PAGO_API_URL permite apuntar a un stand-in local
+    if sdk:
+        print("✅ SDK de Mercado Pago inicializado")
+    else:
+        print("⚠️ MERCADO_PAGO_TOKEN no configurado, SDK no inicializado")
+    return sdk
+
+
+def obtener_db():
+    """Cliente de Firestore de este proceso (None si no hay credenciales válidas)."""
+    return _por_proceso("firestore", _crear_db)
+
+
+def obtener_sdk_mp():
+    """SDK de Mercado Pago de este proceso (None sin MERCADO_PAGO_TOKEN)."""
+    return _por_proceso("mercadopago", _crear_sdk_mp)
@@ -0,0 +1,17 @@
+import os
+
+# ----------------------------------------------------
+# DIRECTORIO DE DATOS LOCALES (SQLITE)
+# ----------------------------------------------------
+# Índice de publicación, cola de trabajos y cola de pagos de MP viven en sqlite.
+# Van fuera del árbol del código (en Render el checkout no es un lugar para
+# escribir y en desarrollo ensuciaría `git status`): DATOS_DIR, o si no está
+# definido ~/.cache/appweb (respetando XDG_CACHE_HOME). Cada base puede
+# moverse por separado con su propia variable (PUBLICACIONES_DB, etc.).
+
+DATOS_DIR = os.getenv("DATOS_DIR") or os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "appweb")
+
+
+def ruta_datos(nombre: str) -> str:
+    return os.path.join(DATOS_DIR, nombre)
@@ -1,10 +1,41 @@
+from __future__ import annotations  # Las anotaciones firestore.client no fuerzan el import
+
 import os
 import re
 import uuid
 import time
 import json
-from firebase_admin import firestore
-from firebase_admin.exceptions import FirebaseError
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from services import arranque
+from services.metricas import medir
+from services.catalogo_cache import CatalogoCache
+from services.precios_index import IndicePrecios, valores_producto
+from services.busqueda_index import IndiceBusqueda
+
+# firebase_admin y google.cloud.firestore pesan ~0.4 s: se importan en el primer uso
+firestore = arranque.modulo_perezoso("firebase_admin.firestore")
+excepciones_firebase = arranque.modulo_perezoso("firebase_admin.exceptions")
+excepciones_google = arranque.modulo_perezoso("google.api_core.exceptions")
+_field_path = arranque.modulo_perezoso("google.cloud.firestore_v1.field_path")
+
+# Cache del catálogo por tienda (ver services/catalogo_cache.py)
+catalogo_cache = CatalogoCache(
+    max_tiendas=int(os.getenv("CATALOGO_CACHE_MAX_TIENDAS", "256")),
+    ttl=float(os.getenv("CATALOGO_CACHE_TTL", "300")),
+)
+# Precio y stock por id_base para validar carritos sin leer Firestore (ver services/precios_index.py)
+indice_precios = IndicePrecios(
+    max_tiendas=int(os.getenv("CATALOGO_CACHE_MAX_TIENDAS", "256")),
+    ttl=float(os.getenv("CATALOGO_CACHE_TTL", "300")),
+)
+# Búsqueda de texto del storefront sin leer Firestore (ver services/busqueda_index.py)
+indice_busqueda = IndiceBusqueda(
+    max_tiendas=int(os.getenv("CATALOGO_CACHE_MAX_TIENDAS", "256")),
+    ttl=float(os.getenv("CATALOGO_CACHE_TTL", "300")),
+)
+# Las escrituras sólo tocan el cache: él reenvía altas, parches e invalidaciones a los índices
+catalogo_cache.suscribir_indice(indice_precios)
+catalogo_cache.suscribir_indice(indice_busqueda)
 
 # ----------------------------------------------------
 # A. LÓGICA DE LECTURA (CLAVE PARA EL PROBLEMA DE LAS TARJETAS)
@@ -12,32 +43,86 @@ from firebase_admin.exceptions import FirebaseError
 
 def ver_productos(db_client: firestore.client, email: str):
     """Obtiene todos los productos y configuraciones para renderizar la tienda."""
+    productos, config, _version = ver_productos_versionado(db_client, email)
+    return productos, config
+
+def ver_productos_versionado(db_client: firestore.client, email: str):
+    """Como ver_productos, pero devuelve también la versión del catálogo (None si no quedó cacheado)."""
     if not db_client:
         print("❌ Error: Cliente DB no inicializado.")
-        return [], {}
+        return [], {}, None
         
     try:
         if not email:
-            return [], {}
-            
+            return [], {}, None
+
+        cacheado = catalogo_cache.obtener(email)
+        if cacheado is not None:
+            if not indice_precios.esta_cargada(email):
+                indice_precios.cargar(email, cacheado[0])
+            return cacheado
+
+        marca = catalogo_cache.marca_escritura(email)
         productos_ref = db_client.collection("usuarios").document(email).collection("productos")
         
         # Obtener productos ordenados por 'orden_time' (o como se prefiera)
-        productos = [doc.to_dict() for doc in productos_ref.order_by("orden_time").stream()]
+        with medir("firestore", "ver_productos"):
+            productos = [doc.to_dict() for doc in productos_ref.order_by("orden_time").stream()]
 
         # Obtener la configuración general
         config_ref = db_client.collection("usuarios").document(email).collection("config").document("general")
-        config = config_ref.get().to_dict() if config_ref.exists else {}
+        with medir("firestore", "leer_config"):
+            config_snap = config_ref.get()  # Un solo round trip: el snapshot ya trae .exists
+        config = (config_snap.to_dict() or {}) if config_snap.exists else {}
 
         print(f"✅ DB: {len(productos)} productos y {len(config)} items de config cargados para {email}.")
 
-        return productos, config
-    except FirebaseError as e:
+        version = catalogo_cache.guardar(email, productos, config, marca)
+        if version is not None:  # Misma regla que el cache: una lectura cruzada con una escritura no se indexa
+            indice_precios.cargar(email, productos)
+        return list(productos), dict(config), version
+    except excepciones_firebase.FirebaseError as e:
         print(f"❌ Error de Firebase al obtener productos/configuración para {email}: {e}")
-        return [], {}
+        return [], {}, None
     except Exception as e:
         print(f"❌ Error al obtener productos/configuración para {email}: {e}")
-        return [], {}
+        return [], {}, None
+
+def paginar_productos(db_client: firestore.client, email: str, campos: list = None, tam_pagina: int = 500):
+    """
+    Recorre los productos de la tienda en páginas de `tam_pagina` (orden de carga, cursor
+    start_after). Produce dicts de a uno; en memoria hay una página a la vez, no el catálogo.
+    Con `campos` sólo se leen esos campos (proyección).
+    """
+    consulta = db_client.collection("usuarios").document(email).collection("productos").order_by("orden_time")
+    if campos:
+        # El cursor start_after toma orden_time del último snapshot: tiene que venir en la proyección
+        consulta = consulta.select(list(dict.fromkeys([*campos, "orden_time"])))
+    ultimo = None
+    while True:
+        pagina = consulta.limit(tam_pagina)
+        if ultimo is not None:
+            pagina = pagina.start_after(ultimo)
+        with medir("firestore", "paginar_productos"):
+            docs = list(pagina.stream())
+        for doc in docs:
+            yield doc.to_dict()
+        if len(docs) < tam_pagina:
+            return
+        ultimo = docs[-1]
+
+def version_catalogo(email: str):
+    """Versión del catálogo cacheado de la tienda (None si no está en cache)."""
+    return catalogo_cache.version(email)
+
+def invalidar_catalogo(email: str):
+    """Fuerza a que la próxima lectura del catálogo vaya a Firestore."""
+    if email:
+        catalogo_cache.invalidar(email)
+
+def estadisticas_cache() -> dict:
+    """Contadores de hits/misses del cache de catálogo."""
+    return catalogo_cache.estadisticas()
 
 def get_mp_token(db_client: firestore.client, email: str):
     """Obtiene el token público de Mercado Pago."""
@@ -49,13 +134,10 @@ def get_mp_token(db_client: firestore.client, email: str):
 # B. LÓGICA DE ESCRITURA Y ADMIN
 # ----------------------------------------------------
 
-def subir_a_firestore(db_client: firestore.client, producto: dict, email: str, repo_name: str) -> bool:
-    """Sube un producto individual a la colección de Firestore del usuario."""
-    if not db_client: return False
-    
+def _armar_doc(producto: dict, repo_name: str, orden_time: float):
+    """Normaliza un producto del formulario al documento de Firestore. Devuelve (doc_id, doc)."""
     custom_id = str(uuid.uuid4())
-    orden_time = time.time()
-    
+
     # Asegurar el formato correcto de los campos, como en el app.py original
     doc = {
         "id_base": producto.get('id_base', custom_id),
@@ -70,12 +152,291 @@ def subir_a_firestore(db_client: firestore.client, producto: dict, email: str, r
         "orden": int(producto.get('orden', 9999)),
         "orden_time": orden_time
     }
+    return custom_id, doc
+
+def subir_a_firestore(db_client: firestore.client, producto: dict, email: str, repo_name: str) -> bool:
+    """Sube un producto individual a la colección de Firestore del usuario."""
+    if not db_client: return False
+    
+    custom_id, doc = _armar_doc(producto, repo_name, time.time())
     
     try:
-        db_client.collection("usuarios").document(email).collection("productos").document(custom_id).set(doc)
+        with medir("firestore", "subir_a_firestore"):
+            db_client.collection("usuarios").document(email).collection("productos").document(custom_id).set(doc)
+        catalogo_cache.agregar_productos(email, [doc])
         return True
     except Exception as e:
         print(f"❌ Error al subir producto {producto.get('nombre')} a Firestore: {e}")
         return False
 
-# ... (Incluir aquí las funciones login_admin, crear_admin y actualizar_firestore completas)
+# Firestore rechaza WriteBatch con más de 500 operaciones
+LIMITE_OPS_BATCH = 500
+_executor_lotes = ThreadPoolExecutor(max_workers=int(os.getenv("FIRESTORE_LOTES_WORKERS", "4")))
+
+def preparar_documentos(productos: list, repo_name: str, base_time: float):
+    """
+    Arma los documentos de una carga. orden_time crece con el índice para respetar el orden de carga.
+    Devuelve ([(indice, doc_id, doc)], {indice: error}) con los productos inválidos aparte.
+    """
+    preparados, invalidos = [], {}
+    for i, producto in enumerate(productos):
+        try:
+            doc_id, doc = _armar_doc(producto, repo_name, base_time + i * 1e-6)
+            preparados.append((i, doc_id, doc))
+        except (ValueError, TypeError, AttributeError) as e:
+            invalidos[i] = f"Producto inválido: {e}"
+    return preparados, invalidos
+
+def _commit_lote(db_client, email: str, lote: list):
+    """Escribe un lote de (indice, doc_id, doc) en un único WriteBatch. doc=None borra el documento."""
+    productos_ref = db_client.collection("usuarios").document(email).collection("productos")
+    batch = db_client.batch()
+    for _indice, doc_id, doc in lote:
+        if doc is None:
+            batch.delete(productos_ref.document(doc_id))
+        else:
+            batch.set(productos_ref.document(doc_id), doc)
+    with medir("firestore", "commit_lote"):
+        batch.commit()
+
+def _escribir_lotes(db_client, email: str, operaciones: list, tam_lote: int = LIMITE_OPS_BATCH):
+    """
+    Commitea (indice, doc_id, doc) en WriteBatch concurrentes.
+    Devuelve (operaciones_ok, {doc_id: error}, cantidad_de_lotes).
+    """
+    tam_lote = max(1, min(tam_lote, LIMITE_OPS_BATCH))
+    lotes = [operaciones[i:i + tam_lote] for i in range(0, len(operaciones), tam_lote)]
+    futuros = {_executor_lotes.submit(_commit_lote, db_client, email, lote): lote for lote in lotes}
+
+    ok, errores = [], {}
+    for futuro in as_completed(futuros):
+        lote = futuros[futuro]
+        try:
+            futuro.result()
+            ok.extend(lote)
+        except Exception as e:
+            print(f"❌ Error al commitear lote de {len(lote)} operaciones para {email}: {e}")
+            for _indice, doc_id, _doc in lote:
+                errores[doc_id] = str(e)
+    return ok, errores, len(lotes)
+
+def subir_productos_batch(db_client: firestore.client, productos: list, email: str, repo_name: str,
+                          tam_lote: int = LIMITE_OPS_BATCH) -> dict:
+    """
+    Sube muchos productos agrupados en WriteBatch de hasta 500 operaciones,
+    commiteando los lotes en paralelo. Devuelve el resultado por producto:
+    {"ok": bool, "subidos": int, "fallidos": int, "resultados": [{"indice", "nombre", "ok", "id", "error"}]}
+    """
+    resultados = [
+        {"indice": i, "nombre": (p or {}).get('nombre'), "ok": False, "id": None, "error": None}
+        for i, p in enumerate(productos)
+    ]
+    if not db_client:
+        for r in resultados:
+            r["error"] = "Cliente DB no inicializado"
+        return {"ok": False, "subidos": 0, "fallidos": len(productos), "resultados": resultados}
+
+    # 1. Validar y armar documentos
+    preparados, invalidos = preparar_documentos(productos, repo_name, time.time())
+    for indice, error in invalidos.items():
+        resultados[indice]["error"] = error
+
+    # 2. Commit concurrente de los lotes
+    escritos, errores, cantidad_lotes = _escribir_lotes(db_client, email, preparados, tam_lote)
+    for indice, doc_id, _doc in escritos:
+        resultados[indice].update(ok=True, id=doc_id)
+    for indice, doc_id, _doc in preparados:
+        if doc_id in errores:
+            resultados[indice]["error"] = errores[doc_id]
+
+    # 3. Actualizar el cache con lo que efectivamente quedó escrito
+    subidos = sorted((doc for _i, _id, doc in escritos), key=lambda d: d["orden_time"])
+    if subidos:
+        catalogo_cache.agregar_productos(email, subidos)
+
+    fallidos = len(productos) - len(subidos)
+    print(f"✅ DB: {len(subidos)} productos subidos en {cantidad_lotes} lotes para {email} ({fallidos} con error).")
+    return {"ok": fallidos == 0, "subidos": len(subidos), "fallidos": fallidos, "resultados": resultados}
+
+def aplicar_cambios_productos(db_client: firestore.client, email: str, escrituras: list, borrados: list,
+                              tam_lote: int = LIMITE_OPS_BATCH) -> dict:
+    """
+    Aplica un diff del catálogo: escrituras [(indice, doc_id, doc)] (altas o reemplazos
+    sobre el mismo doc_id) y borrados [doc_id], en WriteBatch concurrentes.
+    Devuelve {"ok", "escritos", "borrados", "errores": {doc_id: error}}.
+    """
+    if not db_client:
+        errores = {doc_id: "Cliente DB no inicializado" for _i, doc_id, _d in escrituras}
+        errores.update({doc_id: "Cliente DB no inicializado" for doc_id in borrados})
+        return {"ok": not errores, "escritos": 0, "borrados": 0, "errores": errores}
+    if not escrituras and not borrados:
+        return {"ok": True, "escritos": 0, "borrados": 0, "errores": {}}
+
+    operaciones = list(escrituras) + [(None, doc_id, None) for doc_id in borrados]
+    hechas, errores, cantidad_lotes = _escribir_lotes(db_client, email, operaciones, tam_lote)
+
+    # Reemplazos y bajas no se pueden parchear en el cache: la próxima lectura va a Firestore
+    catalogo_cache.invalidar(email)
+    escritos = sum(1 for _i, _id, doc in hechas if doc is not None)
+    print(f"✅ DB: {escritos} escritos y {len(hechas) - escritos} borrados en {cantidad_lotes} lotes para {email}.")
+    return {"ok": not errores, "escritos": escritos, "borrados": len(hechas) - escritos, "errores": errores}
+
+def _ref_producto(db_client, email: str, id_base: str):
+    """Referencia del documento del producto (los doc_id son uuid: se busca por id_base)."""
+    productos_ref = db_client.collection("usuarios").document(email).collection("productos")
+    with medir("firestore", "buscar_producto"):
+        docs = list(productos_ref.where("id_base", "==", id_base).limit(1).stream())
+    return docs[0].reference if docs else None
+
+def actualizar_firestore(db_client: firestore.client, id_base: str, campos: dict, email: str) -> bool:
+    """Actualiza campos de un producto (buscado por id_base) y parchea el cache."""
+    if not db_client or not id_base or not email: return False
+
+    try:
+        ref = _ref_producto(db_client, email, id_base)
+        if ref is None:
+            print(f"⚠️ Producto {id_base} no encontrado para {email}")
+            return False
+
+        with medir("firestore", "actualizar_firestore"):
+            ref.update(campos)
+        catalogo_cache.parchear_producto(email, id_base, campos)
+        return True
+    except Exception as e:
+        print(f"❌ Error al actualizar producto {id_base} en Firestore: {e}")
+        # Ante la duda, que la próxima lectura vaya a Firestore
+        catalogo_cache.invalidar(email)
+        return False
+
+def ruta_talle(talle: str) -> str:
+    """Ruta de campo de un talle dentro de talles_stock, con comillas si hace falta (p. ej. talles_stock.`38.5`)."""
+    return _field_path.FieldPath("talles_stock", talle).to_api_repr()
+
+def aplicar_deltas_stock(db_client: firestore.client, email: str, id_base: str, deltas: dict,
+                         campos: dict = None, quitar=()) -> dict:
+    """
+    Suma `deltas` ({talle: entero}) con Increment sobre talles_stock.<talle>: es atómico en
+    Firestore y no pisa los otros talles ni ediciones concurrentes. Un delta 0 agrega el talle
+    con stock 0 si no existía (y no toca uno existente); los talles de `quitar` se borran.
+    `campos` (p. ej. precio) viaja en el mismo update.
+    Devuelve {"ok", "talles_stock", "error"} con el stock resultante.
+    """
+    if not db_client or not id_base or not email:
+        return {"ok": False, "talles_stock": None, "error": "Datos incompletos"}
+
+    actualizacion = {ruta_talle(talle): firestore.Increment(delta) for talle, delta in deltas.items()}
+    actualizacion.update({ruta_talle(talle): firestore.DELETE_FIELD for talle in quitar})
+    actualizacion.update(campos or {})
+    try:
+        ref = _ref_producto(db_client, email, id_base)
+        if ref is None:
+            return {"ok": False, "talles_stock": None, "error": "Producto no encontrado"}
+        with medir("firestore", "deltas_stock"):
+            if actualizacion:
+                ref.update(actualizacion)
+            # Una lectura del resultado mezclado (lo escrito acá más lo que hayan sumado otros)
+            talles_stock = ref.get(field_paths=["talles_stock"]).get("talles_stock") or {}
+        catalogo_cache.parchear_producto(email, id_base, {**(campos or {}), "talles_stock": talles_stock})
+        return {"ok": True, "talles_stock": talles_stock, "error": None}
+    except Exception as e:
+        print(f"❌ Error al aplicar stock de {id_base} en Firestore: {e}")
+        catalogo_cache.invalidar(email)
+        return {"ok": False, "talles_stock": None, "error": str(e)}
+
+# Firestore acepta hasta 30 valores en un filtro "in"
+LIMITE_FILTRO_IN = 30
+
+def docs_por_id_base(db_client, email: str, ids_base: list) -> dict:
+    """{id_base: snapshot} de varios productos, en consultas "in" de a 30 (los doc_id son uuid)."""
+    productos_ref = db_client.collection("usuarios").document(email).collection("productos")
+    ids = sorted(set(ids_base))
+    docs = {}
+    for i in range(0, len(ids), LIMITE_FILTRO_IN):
+        with medir("firestore", "buscar_productos"):
+            encontrados = list(productos_ref.where("id_base", "in", ids[i:i + LIMITE_FILTRO_IN]).stream())
+        for doc in encontrados:
+            docs.setdefault(doc.get("id_base"), doc)
+    return docs
+
+def refs_por_id_base(db_client, email: str, ids_base: list) -> dict:
+    """{id_base: referencia} de varios productos."""
+    return {id_base: doc.reference for id_base, doc in docs_por_id_base(db_client, email, ids_base).items()}
+
+def precios_para_checkout(db_client: firestore.client, email: str, ids_base: list) -> dict:
+    """
+    {id_base: (precio, talles_stock, nombre)} de los productos del carrito. Sale del índice
+    en memoria: si la tienda no está indexada se carga con el catálogo completo (ver_productos,
+    como la búsqueda), así los checkouts siguientes no leen nada. Sólo los que sigan faltando
+    se leen de Firestore, todos juntos. Los que no existen no aparecen en el resultado.
+    """
+    encontrados, faltantes = indice_precios.buscar(email, ids_base)
+    if faltantes and db_client and not indice_precios.esta_cargada(email):
+        # agregar() no indexa una tienda fría: hay que cargarla entera
+        ver_productos_versionado(db_client, email)
+        encontrados, faltantes = indice_precios.buscar(email, ids_base)
+    if faltantes and db_client:
+        leidos = [doc.to_dict() for doc in docs_por_id_base(db_client, email, faltantes).values()]
+        indice_precios.agregar(email, leidos)
+        encontrados.update({p["id_base"]: valores_producto(p) for p in leidos})
+    return encontrados
+
+def buscar_productos(db_client: firestore.client, email: str, texto: str, precio_min: float = None,
+                     precio_max: float = None, solo_en_stock: bool = False) -> list:
+    """
+    Búsqueda de texto en el catálogo con el índice en memoria. La primera búsqueda de la
+    tienda (o la siguiente a una invalidación) lo arma desde ver_productos; las demás no leen nada.
+    """
+    resultado = indice_busqueda.buscar(email, texto, precio_min, precio_max, solo_en_stock)
+    if resultado is None:
+        productos, _config, version = ver_productos_versionado(db_client, email)
+        indice_busqueda.cargar(email, productos)
+        resultado = indice_busqueda.buscar(email, texto, precio_min, precio_max, solo_en_stock) or []
+        # Una escritura entre la lectura y la carga no llegó al índice: se descarta (esta búsqueda ya respondió)
+        if version is None or catalogo_cache.version(email) != version:
+            indice_busqueda.descartar(email)
+    return resultado
+
+def registrar_pago(db_client: firestore.client, email: str, pago_id: str, items: list, datos: dict) -> str:
+    """
+    Descuenta el stock de todos los items de un pago y crea usuarios/<email>/pagos/<pago_id>
+    en un único WriteBatch (atómico). El create falla si el pago ya estaba registrado, así que
+    aplicar dos veces el mismo pago no descuenta dos veces, aunque lo intenten dos procesos.
+    Devuelve "aplicado" o "duplicado".
+    """
+    usuario_ref = db_client.collection("usuarios").document(email)
+    refs = refs_por_id_base(db_client, email, [it["id_base"] for it in items])
+
+    # Un update por producto con todos sus talles
+    deltas, faltantes = {}, []
+    for item in items:
+        if item["id_base"] not in refs or not item.get("talle"):
+            faltantes.append(item)
+            continue
+        por_talle = deltas.setdefault(item["id_base"], {})
+        por_talle[item["talle"]] = por_talle.get(item["talle"], 0) + item["cantidad"]
+    if len(deltas) + 1 > LIMITE_OPS_BATCH:
+        raise ValueError(f"El pago {pago_id} tiene demasiados productos para un único lote")
+
+    batch = db_client.batch()
+    batch.create(usuario_ref.collection("pagos").document(str(pago_id)), {
+        **datos,
+        "items": items,
+        "sin_descuento": faltantes,
+        "registrado": firestore.SERVER_TIMESTAMP,
+    })
+    for id_base, por_talle in deltas.items():
+        batch.update(refs[id_base], {ruta_talle(t): firestore.Increment(-c) for t, c in por_talle.items()})
+    try:
+        with medir("firestore", "registrar_pago"):
+            batch.commit()
+    except excepciones_google.AlreadyExists:
+        return "duplicado"
+
+    # Mismo Increment que se escribió, aplicado al cache y a los índices (no hace falta releer)
+    catalogo_cache.sumar_stock(email, {id_base: {t: -c for t, c in por_talle.items()}
+                                       for id_base, por_talle in deltas.items()})
+    if faltantes:
+        print(f"⚠️ Pago {pago_id} de {email}: {len(faltantes)} items sin producto/talle para descontar")
+    return "aplicado"
+
+# ... (Incluir aquí las funciones login_admin y crear_admin completas)
@@ -0,0 +1,236 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.metricas import medir
+
+# ----------------------------------------------------
+# CLIENTE HTTP COMPARTIDO DE LA API DE GITHUB
+# ----------------------------------------------------
+# Una Session con pool de conexiones por proceso, concurrencia acotada por un
+# semáforo y dos cubetas de tokens: una general y otra para las llamadas que
+# crean contenido (POST/PUT/PATCH/DELETE), que GitHub limita aparte (límite
+# secundario, ~80 por minuto). Los headers X-RateLimit-* de cada respuesta
+# recalibran la cubeta general: cuando lo que queda de la ventana entra en la
+# reserva, se reparte hasta el reset en vez de gastarlo y chocar con 403.
+# Los 403/429 de límite (GitHub no procesó la llamada) se reintentan siempre,
+# con backoff exponencial con jitter. Los 5xx y errores de red sólo si repetir
+# la llamada no puede duplicar un efecto: métodos idempotentes o creaciones
+# direccionadas por contenido (blobs, trees) que el llamador marca como tales.
+
+GITHUB_MAX_CONCURRENCIA = int(os.getenv("GITHUB_MAX_CONCURRENCIA", "8"))
+GITHUB_REINTENTOS = int(os.getenv("GITHUB_REINTENTOS", "4"))
+GITHUB_BACKOFF_BASE = float(os.getenv("GITHUB_BACKOFF_BASE", "0.5"))
+GITHUB_BACKOFF_MAX = float(os.getenv("GITHUB_BACKOFF_MAX", "30"))
+# Ritmo sostenido y ráfaga de la cubeta general (requests por segundo)
+GITHUB_TASA = float(os.getenv("GITHUB_TASA", "15"))
+GITHUB_RAFAGA = float(os.getenv("GITHUB_RAFAGA", "30"))
+GITHUB_ESCRITURAS_POR_MINUTO = float(os.getenv("GITHUB_ESCRITURAS_POR_MINUTO", "80"))
+# Llamadas de la ventana primaria que se dejan sin usar (otros procesos, otros tokens)
+GITHUB_RESERVA = int(os.getenv("GITHUB_RESERVA", "50"))
+# Más que esto de espera por límite y la llamada falla en vez de colgar el request
+GITHUB_ESPERA_MAX = float(os.getenv("GITHUB_ESPERA_MAX", "60"))
+
+METODOS_ESCRITURA = {"POST", "PUT", "PATCH", "DELETE"}
+METODOS_IDEMPOTENTES = {"GET", "HEAD", "OPTIONS"}
+STATUS_REINTENTABLES = {500, 502, 503, 504}
+
+
+class LimiteGitHubAgotado(requests.RequestException):
+    """El límite de la API no se libera dentro de GITHUB_ESPERA_MAX."""
+
+
+class CubetaTokens:
+    """Token bucket: `tasa` tokens por segundo hasta `capacidad`. reservar() devuelve cuánto esperar."""
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._tokens = capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _recargar(self, ahora: float):
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._ultimo) * self.tasa)
+        self._ultimo = ahora
+
+    def reservar(self) -> float:
+        """Toma un token (puede quedar en negativo: la deuda ordena la cola). Devuelve la espera en segundos."""
+        with self._lock:
+            ahora = time.monotonic()
+            self._recargar(ahora)
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.tasa
+
+    def devolver(self):
+        with self._lock:
+            self._tokens = min(self.capacidad, self._tokens + 1)
+
+    def ajustar(self, tasa: float, capacidad: float = None):
+        with self._lock:
+            self._recargar(time.monotonic())
+            self.tasa = max(tasa, 1e-3)
+            if capacidad is not None:
+                self.capacidad = capacidad
+                self._tokens = min(self._tokens, capacidad)
+
+
+class ClienteGitHub:
+    def __init__(self, base_url: str, token: str, timeout: float = 30.0,
+                 max_concurrencia: int = GITHUB_MAX_CONCURRENCIA, reintentos: int = GITHUB_REINTENTOS):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.reintentos = reintentos
+        self.max_concurrencia = max_concurrencia
+        self._semaforo = threading.BoundedSemaphore(max_concurrencia)
+        self._general = CubetaTokens(GITHUB_TASA, GITHUB_RAFAGA)
+        self._escrituras = CubetaTokens(GITHUB_ESCRITURAS_POR_MINUTO / 60.0, GITHUB_ESCRITURAS_POR_MINUTO)
+        self._lock = threading.Lock()
+        self._sesion_pid = None
+        self._sesion = None
+        self._pausa_hasta = 0.0  # límite secundario: nadie sale antes de esto
+        self._limite = {"limite": None, "restantes": None, "reset": None}
+        self._contadores = {"requests": 0, "reintentos": 0, "limitados": 0, "esperas": 0, "segundos_espera": 0.0}
+
+    # --- Conexión ---
+
+    def sesion(self) -> requests.Session:
+        """Session propia del proceso (el pool de sockets no se comparte a través de un fork)."""
+        if self._sesion_pid != os.getpid():
+            with self._lock:
+                if self._sesion_pid != os.getpid():
+                    sesion = requests.Session()
+                    adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrencia)
+                    sesion.mount("https://", adaptador)
+                    sesion.mount("http://", adaptador)
+                    sesion.headers.update({
+                        "Authorization": f"token {self.token}",
+                        "Accept": "application/vnd.github+json",
+                    })
+                    self._sesion, self._sesion_pid = sesion, os.getpid()
+        return self._sesion
+
+    # --- Ritmo ---
+
+    def _esperar_turno(self, metodo: str):
+        espera = self._general.reservar()
+        if metodo in METODOS_ESCRITURA:
+            espera = max(espera, self._escrituras.reservar())
+        espera = max(espera, self._pausa_hasta - time.monotonic())
+        if espera > GITHUB_ESPERA_MAX:
+            self._general.devolver()
+            if metodo in METODOS_ESCRITURA:
+                self._escrituras.devolver()
+            raise LimiteGitHubAgotado(f"Límite de la API de GitHub: habría que esperar {espera:.0f}s")
+        if espera > 0:
+            with self._lock:
+                self._contadores["esperas"] += 1
+                self._contadores["segundos_espera"] += espera
+            time.sleep(espera)
+
+    def _leer_limite(self, r: requests.Response):
+        """Recalibra la cubeta general con X-RateLimit-Remaining/Reset."""
+        try:
+            restantes = int(r.headers["X-RateLimit-Remaining"])
+            reset = float(r.headers["X-RateLimit-Reset"])
+            limite = int(r.headers.get("X-RateLimit-Limit") or 0) or None
+        except (KeyError, ValueError):
+            return
+        with self._lock:
+            self._limite.update(limite=limite, restantes=restantes, reset=reset)
+        if restantes > GITHUB_RESERVA:
+            self._general.ajustar(GITHUB_TASA, GITHUB_RAFAGA)
+        else:
+            # Entramos en la reserva: lo que queda se reparte parejo hasta el reset
+            # (con 0 la espera supera GITHUB_ESPERA_MAX y las llamadas fallan sin salir)
+            hasta_reset = max(reset - time.time(), 1.0)
+            self._general.ajustar(max(restantes, 0) / hasta_reset, 1.0)
+
+    @staticmethod
+    def _es_limite(r: requests.Response) -> bool:
+        if r.status_code == 429:
+            return True
+        if r.status_code != 403:
+            return False
+        return r.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in r.headers \
+            or "rate limit" in r.text[:500].lower()
+
+    def _espera_reintento(self, intento: int, r: requests.Response = None) -> float:
+        if r is not None and r.headers.get("Retry-After"):
+            try:
+                return float(r.headers["Retry-After"])
+            except ValueError:
+                pass
+        if r is not None and r.headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                return max(float(r.headers["X-RateLimit-Reset"]) - time.time(), 0.0) + 1.0
+            except (KeyError, ValueError):
+                pass
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, min(GITHUB_BACKOFF_MAX, GITHUB_BACKOFF_BASE * 2 ** intento))
+
+    # --- Llamadas ---
+
+    def request(self, metodo: str, ruta: str, operacion: str = None, idempotente: bool = None,
+                **kwargs) -> requests.Response:
+        """
+        Llamada a la API (ruta relativa, p.ej. /repos/...) con ritmo, reintentos y concurrencia acotada.
+        `idempotente` habilita reintentar ante 5xx/errores de red (por defecto, sólo GET/HEAD/OPTIONS):
+        un POST/PATCH que falló así pudo haberse aplicado igual.
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        operacion = operacion or metodo
+        if idempotente is None:
+            idempotente = metodo in METODOS_IDEMPOTENTES
+        for intento in range(self.reintentos + 1):
+            self._esperar_turno(metodo)
+            with self._semaforo:
+                with self._lock:
+                    self._contadores["requests"] += 1
+                try:
+                    with medir("github", operacion) as m:
+                        r = self.sesion().request(metodo, f"{self.base_url}{ruta}", **kwargs)
+                        m["resultado"] = str(r.status_code)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if intento == self.reintentos or not idempotente:
+                        raise
+                    espera = self._espera_reintento(intento)
+                    print(f"⚠️ GitHub {metodo} {ruta}: {type(e).__name__}, reintento en {espera:.1f}s")
+                    r = None
+            if r is not None:
+                self._leer_limite(r)
+                if self._es_limite(r):
+                    espera = self._espera_reintento(intento, r)
+                    with self._lock:
+                        self._contadores["limitados"] += 1
+                        # Pausa para todos: seguir mandando sólo alarga el bloqueo secundario
+                        self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + espera)
+                    if intento == self.reintentos or espera > GITHUB_ESPERA_MAX:
+                        return r
+                    print(f"⚠️ GitHub limitó {metodo} {ruta} ({r.status_code}), reintento en {espera:.1f}s")
+                    espera = 0.0  # la pausa global ya la aplica _esperar_turno
+                elif r.status_code in STATUS_REINTENTABLES and idempotente and intento < self.reintentos:
+                    espera = self._espera_reintento(intento)
+                    print(f"⚠️ GitHub {metodo} {ruta}: {r.status_code}, reintento en {espera:.1f}s")
+                else:
+                    return r
+            with self._lock:
+                self._contadores["reintentos"] += 1
+            time.sleep(espera)
+        return r
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                **self._contadores,
+                "segundos_espera": round(self._contadores["segundos_espera"], 3),
+                "rate_limit": dict(self._limite),
+                "tasa_actual": round(self._general.tasa, 3),
+                "pausado_por": round(max(self._pausa_hasta - time.monotonic(), 0.0), 3),
+                "max_concurrencia": self.max_concurrencia,
+            }
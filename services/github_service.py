@@ -3,13 +3,28 @@ import requests
 import base64
 import re
 import uuid
-import time
-from werkzeug.utils import secure_filename
+from concurrent.futures import ThreadPoolExecutor
+
+from services import almacen_uploads
+from services.github_cliente import ClienteGitHub
+from services.publish_index import IndicePublicacion, sha_blob
 
 # --- Configuraciones ---
 GITHUB_USERNAME = os.getenv("GITHUB_USERNAME") or "jarafer96-byte" 
-GITHUB_API_URL = "https://api.github.com"
+# Configurable para apuntar a un stand-in local de la API (pruebas / benchmarks)
+GITHUB_API_URL = (os.getenv("GITHUB_API_URL") or "https://api.github.com").rstrip("/")
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+GITHUB_TIMEOUT = float(os.getenv("GITHUB_TIMEOUT", "30"))
+GITHUB_BLOBS_WORKERS = int(os.getenv("GITHUB_BLOBS_WORKERS", "8"))
+
+# Archivos fijos que referencia preview.html (se suben si existen localmente)
+ICONOS_FIJOS = ["facebook.png", "instagram.png", "whatsapp.png", "map.png", "mercadopago.png", "fallback.webp"]
+
+# Índice local de lo último publicado: evita re-subir bytes sin cambios
+indice_publicacion = IndicePublicacion()
+
+# Cliente compartido por todas las publicaciones del proceso (ver services/github_cliente.py)
+cliente_github = ClienteGitHub(GITHUB_API_URL, GITHUB_TOKEN, timeout=GITHUB_TIMEOUT)
 
 # ----------------------------------------------------
 # A. UTILIDADES (Usadas en step1)
@@ -25,22 +40,6 @@ def generar_nombre_repo(email: str) -> str:
         return f"appweb-user-{str(uuid.uuid4()).split('-')[0]}"
 
 
-def limpiar_imagenes_usuario(upload_folder: str, email: str):
-    """Limpia las imágenes temporales locales del usuario."""
-    if not email: return
-        
-    try:
-        prefix = f"optimizado_{email}_"
-        for filename in os.listdir(upload_folder):
-            # Limpia archivos optimizados y el logo
-            if filename.startswith(prefix) or filename == f"logo_{email}": 
-                try:
-                    os.remove(os.path.join(upload_folder, filename))
-                except Exception as e:
-                    print(f"❌ Error al borrar archivo {filename}: {e}")
-    except Exception as e:
-        print(f"❌ Error general al limpiar imágenes para {email}: {e}")
-
 # ----------------------------------------------------
 # B. API DE GITHUB
 # ----------------------------------------------------
@@ -52,13 +51,217 @@ def crear_repo_github(nombre_repo: str) -> dict:
     return {"url": f"https://github.com/{GITHUB_USERNAME}/{nombre_repo}", "status": 201}
 
 
+def _operacion_api(metodo: str, ruta: str) -> str:
+    """Nombre acotado de la llamada para las métricas: /repos/u/r/git/blobs -> POST_git.blobs."""
+    partes = ruta.split("?", 1)[0].strip("/").split("/")
+    if partes[0] == "repos":
+        partes = partes[3:] or ["repo"]
+    return f"{metodo}_{'.'.join(partes[:2] if partes[0] == 'git' else partes[:1])}"
+
+
+def _api(metodo: str, ruta: str, **kwargs) -> requests.Response:
+    """Llamada autenticada a la API de GitHub (ruta relativa, p.ej. /repos/...), con ritmo y reintentos."""
+    return cliente_github.request(metodo, ruta, operacion=_operacion_api(metodo, ruta), **kwargs)
+
+
+def _sha_remoto(ruta_api: str, branch: str):
+    r = _api("GET", ruta_api, params={"ref": branch})
+    return r.json().get("sha") if r.status_code == 200 else None
+
 def subir_archivo(repo_name: str, contenido_bytes: bytes, ruta_remota: str, branch="main") -> dict:
-    """Sube o actualiza un archivo en el repositorio."""
+    """Sube o actualiza un archivo en el repositorio (se omite si los bytes no cambiaron)."""
+    if not GITHUB_TOKEN: return {"ok": False, "error": "Token de GitHub no disponible"}
+
+    sha_nuevo = sha_blob(contenido_bytes)
+    sha_publicado = indice_publicacion.obtener(repo_name, ruta_remota)
+    if sha_publicado == sha_nuevo:
+        return {"ok": True, "status": 304, "omitido": True, "bytes": len(contenido_bytes)}
+
+    ruta_api = f"/repos/{GITHUB_USERNAME}/{repo_name}/contents/{ruta_remota}"
+    try:
+        # SHA check: si el archivo ya existe, la API exige su sha para actualizarlo.
+        # Si el índice lo conoce, se evita el GET previo.
+        sha = sha_publicado or _sha_remoto(ruta_api, branch)
+
+        payload = {
+            "message": f"Actualizar {ruta_remota}",
+            "content": base64.b64encode(contenido_bytes).decode("ascii"),
+            "branch": branch,
+        }
+        if sha:
+            payload["sha"] = sha
+
+        r = _api("PUT", ruta_api, json=payload)
+        if r.status_code in (409, 422) and sha_publicado:
+            # El índice estaba desactualizado (alguien tocó el repo): se consulta el sha real
+            payload.pop("sha", None)
+            sha = _sha_remoto(ruta_api, branch)
+            if sha:
+                payload["sha"] = sha
+            r = _api("PUT", ruta_api, json=payload)
+
+        if r.status_code in (200, 201):
+            indice_publicacion.registrar(repo_name, [(ruta_remota, sha_nuevo, len(contenido_bytes))])
+            url = r.json().get("content", {}).get("html_url", "")
+            return {"ok": True, "status": r.status_code, "url": url, "omitido": False, "bytes": len(contenido_bytes)}
+
+        print(f"❌ GitHub rechazó {ruta_remota} en {repo_name}: {r.status_code} {r.text[:200]}")
+        return {"ok": False, "status": r.status_code, "error": r.text[:200]}
+    except requests.RequestException as e:
+        print(f"❌ Error de red al subir {ruta_remota} a {repo_name}: {e}")
+        return {"ok": False, "error": str(e)}
+
+def nuevas_estadisticas() -> dict:
+    return {"subidos": 0, "omitidos": 0, "bytes_subidos": 0, "bytes_omitidos": 0}
+
+def sumar_resultado(estadisticas: dict, resultado: dict):
+    if not resultado.get("ok"):
+        return
+    if resultado.get("omitido"):
+        estadisticas["omitidos"] += 1
+        estadisticas["bytes_omitidos"] += resultado.get("bytes", 0)
+    else:
+        estadisticas["subidos"] += 1
+        estadisticas["bytes_subidos"] += resultado.get("bytes", 0)
+
+# ----------------------------------------------------
+# C. PUBLICACIÓN EN UN ÚNICO COMMIT (GIT DATA API)
+# ----------------------------------------------------
+
+def rutas_archivos_sitio(upload_folder: str, email: str, logo: str = None) -> dict:
+    """
+    {ruta_remota: ruta_local} de los archivos del sitio publicado (sin index.html):
+    iconos fijos, logo del usuario e imágenes optimizadas de sus productos.
+    """
+    rutas = {}
+    for nombre in ICONOS_FIJOS:
+        ruta = os.path.join(upload_folder, nombre)
+        if os.path.isfile(ruta):
+            rutas[f"static/img/{nombre}"] = ruta
+
+    if logo and os.path.isfile(os.path.join(upload_folder, logo)):
+        rutas[f"static/img/{logo}"] = os.path.join(upload_folder, logo)
+
+    if email:
+        # Sólo la carpeta del usuario (services/almacen_uploads.py), no toda la de uploads
+        for filename, ruta in almacen_uploads.listar_usuario(upload_folder, email).items():
+            if filename.startswith("optimizado_"):
+                rutas[f"img/{filename}"] = ruta
+
+    return rutas
+
+def recolectar_archivos_sitio(upload_folder: str, email: str, html: str = None, logo: str = None) -> dict:
+    """
+    Arma {ruta_remota: bytes} con todo lo que forma el sitio publicado:
+    index.html, iconos fijos, logo del usuario e imágenes optimizadas de sus productos.
+    Con html=None se omite index.html (no se volvió a renderizar).
+    """
+    archivos = {"index.html": html.encode('utf-8')} if html is not None else {}
+
+    for ruta_remota, ruta in rutas_archivos_sitio(upload_folder, email, logo).items():
+        with open(ruta, 'rb') as f:
+            archivos[ruta_remota] = f.read()
+
+    return archivos
+
+def _crear_blob(repo_name: str, contenido: bytes) -> str:
+    # Direccionado por contenido: repetirlo devuelve el mismo sha, se puede reintentar
+    r = _api("POST", f"/repos/{GITHUB_USERNAME}/{repo_name}/git/blobs", idempotente=True,
+             json={"content": base64.b64encode(contenido).decode("ascii"), "encoding": "base64"})
+    r.raise_for_status()
+    return r.json()["sha"]
+
+def _head_actual(repo_name: str, branch: str):
+    """Devuelve (sha_commit, sha_tree) de la rama o (None, None) si el repo está vacío."""
+    r = _api("GET", f"/repos/{GITHUB_USERNAME}/{repo_name}/git/ref/heads/{branch}")
+    if r.status_code in (404, 409):
+        return None, None
+    r.raise_for_status()
+    sha_commit = r.json()["object"]["sha"]
+
+    r = _api("GET", f"/repos/{GITHUB_USERNAME}/{repo_name}/git/commits/{sha_commit}")
+    r.raise_for_status()
+    return sha_commit, r.json()["tree"]["sha"]
+
+def publicar_commit(repo_name: str, archivos: dict, mensaje: str = "Publicar sitio", branch="main",
+                    reintentos: int = 2) -> dict:
+    """
+    Publica todos los archivos ({ruta_remota: bytes}) en un único commit:
+    blobs en paralelo -> un tree sobre el tree actual -> un commit -> mover la rama.
+    """
     if not GITHUB_TOKEN: return {"ok": False, "error": "Token de GitHub no disponible"}
-    # ... (Lógica completa para subir el archivo con SHA check) ...
-    return {"ok": True, "status": 200, "url": "URL_DE_GITHUB"}
+    if not archivos: return {"ok": True, "commit": None, "archivos": 0, **nuevas_estadisticas()}
+
+    # Deduplicación: sólo viajan los archivos cuyo blob difiere del último publicado
+    publicados = indice_publicacion.obtener_varios(repo_name)
+    shas_locales = {ruta: sha_blob(contenido) for ruta, contenido in archivos.items()}
+    estadisticas = nuevas_estadisticas()
+    for ruta, contenido in archivos.items():
+        if publicados.get(ruta) == shas_locales[ruta]:
+            estadisticas["omitidos"] += 1
+            estadisticas["bytes_omitidos"] += len(contenido)
+        else:
+            estadisticas["subidos"] += 1
+            estadisticas["bytes_subidos"] += len(contenido)
+    todos = archivos
+    archivos = {ruta: c for ruta, c in todos.items() if publicados.get(ruta) != shas_locales[ruta]}
+    if not archivos:
+        print(f"✅ GitHub: nada cambió en {repo_name}, no se crea commit")
+        return {"ok": True, "commit": None, "archivos": 0, **estadisticas}
+
+    base = f"/repos/{GITHUB_USERNAME}/{repo_name}/git"
+    try:
+        # Repo vacío (sin rama): el primer commit va sin base_tree ni parents y la rama se crea
+        # con POST /git/refs, todo en el mismo recorrido (un solo commit inicial)
+        head = _head_actual(repo_name, branch)
+        if head == (None, None) and len(archivos) < len(todos):
+            # Lo que diga el índice es viejo: se publica todo
+            indice_publicacion.olvidar(repo_name)
+            archivos = todos
+            estadisticas = nuevas_estadisticas()
+            estadisticas.update(subidos=len(todos), bytes_subidos=sum(len(c) for c in todos.values()))
+
+        # 1. Blobs en paralelo (no dependen del estado de la rama)
+        rutas = list(archivos)
+        workers = max(1, min(GITHUB_BLOBS_WORKERS, len(rutas)))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            shas = list(pool.map(lambda ruta: _crear_blob(repo_name, archivos[ruta]), rutas))
+        entradas = [{"path": ruta, "mode": "100644", "type": "blob", "sha": sha} for ruta, sha in zip(rutas, shas)]
+
+        for intento in range(reintentos + 1):
+            # 2. Tree nuevo sobre el tree del último commit (lo no tocado se conserva)
+            parent, base_tree = head
+            payload_tree = {"tree": entradas}
+            if base_tree:
+                payload_tree["base_tree"] = base_tree
+            r = _api("POST", f"{base}/trees", json=payload_tree, idempotente=True)
+            r.raise_for_status()
+            sha_tree = r.json()["sha"]
+
+            # 3. Commit (un duplicado queda suelto: nada lo referencia hasta mover la rama)
+            r = _api("POST", f"{base}/commits", idempotente=True,
+                     json={"message": mensaje, "tree": sha_tree, "parents": [parent] if parent else []})
+            r.raise_for_status()
+            sha_commit = r.json()["sha"]
+
+            # 4. Mover (o crear, si el repo estaba vacío) la rama; si otro la creó antes, 422 y se reintenta
+            if parent:
+                r = _api("PATCH", f"{base}/refs/heads/{branch}", json={"sha": sha_commit})
+            else:
+                r = _api("POST", f"{base}/refs", json={"ref": f"refs/heads/{branch}", "sha": sha_commit})
+            if r.status_code in (200, 201):
+                indice_publicacion.registrar(
+                    repo_name, [(ruta, shas_locales[ruta], len(c)) for ruta, c in archivos.items()])
+                print(f"✅ GitHub: {len(archivos)} archivos publicados en un commit ({sha_commit[:7]}) en {repo_name}, "
+                      f"{estadisticas['omitidos']} sin cambios ({estadisticas['bytes_omitidos']} bytes omitidos)")
+                return {"ok": True, "commit": sha_commit, "archivos": len(archivos), **estadisticas}
+            # 422: la rama avanzó mientras tanto (no fast-forward) -> reintentar sobre el nuevo head
+            if r.status_code != 422 or intento == reintentos:
+                r.raise_for_status()
+            print(f"⚠️ La rama {branch} de {repo_name} cambió durante la publicación, reintentando...")
+            head = _head_actual(repo_name, branch)
 
-def subir_iconos_png(repo_name: str, upload_folder: str):
-    """Sube los iconos PNG y el logo por defecto al repositorio."""
-    # ... (Lógica completa para subir archivos fijos) ...
-    pass
+        return {"ok": False, "error": "No se pudo actualizar la rama"}
+    except (requests.RequestException, KeyError, ValueError) as e:
+        print(f"❌ Error al publicar commit en {repo_name}: {e}")
+        return {"ok": False, "error": str(e)}
@@ -0,0 +1,191 @@
+import os
+import hashlib
+import multiprocessing
+import threading
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from services import arranque
+from services.metricas import medir
+
+# Pillow se importa en el primer uso (en los procesos del pool), no al arrancar la app
+Image = arranque.modulo_perezoso("PIL.Image")
+ImageOps = arranque.modulo_perezoso("PIL.ImageOps")
+
+# --- Configuraciones ---
+# Lado máximo (px) de cada variante. "thumb" coincide con los mini_* de static/img/webp.
+VARIANTES = {"card": 800, "thumb": 400}
+CALIDAD_WEBP = int(os.getenv("IMAGENES_CALIDAD_WEBP", "80"))
+IMAGENES_WORKERS = int(os.getenv("IMAGENES_WORKERS", "2"))
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+# ----------------------------------------------------
+# A. TRABAJO CPU (CORRE EN EL PROCESS POOL)
+# ----------------------------------------------------
+
+def _codificar_variantes(fuente) -> dict:
+    """
+    Decodifica la imagen una sola vez y devuelve {variante: bytes_webp}.
+    `fuente` son los bytes o la ruta de un archivo (la subida en lote no los pasa por el pipe del pool).
+    """
+    lado_max = max(VARIANTES.values())
+    with Image.open(fuente if isinstance(fuente, str) else BytesIO(fuente)) as original:
+        # En JPEG, draft() decodifica directamente a una escala reducida (mucho más barato)
+        original.draft("RGB", (lado_max, lado_max))
+        img = ImageOps.exif_transpose(original)
+        tiene_alfa = "A" in img.getbands() or "transparency" in img.info
+        img = img.convert("RGBA" if tiene_alfa else "RGB")
+
+    salida = {}
+    # De mayor a menor: cada variante se reduce desde la anterior, no desde el original
+    for nombre, lado in sorted(VARIANTES.items(), key=lambda kv: kv[1], reverse=True):
+        img.thumbnail((lado, lado), Image.LANCZOS)
+        buffer = BytesIO()
+        # Sin exif/icc: Pillow solo escribe metadata si se la pasamos explícitamente
+        img.save(buffer, format="WEBP", quality=CALIDAD_WEBP, method=4)
+        salida[nombre] = buffer.getvalue()
+    return salida
+
+# ----------------------------------------------------
+# B. API PARA LAS RUTAS
+# ----------------------------------------------------
+
+def _obtener_pool() -> ProcessPoolExecutor:
+    """Pool de procesos perezoso y propio de cada PID (seguro ante fork de gunicorn)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn: los hijos no heredan hilos ni locks del worker de Flask
+            _pool = ProcessPoolExecutor(max_workers=IMAGENES_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            _pool_pid = os.getpid()
+        return _pool
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+def nombre_variante(email: str, hash_contenido: str, variante: str) -> str:
+    """Nombre de una variante: el archivo en la carpeta del usuario y, bajo img/, en el repo publicado."""
+    return f"optimizado_{email}_{hash_contenido}_{variante}.webp"
+
+def _rutas_variantes(email: str, hash_contenido: str, carpeta: str):
+    archivos = {v: nombre_variante(email, hash_contenido, v) for v in VARIANTES}
+    return archivos, {v: os.path.join(carpeta, n) for v, n in archivos.items()}
+
+def _leer_existentes(rutas: dict):
+    """Variantes ya optimizadas de la misma imagen ({variante: bytes}), o None si falta alguna."""
+    if not all(os.path.exists(r) for r in rutas.values()):
+        return None
+    contenidos = {}
+    for variante, ruta in rutas.items():
+        with open(ruta, 'rb') as f:
+            contenidos[variante] = f.read()
+    return contenidos
+
+def _guardar_variantes(rutas: dict, contenidos: dict):
+    for variante, datos in contenidos.items():
+        # Escritura atómica: nunca se sirve un webp a medio escribir
+        tmp = f"{rutas[variante]}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(datos)
+        os.replace(tmp, rutas[variante])
+
+def _resultado_codificacion(futuro, email: str):
+    """({variante: bytes}, None) o (None, error) del trabajo del pool."""
+    try:
+        return futuro.result(), None
+    except BrokenProcessPool as e:
+        _descartar_pool()
+        print(f"❌ Pool de imágenes caído, se recrea en el próximo uso: {e}")
+        return None, "Error interno al procesar la imagen"
+    except Image.DecompressionBombError as e:
+        # No hereda de OSError/ValueError: sin esto, una imagen gigante terminaba en un 500
+        print(f"❌ Imagen demasiado grande para {email}: {e}")
+        return None, "La imagen es demasiado grande"
+    except (Image.UnidentifiedImageError, OSError, ValueError) as e:
+        print(f"❌ Imagen inválida para {email}: {e}")
+        return None, "El archivo no es una imagen válida"
+
+def optimizar_imagen(contenido: bytes, email: str, carpeta: str) -> dict:
+    """
+    Genera las variantes WebP de una imagen subida y las guarda en `carpeta` (la del usuario).
+    Devuelve {"ok": True, "hash", "archivos": {variante: nombre}, "contenidos": {variante: bytes}}
+    o {"ok": False, "error"}.
+    """
+    if not contenido:
+        return {"ok": False, "error": "Archivo vacío"}
+
+    hash_contenido = hashlib.sha256(contenido).hexdigest()[:16]
+    archivos, rutas = _rutas_variantes(email, hash_contenido, carpeta)
+
+    # Misma imagen ya optimizada: no se vuelve a codificar
+    contenidos = _leer_existentes(rutas)
+    if contenidos is not None:
+        return {"ok": True, "hash": hash_contenido, "archivos": archivos, "contenidos": contenidos}
+
+    with medir("imagen", "optimizar"):
+        try:
+            futuro = _obtener_pool().submit(_codificar_variantes, contenido)
+        except BrokenProcessPool as e:
+            _descartar_pool()
+            print(f"❌ Pool de imágenes caído, se recrea en el próximo uso: {e}")
+            return {"ok": False, "error": "Error interno al procesar la imagen"}
+        contenidos, error = _resultado_codificacion(futuro, email)
+    if error:
+        return {"ok": False, "error": error}
+
+    _guardar_variantes(rutas, contenidos)
+    return {"ok": True, "hash": hash_contenido, "archivos": archivos, "contenidos": contenidos}
+
+def optimizar_archivos(archivos_subidos: list, email: str, carpeta: str) -> list:
+    """
+    Variante en lote de optimizar_imagen para archivos ya escritos en disco.
+    `archivos_subidos` es una lista de (ruta, hash_contenido); el hash ya se calculó al recibirlos.
+    Todas las imágenes nuevas se encolan juntas en el pool (que las reparte entre sus procesos)
+    y cada proceso lee su archivo del disco. Las repetidas, en el lote o de subidas anteriores,
+    no se codifican de nuevo. Devuelve un resultado por archivo, en el mismo orden y con el
+    formato de optimizar_imagen.
+    """
+    resultados = [None] * len(archivos_subidos)
+    pendientes = {}  # hash -> (futuro, [índices])
+    with medir("imagen", "optimizar_lote"):
+        for i, (ruta, hash_contenido) in enumerate(archivos_subidos):
+            if hash_contenido in pendientes:
+                pendientes[hash_contenido][1].append(i)
+                continue
+            archivos, rutas = _rutas_variantes(email, hash_contenido, carpeta)
+            contenidos = _leer_existentes(rutas)
+            if contenidos is not None:
+                resultados[i] = {"ok": True, "hash": hash_contenido, "archivos": archivos, "contenidos": contenidos}
+                pendientes[hash_contenido] = (None, [i])
+                continue
+            try:
+                futuro = _obtener_pool().submit(_codificar_variantes, ruta)
+            except BrokenProcessPool as e:
+                _descartar_pool()
+                print(f"❌ Pool de imágenes caído, se recrea en el próximo uso: {e}")
+                resultados[i] = {"ok": False, "error": "Error interno al procesar la imagen"}
+                continue
+            pendientes[hash_contenido] = (futuro, [i])
+
+        for hash_contenido, (futuro, indices) in pendientes.items():
+            if futuro is None:
+                resultado = resultados[indices[0]]
+            else:
+                contenidos, error = _resultado_codificacion(futuro, email)
+                if error:
+                    resultado = {"ok": False, "error": error}
+                else:
+                    archivos, rutas = _rutas_variantes(email, hash_contenido, carpeta)
+                    _guardar_variantes(rutas, contenidos)
+                    resultado = {"ok": True, "hash": hash_contenido, "archivos": archivos, "contenidos": contenidos}
+            for i in indices:
+                resultados[i] = resultado
+
+    return resultados
@@ -0,0 +1,136 @@
+import os
+import hashlib
+import threading
+import time
+
+# ----------------------------------------------------
+# ÍNDICE DE VERSIONES DE LA CARPETA DE IMÁGENES
+# ----------------------------------------------------
+# Reemplaza el os.path.getmtime por imagen y por render del filtro `imgver`:
+# se construye una vez al arrancar, las rutas de subida/limpieza lo mantienen
+# al día y un rescan periódico cubre lo que cambie por fuera (otros workers).
+
+
+class IndiceImagenes:
+    """Mapa en memoria nombre_relativo -> (mtime, tamaño) de la carpeta de uploads."""
+
+    def __init__(self, carpeta: str, intervalo_rescan: float = 300.0, modo: str = "mtime"):
+        self.carpeta = carpeta
+        self.intervalo_rescan = intervalo_rescan
+        self.modo = modo  # "mtime" (como antes) o "hash" (hash del contenido)
+        self._archivos = {}    # nombre -> (mtime, tamaño)
+        self._hashes = {}      # nombre -> ((mtime, tamaño), hash_corto)
+        self._ausentes = set() # nombres consultados que no existen (evita stats repetidos)
+        self._lock = threading.Lock()
+        self._rescan_pid = None
+
+    # --- Construcción / mantenimiento ---
+
+    def construir(self):
+        """Recorre la carpeta (con subcarpetas) y reemplaza el índice completo."""
+        archivos = {}
+        for raiz, dirs, nombres in os.walk(self.carpeta):
+            # Manifiestos, locks y papelera de los uploads (services/almacen_uploads.py) no se sirven
+            dirs[:] = [d for d in dirs if not d.startswith(".")]
+            for nombre in nombres:
+                if nombre.startswith("."):
+                    continue
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    st = os.stat(ruta)
+                except OSError:
+                    continue
+                relativo = os.path.relpath(ruta, self.carpeta).replace(os.sep, "/")
+                archivos[relativo] = (st.st_mtime, st.st_size)
+        with self._lock:
+            self._archivos = archivos
+            self._ausentes.clear()
+            # Hashes de archivos que cambiaron o desaparecieron ya no valen
+            self._hashes = {n: h for n, h in self._hashes.items() if archivos.get(n) == h[0]}
+        return len(archivos)
+
+    def actualizar(self, nombre: str):
+        """Registra un archivo recién escrito (nombre relativo a la carpeta)."""
+        try:
+            st = os.stat(os.path.join(self.carpeta, nombre))
+        except OSError:
+            self.eliminar(nombre)
+            return
+        with self._lock:
+            self._archivos[nombre] = (st.st_mtime, st.st_size)
+            self._ausentes.discard(nombre)
+            self._hashes.pop(nombre, None)
+
+    def eliminar(self, nombre: str):
+        with self._lock:
+            self._archivos.pop(nombre, None)
+            self._hashes.pop(nombre, None)
+
+    def asegurar_rescan(self):
+        """Arranca (una vez por proceso) el hilo de rescan periódico."""
+        if self.intervalo_rescan <= 0 or self._rescan_pid == os.getpid():
+            return
+        with self._lock:
+            if self._rescan_pid == os.getpid():
+                return
+            # Tras un fork el hilo del padre no existe en el hijo: se arranca uno por PID
+            self._rescan_pid = os.getpid()
+        threading.Thread(target=self._bucle_rescan, name="imgver-rescan", daemon=True).start()
+
+    def _bucle_rescan(self):
+        while True:
+            time.sleep(self.intervalo_rescan)
+            try:
+                self.construir()
+            except Exception as e:
+                print(f"⚠️ Error en rescan de imágenes: {e}")
+
+    # --- Consultas ---
+
+    def _stat_indexado(self, nombre: str):
+        with self._lock:
+            info = self._archivos.get(nombre)
+            if info is not None or nombre in self._ausentes:
+                return info
+        # Primera consulta de un nombre desconocido: un único stat y se recuerda el resultado
+        try:
+            st = os.stat(os.path.join(self.carpeta, nombre))
+            info = (st.st_mtime, st.st_size)
+        except (OSError, ValueError):
+            info = None
+        with self._lock:
+            if info is None:
+                self._ausentes.add(nombre)
+            else:
+                self._archivos[nombre] = info
+        return info
+
+    def version(self, nombre: str):
+        """Versión para cache-busting: mtime % 10_000 (modo mtime) o hash corto (modo hash). 0 si no existe."""
+        info = self._stat_indexado(nombre)
+        if info is None:
+            return 0
+        if self.modo == "hash":
+            return self.hash_contenido(nombre) or 0
+        return int(info[0]) % 10_000
+
+    def hash_contenido(self, nombre: str):
+        """Hash corto del contenido, calculado una vez por (mtime, tamaño)."""
+        info = self._stat_indexado(nombre)
+        if info is None:
+            return None
+        with self._lock:
+            cacheado = self._hashes.get(nombre)
+            if cacheado is not None and cacheado[0] == info:
+                return cacheado[1]
+        try:
+            h = hashlib.sha1()
+            with open(os.path.join(self.carpeta, nombre), 'rb') as f:
+                for bloque in iter(lambda: f.read(64 * 1024), b""):
+                    h.update(bloque)
+        except OSError:
+            return None
+        corto = h.hexdigest()[:10]
+        with self._lock:
+            self._hashes[nombre] = (info, corto)
+        return corto
@@ -0,0 +1,125 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context, has_request_context, request
+
+# ----------------------------------------------------
+# MÉTRICAS: HISTOGRAMAS PROMETHEUS Y SERVER-TIMING
+# ----------------------------------------------------
+# Cada request se mide completo (ruta, método, status) y cada llamada a un
+# backend (Firestore, GitHub, render, imágenes) se mide con medir(). Lo medido
+# durante un request sale también en su header Server-Timing. El costo es un
+# perf_counter y un bisect bajo lock por medición.
+# Los contadores son por proceso: con varios workers de gunicorn cada uno
+# expone los suyos en /metrics (la etiqueta "pid" los distingue).
+
+METRICAS_SERVER_TIMING = os.getenv("METRICAS_SERVER_TIMING", "1") not in ("0", "false", "no")
+
+# Mismos cortes (en segundos) que los histogramas por defecto de prometheus_client
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class Histograma:
+    """Histograma acumulado por combinación de etiquetas (formato de exposición de Prometheus)."""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple, buckets: tuple = BUCKETS):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # valores de etiquetas -> [conteos por bucket..., +Inf], suma
+        self._lock = threading.Lock()
+
+    def observar(self, segundos: float, *valores):
+        i = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][i] += 1
+            serie[1] += segundos
+
+    def exponer(self, extra: dict) -> list:
+        with self._lock:
+            series = {k: ([*v[0]], v[1]) for k, v in self._series.items()}
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        for valores, (conteos, suma) in sorted(series.items()):
+            base = {**dict(zip(self.etiquetas, valores)), **extra}
+            acumulado = 0
+            for limite, conteo in zip((*self.buckets, "+Inf"), conteos):
+                acumulado += conteo
+                le = limite if limite == "+Inf" else repr(float(limite))
+                lineas.append(f"{self.nombre}_bucket{_etiquetas({**base, 'le': le})} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(base)} {suma:.6f}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(base)} {acumulado}")
+        return lineas
+
+
+def _etiquetas(valores: dict) -> str:
+    escapar = lambda v: str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{escapar(v)}"' for k, v in valores.items()) + "}"
+
+
+http_segundos = Histograma(
+    "appweb_http_request_seconds", "Duración de los requests por ruta.", ("ruta", "metodo", "status"))
+backend_segundos = Histograma(
+    "appweb_backend_seconds", "Duración de las operaciones contra cada backend.", ("backend", "operacion", "resultado"))
+
+# ----------------------------------------------------
+# MEDICIÓN
+# ----------------------------------------------------
+
+@contextmanager
+def medir(backend: str, operacion: str):
+    """
+    Mide un bloque: va al histograma del backend y, si hay request, a su Server-Timing.
+    Produce un dict donde el bloque puede cambiar "resultado" (p. ej. el status HTTP).
+    """
+    inicio = time.perf_counter()
+    etiquetas = {"resultado": "ok"}
+    try:
+        yield etiquetas
+    except BaseException:
+        etiquetas["resultado"] = "error"
+        raise
+    finally:
+        duracion = time.perf_counter() - inicio
+        backend_segundos.observar(duracion, backend, operacion, etiquetas["resultado"])
+        if has_request_context():
+            tiempos = g.setdefault("_server_timing", {})
+            clave = f"{backend}.{operacion}"
+            total, veces = tiempos.get(clave, (0.0, 0))
+            tiempos[clave] = (total + duracion, veces + 1)
+
+
+def iniciar_request():
+    g._inicio_request = time.perf_counter()
+
+
+def terminar_request(response):
+    """after_request: histograma por ruta (la regla, no la URL) y header Server-Timing."""
+    inicio = g.get("_inicio_request") if has_app_context() else None
+    if inicio is None:
+        return response
+    duracion = time.perf_counter() - inicio
+    ruta = request.url_rule.rule if request.url_rule is not None else "(sin ruta)"
+    http_segundos.observar(duracion, ruta, request.method, str(response.status_code))
+
+    if METRICAS_SERVER_TIMING:
+        partes = []
+        for clave, (total, veces) in g.get("_server_timing", {}).items():
+            parte = f"{clave};dur={total * 1000:.2f}"
+            partes.append(parte + (f';desc="x{veces}"' if veces > 1 else ""))
+        partes.append(f"app;dur={duracion * 1000:.2f}")
+        response.headers.add("Server-Timing", ", ".join(partes))
+    return response
+
+
+def exposicion() -> str:
+    """Texto para /metrics (formato de exposición de Prometheus 0.0.4)."""
+    extra = {"pid": os.getpid()}
+    lineas = http_segundos.exponer(extra) + backend_segundos.exponer(extra)
+    return "\n".join(lineas) + "\n"
@@ -0,0 +1,213 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from services import arranque
+
+# El SDK (y requests detrás) se importa recién al crear el cliente (ver services/arranque.py)
+mercadopago = arranque.modulo_perezoso("mercadopago")
+_http_client = arranque.modulo_perezoso("mercadopago.http.http_client")
+
+# ----------------------------------------------------
+# MERCADO PAGO: SDK, CACHE DE PAGOS Y CONVENCIONES
+# ----------------------------------------------------
+
+MP_API_URL_OFICIAL = "https://api.mercadopago.com"
+# Configurable para apuntar a un stand-in local de la API (pruebas / benchmarks)
+MERCADO_PAGO_API_URL = (os.getenv("MERCADO_PAGO_API_URL") or MP_API_URL_OFICIAL).rstrip("/")
+MP_CACHE_PAGOS_TTL = float(os.getenv("MP_CACHE_PAGOS_TTL", "30"))
+MP_CACHE_PAGOS_MAX = int(os.getenv("MP_CACHE_PAGOS_MAX", "512"))
+
+# Convención de las preferencias que arma la tienda (y que lee el webhook):
+#   external_reference = email de la tienda
+#   item.id            = "<id_base>|<talle>"  (talle vacío si el producto no tiene talles)
+SEPARADOR_ITEM = "|"
+
+
+def codificar_item_id(id_base: str, talle: str = "") -> str:
+    return f"{id_base}{SEPARADOR_ITEM}{talle or ''}"
+
+
+def decodificar_item_id(item_id: str):
+    """Devuelve (id_base, talle). Ids sin separador se toman como id_base sin talle."""
+    id_base, _sep, talle = str(item_id or "").rpartition(SEPARADOR_ITEM)
+    if not _sep:
+        return str(item_id or ""), ""
+    return id_base, talle
+
+
+# Límites del carrito (el input de cantidad del preview va de 1 a 100)
+MAX_CANTIDAD_ITEM = 100
+MAX_ITEMS_CARRITO = int(os.getenv("MP_MAX_ITEMS_CARRITO", "100"))
+MONEDA = os.getenv("MERCADO_PAGO_MONEDA") or "ARS"
+
+
+_ClienteHTTPRedirigido = None
+
+
+def cliente_http_redirigido(base_url: str):
+    """HttpClient del SDK que manda las llamadas a otra URL base (stand-in local)."""
+    global _ClienteHTTPRedirigido
+    if _ClienteHTTPRedirigido is None:
+        class ClienteHTTPRedirigido(_http_client.HttpClient):
+            def __init__(self, base_url: str):
+                super().__init__()
+                self.base_url = base_url.rstrip("/")
+
+            def request(self, method, url, *args, **kwargs):
+                if url.startswith(MP_API_URL_OFICIAL):
+                    url = self.base_url + url[len(MP_API_URL_OFICIAL):]
+                return super().request(method, url, *args, **kwargs)
+
+        _ClienteHTTPRedirigido = ClienteHTTPRedirigido
+    return _ClienteHTTPRedirigido(base_url)
+
+
+def crear_sdk(access_token: str):
+    """SDK de Mercado Pago (None sin token), redirigido si MERCADO_PAGO_API_URL no es la oficial."""
+    if not access_token or not isinstance(access_token, str):
+        return None
+    if MERCADO_PAGO_API_URL != MP_API_URL_OFICIAL:
+        return mercadopago.SDK(access_token.strip(), http_client=cliente_http_redirigido(MERCADO_PAGO_API_URL))
+    return mercadopago.SDK(access_token.strip())
+
+# ----------------------------------------------------
+# CONSULTA DE PAGOS CON CACHE CORTO
+# ----------------------------------------------------
+# En los picos MP manda varias notificaciones por pago (created, updated y
+# reintentos): el cache evita pedir el mismo pago varias veces en pocos segundos.
+# Sólo se cachean estados finales: un pago pendiente se vuelve a consultar.
+
+ESTADOS_FINALES = {"approved", "rejected", "cancelled", "refunded", "charged_back"}
+
+_cache_pagos = OrderedDict()  # payment_id -> (expira, pago)
+_cache_lock = threading.Lock()
+_estadisticas = {"hits": 0, "consultas": 0}
+
+
+def obtener_pago(sdk, payment_id: str, usar_cache: bool = True):
+    """Datos del pago ({"status", "external_reference", "additional_info", ...}) o None si MP no lo devuelve."""
+    ahora = time.time()
+    if usar_cache:
+        with _cache_lock:
+            entrada = _cache_pagos.get(payment_id)
+            if entrada is not None and entrada[0] > ahora:
+                _cache_pagos.move_to_end(payment_id)
+                _estadisticas["hits"] += 1
+                return entrada[1]
+
+    if sdk is None:
+        raise RuntimeError("SDK de Mercado Pago no inicializado")
+    respuesta = sdk.payment().get(payment_id)
+    with _cache_lock:
+        _estadisticas["consultas"] += 1
+    if respuesta.get("status") != 200:
+        if respuesta.get("status") == 404:
+            return None
+        raise RuntimeError(f"Mercado Pago respondió {respuesta.get('status')} para el pago {payment_id}")
+
+    pago = respuesta.get("response") or {}
+    if pago.get("status") not in ESTADOS_FINALES:
+        return pago
+    with _cache_lock:
+        _cache_pagos[payment_id] = (ahora + MP_CACHE_PAGOS_TTL, pago)
+        _cache_pagos.move_to_end(payment_id)
+        while len(_cache_pagos) > MP_CACHE_PAGOS_MAX:
+            _cache_pagos.popitem(last=False)
+    return pago
+
+
+def items_del_pago(pago: dict) -> list:
+    """[{"id_base", "talle", "cantidad", "titulo"}] a partir de additional_info.items."""
+    items = []
+    for item in (pago.get("additional_info") or {}).get("items") or []:
+        id_base, talle = decodificar_item_id(item.get("id"))
+        try:
+            cantidad = int(float(item.get("quantity") or 0))
+        except (TypeError, ValueError):
+            cantidad = 0
+        if id_base and cantidad > 0:
+            items.append({"id_base": id_base, "talle": talle, "cantidad": cantidad, "titulo": item.get("title")})
+    return items
+
+
+def estadisticas_cache_pagos() -> dict:
+    with _cache_lock:
+        return {**_estadisticas, "entradas": len(_cache_pagos)}
+
+# ----------------------------------------------------
+# CHECKOUT: VALIDACIÓN DEL CARRITO Y PREFERENCIA
+# ----------------------------------------------------
+
+def validar_carrito(carrito: list, precios: dict):
+    """
+    Cotiza el carrito con los precios del servidor (el del DOM no se usa) y controla
+    el stock por talle. `precios` es {id_base: (precio, talles_stock, nombre)}.
+    Devuelve (items para la preferencia, problemas [{"id_base", "talle", "error", ...}]).
+    """
+    cantidades = OrderedDict()  # (id_base, talle) -> cantidad; mismas líneas se suman
+    problemas = []
+    for linea in carrito[:MAX_ITEMS_CARRITO]:
+        id_base = str((linea or {}).get("id_base") or "").strip()
+        talle = str(linea.get("talle") or "").strip() if id_base else ""
+        try:
+            cantidad = int(linea.get("cantidad") or 0) if id_base else 0
+        except (TypeError, ValueError):
+            cantidad = 0
+        if not id_base or not 1 <= cantidad <= MAX_CANTIDAD_ITEM:
+            problemas.append({"id_base": id_base, "talle": talle, "error": "Línea inválida"})
+            continue
+        cantidades[(id_base, talle)] = cantidades.get((id_base, talle), 0) + cantidad
+    if len(carrito) > MAX_ITEMS_CARRITO:
+        problemas.append({"id_base": "", "talle": "", "error": f"Máximo {MAX_ITEMS_CARRITO} líneas por carrito"})
+
+    items = []
+    for (id_base, talle), cantidad in cantidades.items():
+        if id_base not in precios:
+            problemas.append({"id_base": id_base, "talle": talle, "error": "Producto inexistente"})
+            continue
+        precio, talles_stock, nombre = precios[id_base]
+        if talles_stock:
+            if not talle:
+                # El producto maneja talles y la línea no trae ninguno (select vacío o agotado)
+                problemas.append({"id_base": id_base, "talle": talle, "error": "Falta elegir el talle"})
+                continue
+            if talle not in talles_stock:
+                problemas.append({"id_base": id_base, "talle": talle, "error": "Talle inexistente"})
+                continue
+            disponible = int(talles_stock.get(talle) or 0)
+            if cantidad > disponible:
+                problemas.append({"id_base": id_base, "talle": talle, "error": "Sin stock suficiente",
+                                  "disponible": max(disponible, 0)})
+                continue
+        items.append({
+            "id": codificar_item_id(id_base, talle),
+            "title": f"{nombre} ({talle})" if talle else nombre,
+            "quantity": cantidad,
+            "unit_price": precio,
+            "currency_id": MONEDA,
+        })
+    return items, problemas
+
+
+def crear_preferencia(sdk, email: str, items: list, url_base: str) -> dict:
+    """Crea la preferencia con la convención del webhook. Devuelve {"preference_id", "init_point"}."""
+    if sdk is None:
+        raise RuntimeError("SDK de Mercado Pago no inicializado")
+    url_base = url_base.rstrip("/")
+    respuesta = sdk.preference().create({
+        "items": items,
+        "external_reference": email,
+        "back_urls": {
+            "success": f"{url_base}/success",
+            "failure": f"{url_base}/failure",
+            "pending": f"{url_base}/pending",
+        },
+        "auto_return": "approved",
+        "notification_url": f"{url_base}/webhook_mp",
+    })
+    if respuesta.get("status") not in (200, 201):
+        raise RuntimeError(f"Mercado Pago respondió {respuesta.get('status')} al crear la preferencia")
+    preferencia = respuesta.get("response") or {}
+    return {"preference_id": preferencia.get("id"), "init_point": preferencia.get("init_point")}
@@ -0,0 +1,201 @@
+import os
+import sqlite3
+import threading
+import time
+
+from services import firebase_service as fbs
+from services import mp_service as mps
+from services.datos_locales import ruta_datos
+
+# ----------------------------------------------------
+# COLA DEDUPLICADA DE NOTIFICACIONES DE MERCADO PAGO
+# ----------------------------------------------------
+# El webhook sólo registra el payment id (una fila por pago en sqlite, compartida
+# entre workers de gunicorn) y responde 200. Las notificaciones repetidas del
+# mismo pago se suman a la fila existente en vez de encolar otro trabajo. Los
+# hilos de cada proceso consultan el pago a MP y aplican el descuento de stock.
+
+PAGOS_MP_DB = os.getenv("PAGOS_MP_DB") or ruta_datos("pagos_mp.sqlite3")
+PAGOS_MP_WORKERS = int(os.getenv("PAGOS_MP_WORKERS", "2"))
+PAGOS_MP_MAX_INTENTOS = int(os.getenv("PAGOS_MP_MAX_INTENTOS", "6"))
+PAGOS_MP_TIMEOUT_HUERFANO = float(os.getenv("PAGOS_MP_TIMEOUT_HUERFANO", "300"))
+
+# pendiente -> en_curso -> aplicado | duplicado | ignorado (no aprobado aún) | error (sin más reintentos)
+PENDIENTE, EN_CURSO, APLICADO, DUPLICADO, IGNORADO, ERROR = (
+    "pendiente", "en_curso", "aplicado", "duplicado", "ignorado", "error")
+# Una notificación nueva de un pago en estos estados lo vuelve a procesar
+# (p. ej. un pago "in_process" que después pasa a "approved")
+REABRIBLES = (IGNORADO, ERROR)
+
+
+class ColaPagos:
+    """Cola sqlite con un trabajo por payment id + pool de hilos por proceso."""
+
+    def __init__(self, procesar, ruta: str = PAGOS_MP_DB, workers: int = PAGOS_MP_WORKERS):
+        self.procesar = procesar  # procesar(payment_id) -> (estado, detalle)
+        self.ruta = ruta
+        self.workers = workers
+        self._local = threading.local()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._hay_trabajo = threading.Event()
+
+    def _conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS pagos ("
+                " payment_id TEXT PRIMARY KEY, estado TEXT NOT NULL, notificaciones INTEGER NOT NULL,"
+                " intentos INTEGER NOT NULL DEFAULT 0, proximo_intento REAL NOT NULL,"
+                " detalle TEXT, recibido REAL NOT NULL, actualizado REAL NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_pagos_estado ON pagos (estado, proximo_intento)")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def encolar(self, payment_id: str) -> bool:
+        """Registra la notificación. Devuelve True si quedó un trabajo nuevo (o reabierto) para el pago."""
+        ahora = time.time()
+        con = self._conexion()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            fila = con.execute("SELECT estado FROM pagos WHERE payment_id = ?", (payment_id,)).fetchone()
+            if fila is None:
+                con.execute(
+                    "INSERT INTO pagos (payment_id, estado, notificaciones, proximo_intento, recibido, actualizado)"
+                    " VALUES (?, ?, 1, ?, ?, ?)", (payment_id, PENDIENTE, ahora, ahora, ahora))
+                nuevo = True
+            elif fila[0] in REABRIBLES:
+                con.execute(
+                    "UPDATE pagos SET estado = ?, intentos = 0, proximo_intento = ?, actualizado = ?,"
+                    " notificaciones = notificaciones + 1 WHERE payment_id = ?",
+                    (PENDIENTE, ahora, ahora, payment_id))
+                nuevo = True
+            else:
+                # Duplicado: ya está pendiente, en curso o aplicado
+                con.execute("UPDATE pagos SET notificaciones = notificaciones + 1 WHERE payment_id = ?", (payment_id,))
+                nuevo = False
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        if nuevo:
+            self._hay_trabajo.set()
+        return nuevo
+
+    def estado(self, payment_id: str):
+        fila = self._conexion().execute(
+            "SELECT payment_id, estado, notificaciones, intentos, detalle, recibido, actualizado"
+            " FROM pagos WHERE payment_id = ?", (payment_id,)).fetchone()
+        if fila is None:
+            return None
+        return dict(zip(("payment_id", "estado", "notificaciones", "intentos", "detalle", "recibido", "actualizado"), fila))
+
+    def estadisticas(self) -> dict:
+        filas = self._conexion().execute(
+            "SELECT estado, COUNT(*), SUM(notificaciones) FROM pagos GROUP BY estado").fetchall()
+        return {
+            "por_estado": {estado: cantidad for estado, cantidad, _n in filas},
+            "notificaciones": sum(n or 0 for _e, _c, n in filas),
+            "cache_pagos": mps.estadisticas_cache_pagos(),
+        }
+
+    def _tomar_siguiente(self):
+        con = self._conexion()
+        ahora = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("UPDATE pagos SET estado = ? WHERE estado = ? AND actualizado < ?",
+                        (PENDIENTE, EN_CURSO, ahora - PAGOS_MP_TIMEOUT_HUERFANO))
+            fila = con.execute(
+                "SELECT payment_id, intentos FROM pagos WHERE estado = ? AND proximo_intento <= ?"
+                " ORDER BY proximo_intento LIMIT 1", (PENDIENTE, ahora)).fetchone()
+            if fila is not None:
+                con.execute("UPDATE pagos SET estado = ?, intentos = intentos + 1, actualizado = ? WHERE payment_id = ?",
+                            (EN_CURSO, ahora, fila[0]))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return fila
+
+    def _terminar(self, payment_id: str, estado: str, detalle: str, intentos: int):
+        ahora = time.time()
+        proximo = ahora
+        if estado == ERROR and intentos < PAGOS_MP_MAX_INTENTOS:
+            # Reintento con backoff exponencial (2, 4, 8... segundos)
+            estado, proximo = PENDIENTE, ahora + 2 ** intentos
+        self._conexion().execute(
+            "UPDATE pagos SET estado = ?, detalle = ?, proximo_intento = ?, actualizado = ? WHERE payment_id = ?",
+            (estado, detalle, proximo, ahora, payment_id))
+
+    def asegurar_workers(self, app=None):
+        """Arranca los hilos de este proceso una sola vez (tras un fork se arrancan de nuevo)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._hay_trabajo = threading.Event()
+            for i in range(self.workers):
+                threading.Thread(target=self._bucle, args=(app,), name=f"pagos-mp-{i}", daemon=True).start()
+        self._hay_trabajo.set()
+
+    def _bucle(self, app):
+        while True:
+            try:
+                fila = self._tomar_siguiente()
+            except sqlite3.Error as e:
+                print(f"❌ Error leyendo la cola de pagos: {e}")
+                fila = None
+            if fila is None:
+                self._hay_trabajo.wait(timeout=1.0)
+                self._hay_trabajo.clear()
+                continue
+            payment_id, intentos = fila[0], fila[1] + 1
+            try:
+                if app is not None:
+                    with app.app_context():
+                        estado, detalle = self.procesar(payment_id)
+                else:
+                    estado, detalle = self.procesar(payment_id)
+            except Exception as e:
+                print(f"❌ Pago {payment_id}: intento {intentos} falló: {e}")
+                estado, detalle = ERROR, str(e)
+            try:
+                self._terminar(payment_id, estado, detalle, intentos)
+            except sqlite3.Error as e:
+                # El hilo sigue vivo: el pago queda en_curso y se retoma como huérfano
+                # (registrar_pago es idempotente, reaplicarlo no descuenta dos veces)
+                print(f"❌ Error guardando el estado del pago {payment_id}: {e}")
+                time.sleep(1.0)
+
+
+def procesar_pago(db_client, sdk, payment_id: str):
+    """Consulta el pago en MP y, si está aprobado, descuenta el stock una sola vez. Devuelve (estado, detalle)."""
+    pago = mps.obtener_pago(sdk, payment_id)
+    if pago is None:
+        return IGNORADO, "Pago inexistente en Mercado Pago"
+    if pago.get("status") != "approved":
+        # Todavía no: una notificación posterior (approved) lo reabre
+        return IGNORADO, f"Estado {pago.get('status')}"
+
+    email = (pago.get("external_reference") or "").strip().lower()
+    if not email:
+        return IGNORADO, "Pago sin external_reference (tienda)"
+    items = mps.items_del_pago(pago)
+    resultado = fbs.registrar_pago(db_client, email, payment_id, items, {
+        "payment_id": str(payment_id),
+        "estado": pago.get("status"),
+        "monto": pago.get("transaction_amount"),
+        "fecha_aprobado": pago.get("date_approved"),
+    })
+    print(f"💳 Pago {payment_id} de {email}: {resultado} ({len(items)} items)")
+    return (APLICADO if resultado == "aplicado" else DUPLICADO), f"{len(items)} items"
@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ----------------------------------------------------
+# ÍNDICE DE PRECIO Y STOCK POR TIENDA (PARA EL CHECKOUT)
+# ----------------------------------------------------
+# id_base -> (precio, talles_stock, nombre) de cada tienda, para validar y
+# cotizar un carrito completo sin leer Firestore. Lo mantiene al día el cache
+# de catálogo, que le reenvía las altas, parches e invalidaciones de cada
+# escritura (CatalogoCache.suscribir_indice). Como el cache, vive en memoria
+# del proceso: el TTL acota cuánto puede atrasarse un worker que no vio una
+# escritura, y el stock final igual lo descuenta el webhook de pagos.
+
+
+def valores_producto(producto: dict) -> tuple:
+    """(precio, talles_stock, nombre) de un documento de producto."""
+    return (
+        float(producto.get("precio") or 0.0),
+        dict(producto.get("talles_stock") or {}),
+        producto.get("nombre") or "",
+    )
+
+
+class IndicePrecios:
+    """Índice acotado (LRU + TTL) de precio y stock por tienda."""
+
+    def __init__(self, max_tiendas: int = 256, ttl: float = 300.0):
+        self.max_tiendas = max_tiendas
+        self.ttl = ttl
+        self._tiendas = OrderedDict()  # email -> {"productos": {id_base: tupla}, "expira": t}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._cargas = 0
+        self._parches = 0
+
+    def _vigente(self, email: str):
+        tienda = self._tiendas.get(email)
+        if tienda is not None and tienda["expira"] <= time.monotonic():
+            del self._tiendas[email]
+            return None
+        return tienda
+
+    # --- Carga y parches ---
+
+    def cargar(self, email: str, productos: list):
+        """Reemplaza el índice de la tienda con el catálogo completo leído de Firestore."""
+        indice = {p["id_base"]: valores_producto(p) for p in productos if p.get("id_base")}
+        with self._lock:
+            self._tiendas[email] = {"productos": indice, "expira": time.monotonic() + self.ttl}
+            self._tiendas.move_to_end(email)
+            while len(self._tiendas) > self.max_tiendas:
+                self._tiendas.popitem(last=False)
+            self._cargas += 1
+
+    def esta_cargada(self, email: str) -> bool:
+        with self._lock:
+            return self._vigente(email) is not None
+
+    def agregar(self, email: str, productos: list):
+        """Suma productos recién escritos (sólo si la tienda ya está indexada)."""
+        with self._lock:
+            tienda = self._vigente(email)
+            if tienda is None:
+                return
+            for p in productos:
+                if p.get("id_base"):
+                    tienda["productos"][p["id_base"]] = valores_producto(p)
+            self._parches += 1
+
+    def parchear(self, email: str, id_base: str, campos: dict):
+        """Aplica precio/talles_stock/nombre de `campos` al producto; si no estaba, lo deja como faltante."""
+        with self._lock:
+            tienda = self._vigente(email)
+            if tienda is None or id_base not in tienda["productos"]:
+                return
+            precio, talles_stock, nombre = tienda["productos"][id_base]
+            if "precio" in campos:
+                precio = float(campos["precio"] or 0.0)
+            if "talles_stock" in campos:
+                talles_stock = dict(campos["talles_stock"] or {})
+            if "nombre" in campos:
+                nombre = campos["nombre"] or ""
+            tienda["productos"][id_base] = (precio, talles_stock, nombre)
+            self._parches += 1
+
+    def descartar(self, email: str, ids_base: list = None):
+        """Olvida la tienda entera o sólo esos productos (el próximo checkout los lee de Firestore)."""
+        with self._lock:
+            if ids_base is None:
+                self._tiendas.pop(email, None)
+                return
+            tienda = self._tiendas.get(email)
+            if tienda is not None:
+                for id_base in ids_base:
+                    tienda["productos"].pop(id_base, None)
+
+    # --- Consulta ---
+
+    def buscar(self, email: str, ids_base) -> tuple:
+        """Devuelve ({id_base: (precio, talles_stock, nombre)}, [faltantes])."""
+        encontrados, faltantes = {}, []
+        with self._lock:
+            tienda = self._vigente(email)
+            productos = tienda["productos"] if tienda is not None else {}
+            for id_base in ids_base:
+                entrada = productos.get(id_base)
+                if entrada is None:
+                    faltantes.append(id_base)
+                else:
+                    encontrados[id_base] = entrada
+            if tienda is not None:
+                self._tiendas.move_to_end(email)
+            self._hits += len(encontrados)
+            self._misses += len(faltantes)
+        return encontrados, faltantes
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / total, 4) if total else 0.0,
+                "cargas": self._cargas,
+                "parches": self._parches,
+                "tiendas": len(self._tiendas),
+                "max_tiendas": self.max_tiendas,
+                "ttl": self.ttl,
+            }
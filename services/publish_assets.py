@@ -0,0 +1,344 @@
+import re
+import gzip
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli se publica sólo la copia .gz
+    brotli = None
+
+# ----------------------------------------------------
+# BUILD DEL index.html PUBLICADO
+# ----------------------------------------------------
+# Lo que step3 renderiza desde preview.html sirve tanto para la vista previa
+# (con modo admin) como para el sitio publicado. Antes de subirlo, esta etapa:
+#   1. quita los bloques marcados como sólo-admin (// @admin-inicio ... // @admin-fin
+#      en JS, <!-- @admin-inicio --> ... <!-- @admin-fin --> en HTML),
+#   2. pide a Google Fonts sólo las familias que usa el CSS de la tienda,
+#   3. minifica el HTML y el CSS inline (comentarios y espacios) y compacta el JS
+#      inline sólo por líneas: quita las líneas de comentario // y en blanco y la
+#      sangría, fuera de strings, template literals y comentarios /* */. Los
+#      saltos de línea quedan (el ASI no cambia) y si el recorrido no cierra
+#      limpio el script se publica tal cual,
+#   4. genera copias precomprimidas index.html.gz (y .br si está brotli).
+# Es determinista (gzip sin mtime): mismo render -> mismos bytes -> el snapshot
+# de publicación no vuelve a subir nada.
+
+# Cambiarlo fuerza a re-renderizar y republicar los sitios (entra en la clave de render)
+VERSION_BUILD = 3
+
+_RE_ADMIN_JS = re.compile(r"// @admin-inicio\b.*?// @admin-fin\b[^\n]*\n?", re.S)
+_RE_ADMIN_HTML = re.compile(r"<!--\s*@admin-inicio\s*-->.*?<!--\s*@admin-fin\s*-->", re.S)
+
+_RE_BLOQUE_CRUDO = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)", re.I | re.S)
+_RE_COMENTARIO_HTML = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_RE_ESPACIOS = re.compile(r"\s+")
+_RE_ETIQUETA = re.compile(r"(<[A-Za-z/!][^>\"']*(?:(?:\"[^\"]*\"|'[^']*')[^>\"']*)*>)|([^<]+|<)")
+_RE_ESPACIOS_ETIQUETA = re.compile(r"(\"[^\"]*\"|'[^']*')|\s+")
+
+_RE_LINK_FUENTES = re.compile(r'<link\b[^>]*href="(https://fonts\.googleapis\.com/css2\?[^"]*)"[^>]*>')
+_RE_FONT_FAMILY = re.compile(r"font-family\s*:\s*([^;}\"<]+)")
+# Genéricos de CSS: nunca se piden a Google Fonts
+_FAMILIAS_GENERICAS = {"serif", "sans-serif", "monospace", "cursive", "fantasy", "system-ui", "inherit", "initial"}
+
+# ----------------------------------------------------
+# A. BLOQUES DE ADMIN
+# ----------------------------------------------------
+
+def quitar_admin(html: str):
+    """(html sin los bloques sólo-admin, cantidad de bloques quitados)."""
+    html, en_js = _RE_ADMIN_JS.subn("", html)
+    html, en_html = _RE_ADMIN_HTML.subn("", html)
+    return html, en_js + en_html
+
+# ----------------------------------------------------
+# B. GOOGLE FONTS
+# ----------------------------------------------------
+
+def familias_usadas(html: str) -> set:
+    """Familias (en minúscula) que aparecen en algún font-family del documento."""
+    familias = set()
+    for valor in _RE_FONT_FAMILY.findall(html):
+        for familia in valor.split(","):
+            familia = familia.strip().strip("'\"").strip().lower()
+            if familia and familia not in _FAMILIAS_GENERICAS:
+                familias.add(familia)
+    return familias
+
+
+def recortar_fuentes(html: str):
+    """
+    Deja en el <link> de Google Fonts sólo las familias usadas; si no se usa ninguna, quita el <link>.
+    Devuelve (html, familias pedidas, familias quitadas).
+    """
+    usadas = familias_usadas(html)
+    pedidas, quitadas = [], []
+
+    def recortar(m):
+        url = m.group(1)
+        base, _, consulta = url.partition("?")
+        parametros = consulta.replace("&amp;", "&").split("&")
+        conservados = []
+        for parametro in parametros:
+            if not parametro.startswith("family="):
+                conservados.append(parametro)
+                continue
+            # "family=Playfair+Display:wght@400;700" -> "playfair display"
+            nombre = parametro[len("family="):].split(":")[0].replace("+", " ")
+            if nombre.lower() in usadas:
+                conservados.append(parametro)
+                pedidas.append(nombre)
+            else:
+                quitadas.append(nombre)
+        if not any(p.startswith("family=") for p in conservados):
+            return ""
+        return m.group(0).replace(url, f"{base}?{'&'.join(conservados)}")
+
+    return _RE_LINK_FUENTES.sub(recortar, html), pedidas, quitadas
+
+# ----------------------------------------------------
+# C. MINIFICACIÓN
+# ----------------------------------------------------
+
+_RE_CSS_TOKENS = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)|([^\"'/\s]+|/)", re.S)
+_CSS_PEGADOS = set("{};,>")
+
+
+def minificar_css(css: str) -> str:
+    """Sin comentarios ni espacios de más. No toca strings ni los espacios de calc() (+, -)."""
+    partes = []
+    for cadena, _comentario, espacio, resto in _RE_CSS_TOKENS.findall(css):
+        if cadena:
+            partes.append(cadena)
+        elif espacio:
+            partes.append(" ")
+        elif resto:
+            partes.append(resto)
+    salida = []
+    for i, parte in enumerate(partes):
+        if parte == " ":
+            anterior = salida[-1][-1:] if salida else ""
+            siguiente = partes[i + 1][:1] if i + 1 < len(partes) else ""
+            # ":" sólo se pega hacia adelante: "a :hover" no es lo mismo que "a:hover"
+            if not anterior or not siguiente or anterior in _CSS_PEGADOS or anterior == ":" \
+                    or siguiente in _CSS_PEGADOS:
+                continue
+        salida.append(parte)
+    return "".join(salida).replace(";}", "}").strip()
+
+
+_PALABRA = re.compile(r"[A-Za-z0-9_$\x80-\uffff]")
+# Después de estos caracteres o palabras, "/" abre un regex y no es una división
+_ANTES_DE_REGEX = set("(,=:[!&|?{};+-*%<>~^")
+_PALABRAS_ANTES_DE_REGEX = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete",
+                            "void", "throw", "instanceof", "yield", "await"}
+
+
+class _EstadoJS:
+    """Contexto léxico del JS al final de cada línea: código, string, template o comentario."""
+
+    def __init__(self):
+        self.pila = [0]         # profundidad de llaves de cada nivel de código; "`" = dentro de un template
+        self.comentario = False  # dentro de /* ... */
+        self.cadena = None       # comilla de un string continuado con "\" al final de la línea
+        self.previo = ""         # último carácter significativo del código (para distinguir regex)
+        self.palabra = ""        # última palabra del código
+
+    @property
+    def en_codigo(self) -> bool:
+        return not self.comentario and self.cadena is None and self.pila[-1] != "`"
+
+    @property
+    def limpio(self) -> bool:
+        return self.pila == [0] and self.en_codigo
+
+    def _abre_regex(self) -> bool:
+        if not self.previo or self.previo in _ANTES_DE_REGEX:
+            return True
+        return _PALABRA.match(self.previo) is not None and self.palabra in _PALABRAS_ANTES_DE_REGEX
+
+    def _fin_cadena(self, linea: str, i: int, comilla: str) -> int:
+        while i < len(linea):
+            if linea[i] == "\\":
+                i += 2
+                continue
+            if linea[i] == comilla:
+                self.cadena = None
+                return i + 1
+            i += 1
+        # Sin cierre: sólo sigue en la próxima línea si termina en "\"
+        self.cadena = comilla if linea.endswith("\\") else None
+        return len(linea)
+
+    def avanzar(self, linea: str):
+        i, n = 0, len(linea)
+        while i < n:
+            if self.comentario:
+                fin = linea.find("*/", i)
+                if fin < 0:
+                    return
+                self.comentario, i = False, fin + 2
+                continue
+            if self.cadena is not None:
+                i = self._fin_cadena(linea, i, self.cadena)
+                self.previo = '"'
+                continue
+            c = linea[i]
+            if self.pila[-1] == "`":
+                if c == "\\":
+                    i += 2
+                elif c == "`":
+                    self.pila.pop()
+                    self.previo, i = "`", i + 1
+                elif linea.startswith("${", i):
+                    self.pila.append(0)
+                    self.previo, i = "{", i + 2
+                else:
+                    i += 1
+                continue
+            if c in "'\"":
+                i = self._fin_cadena(linea, i + 1, c)
+                self.previo = '"'
+            elif c == "`":
+                self.pila.append("`")
+                i += 1
+            elif linea.startswith("//", i):
+                return
+            elif linea.startswith("/*", i):
+                self.comentario, i = True, i + 2
+            elif c == "/" and self._abre_regex() and _fin_regex(linea, i) is not None:
+                i = _fin_regex(linea, i)
+                self.previo = "a"
+                self.palabra = ""
+            elif c.isspace():
+                i += 1
+            else:
+                if c == "{":
+                    self.pila[-1] += 1
+                elif c == "}":
+                    if self.pila[-1] == 0 and len(self.pila) > 1:
+                        self.pila.pop()  # cierra un ${ ... } y vuelve al template
+                    else:
+                        self.pila[-1] -= 1
+                if _PALABRA.match(c):
+                    self.palabra = self.palabra + c if _PALABRA.match(self.previo or " ") else c
+                self.previo, i = c, i + 1
+
+
+def _fin_regex(linea: str, i: int):
+    """Índice siguiente al regex que abre linea[i], o None si en la línea no cierra (era una división)."""
+    j, en_clase = i + 1, False
+    while j < len(linea):
+        c = linea[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "[":
+            en_clase = True
+        elif c == "]":
+            en_clase = False
+        elif c == "/" and not en_clase:
+            j += 1
+            while j < len(linea) and _PALABRA.match(linea[j]):  # flags
+                j += 1
+            return j
+        j += 1
+    return None
+
+
+def compactar_js(js: str) -> str:
+    """
+    Quita las líneas en blanco, las que son sólo un comentario // y los espacios al principio
+    y al final de cada línea, siempre que la línea empiece y termine en código (nunca dentro
+    de un string, template literal o /* */). Si el recorrido no termina limpio, devuelve `js`.
+    """
+    estado, salida = _EstadoJS(), []
+    for linea in js.split("\n"):
+        empieza_en_codigo = estado.en_codigo
+        estado.avanzar(linea)
+        if not empieza_en_codigo:
+            salida.append(linea)
+            continue
+        limpia = linea.lstrip()
+        if not limpia or limpia.startswith("//"):
+            continue
+        salida.append(limpia.rstrip() if estado.en_codigo else limpia)
+    if not estado.limpio:
+        return js
+    return "\n".join(salida)
+
+
+def minificar_html(html: str) -> str:
+    """Sin comentarios ni espacios repetidos. El CSS de <style> y el JS de <script> se compactan aparte."""
+    partes, ultimo = [], 0
+    for m in _RE_BLOQUE_CRUDO.finditer(html):
+        partes.append(_minificar_texto_html(html[ultimo:m.start()]))
+        apertura, etiqueta, contenido, cierre = m.group(1), m.group(2).lower(), m.group(3), m.group(4)
+        if etiqueta == "style":
+            contenido = minificar_css(contenido)
+        elif etiqueta == "script" and _es_js(apertura):
+            contenido = compactar_js(contenido)
+        partes.append(f"{apertura}{contenido}{cierre}")
+        ultimo = m.end()
+    partes.append(_minificar_texto_html(html[ultimo:]))
+    return "".join(partes).strip()
+
+
+def _minificar_texto_html(texto: str) -> str:
+    partes = []
+    for etiqueta, contenido in _RE_ETIQUETA.findall(_RE_COMENTARIO_HTML.sub("", texto)):
+        if etiqueta:
+            # Dentro de una etiqueta, los valores entre comillas (onclick, value...) no se tocan
+            if "\n" in etiqueta or "  " in etiqueta or "\t" in etiqueta:
+                etiqueta = _RE_ESPACIOS_ETIQUETA.sub(lambda m: m.group(1) or " ", etiqueta)
+            partes.append(etiqueta)
+        else:
+            # Un solo espacio conserva la separación entre elementos en línea (<strong>a</strong> <b>)
+            partes.append(_RE_ESPACIOS.sub(" ", contenido))
+    return "".join(partes)
+
+
+def _es_js(apertura: str) -> bool:
+    tipo = re.search(r"\btype\s*=\s*[\"']?([^\"'\s>]+)", apertura, re.I)
+    return tipo is None or tipo.group(1).lower() in ("module", "text/javascript", "application/javascript")
+
+# ----------------------------------------------------
+# D. BUILD COMPLETO
+# ----------------------------------------------------
+
+def comprimir(datos: bytes) -> dict:
+    """{"gz": bytes, "br": bytes} (sin "br" si brotli no está instalado)."""
+    copias = {"gz": gzip.compress(datos, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copias["br"] = brotli.compress(datos, mode=brotli.MODE_TEXT, quality=11)
+    return copias
+
+
+def rutas_index() -> list:
+    """Rutas remotas que genera construir_index (para el dry-run)."""
+    return ["index.html", "index.html.gz"] + (["index.html.br"] if brotli is not None else [])
+
+
+def construir_index(html: str) -> dict:
+    """
+    Build del index.html a publicar. Devuelve {"archivos": {ruta_remota: bytes}, "reporte": {...}}
+    con index.html, sus copias precomprimidas y los tamaños antes/después de cada paso.
+    """
+    original = html.encode("utf-8")
+    html, bloques_admin = quitar_admin(html)
+    html, fuentes, fuentes_quitadas = recortar_fuentes(html)
+    minificado = minificar_html(html).encode("utf-8")
+    copias = comprimir(minificado)
+
+    archivos = {"index.html": minificado}
+    archivos.update({f"index.html.{ext}": datos for ext, datos in copias.items()})
+    reporte = {
+        "bytes_original": len(original),
+        "bytes_minificado": len(minificado),
+        "bytes_gzip": len(copias["gz"]),
+        "bytes_brotli": len(copias["br"]) if "br" in copias else None,
+        "reduccion_pct": round(100 * (1 - len(minificado) / len(original)), 1) if original else 0.0,
+        "bloques_admin": bloques_admin,
+        "fuentes": fuentes,
+        "fuentes_quitadas": len(fuentes_quitadas),
+    }
+    return {"archivos": archivos, "reporte": reporte}
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+
+from services.datos_locales import ruta_datos
+
+# ----------------------------------------------------
+# ÍNDICE LOCAL DE LO ÚLTIMO PUBLICADO EN GITHUB
+# ----------------------------------------------------
+# (repo_name, path) -> sha del blob git que se subió por última vez.
+# Es un sqlite local (compartido por los workers de gunicorn vía WAL); si se
+# borra, lo único que se pierde es la deduplicación: todo se vuelve a subir.
+
+PUBLICACIONES_DB = os.getenv("PUBLICACIONES_DB") or ruta_datos("publicaciones.sqlite3")
+
+
+def sha_blob(contenido: bytes) -> str:
+    """SHA-1 que GitHub asigna al blob git con este contenido."""
+    h = hashlib.sha1(b"blob %d\0" % len(contenido))
+    h.update(contenido)
+    return h.hexdigest()
+
+
+class IndicePublicacion:
+    """Mapa persistente (repo_name, path) -> sha del último blob publicado."""
+
+    def __init__(self, ruta: str = PUBLICACIONES_DB):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._inicializado = False
+
+    def _conexion(self) -> sqlite3.Connection:
+        # Una conexión por hilo (y por proceso: las conexiones no sobreviven al fork)
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        if not self._inicializado:
+            with self._init_lock:
+                con.execute(
+                    "CREATE TABLE IF NOT EXISTS publicados ("
+                    " repo_name TEXT NOT NULL, path TEXT NOT NULL, sha TEXT NOT NULL,"
+                    " tamano INTEGER NOT NULL, actualizado REAL NOT NULL,"
+                    " PRIMARY KEY (repo_name, path))"
+                )
+                con.commit()
+                self._inicializado = True
+        return con
+
+    def obtener(self, repo_name: str, path: str):
+        """Sha publicado para (repo, path) o None."""
+        fila = self._conexion().execute(
+            "SELECT sha FROM publicados WHERE repo_name = ? AND path = ?", (repo_name, path)
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def obtener_varios(self, repo_name: str) -> dict:
+        """{path: sha} de todo lo publicado en el repo."""
+        filas = self._conexion().execute(
+            "SELECT path, sha FROM publicados WHERE repo_name = ?", (repo_name,)
+        ).fetchall()
+        return dict(filas)
+
+    def registrar(self, repo_name: str, items: list):
+        """Registra [(path, sha, tamano), ...] como publicados."""
+        if not items:
+            return
+        ahora = time.time()
+        con = self._conexion()
+        with con:
+            con.executemany(
+                "INSERT OR REPLACE INTO publicados (repo_name, path, sha, tamano, actualizado)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(repo_name, path, sha, tamano, ahora) for path, sha, tamano in items],
+            )
+
+    def olvidar(self, repo_name: str, path: str = None):
+        """Borra el registro de un archivo (o de todo el repo) para forzar su re-subida."""
+        con = self._conexion()
+        with con:
+            if path is None:
+                con.execute("DELETE FROM publicados WHERE repo_name = ?", (repo_name,))
+            else:
+                con.execute("DELETE FROM publicados WHERE repo_name = ? AND path = ?", (repo_name, path))
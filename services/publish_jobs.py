@@ -0,0 +1,194 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from services.datos_locales import ruta_datos
+
+# ----------------------------------------------------
+# COLA DURABLE DE TRABAJOS DE PUBLICACIÓN
+# ----------------------------------------------------
+# Los trabajos se guardan en sqlite (sobreviven a reinicios y se comparten entre
+# workers de gunicorn). Cada proceso corre un número acotado de hilos que toman
+# trabajos pendientes y ejecutan las etapas (Firestore, render, GitHub)
+# registrando el progreso y la duración de cada una.
+
+PUBLICACION_JOBS_DB = os.getenv("PUBLICACION_JOBS_DB") or ruta_datos("publicacion_jobs.sqlite3")
+PUBLICACION_WORKERS = int(os.getenv("PUBLICACION_WORKERS", "2"))
+# Un trabajo "en_curso" sin latido durante este tiempo se considera huérfano (worker caído)
+PUBLICACION_TIMEOUT_HUERFANO = float(os.getenv("PUBLICACION_TIMEOUT_HUERFANO", "600"))
+
+PENDIENTE, EN_CURSO, OK, ERROR = "pendiente", "en_curso", "ok", "error"
+
+
+class ColaPublicacion:
+    """Cola sqlite + pool de hilos acotado. `ejecutor(trabajo, etapa)` corre un trabajo."""
+
+    def __init__(self, ejecutor, ruta: str = PUBLICACION_JOBS_DB, workers: int = PUBLICACION_WORKERS):
+        self.ejecutor = ejecutor
+        self.ruta = ruta
+        self.workers = workers
+        self._local = threading.local()
+        self._pid = None
+        self._lock = threading.Lock()
+        self._hay_trabajo = threading.Event()
+
+    # --- Persistencia ---
+
+    def _conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=10, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS trabajos ("
+                " id TEXT PRIMARY KEY, email TEXT NOT NULL, repo_name TEXT,"
+                " payload TEXT NOT NULL, estado TEXT NOT NULL, etapas TEXT NOT NULL,"
+                " error TEXT, intentos INTEGER NOT NULL DEFAULT 0,"
+                " creado REAL NOT NULL, actualizado REAL NOT NULL)"
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado, creado)")
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def encolar(self, email: str, repo_name: str, payload: dict) -> str:
+        """Guarda el trabajo como pendiente y devuelve su id (no espera la ejecución)."""
+        job_id = uuid.uuid4().hex
+        ahora = time.time()
+        self._conexion().execute(
+            "INSERT INTO trabajos (id, email, repo_name, payload, estado, etapas, creado, actualizado)"
+            " VALUES (?, ?, ?, ?, ?, '[]', ?, ?)",
+            (job_id, email, repo_name, json.dumps(payload), PENDIENTE, ahora, ahora),
+        )
+        self._hay_trabajo.set()
+        return job_id
+
+    def estado(self, job_id: str):
+        """Estado del trabajo con sus etapas, o None si no existe."""
+        fila = self._conexion().execute(
+            "SELECT id, email, repo_name, estado, etapas, error, intentos, creado, actualizado"
+            " FROM trabajos WHERE id = ?", (job_id,)
+        ).fetchone()
+        if fila is None:
+            return None
+        claves = ("id", "email", "repo_name", "estado", "etapas", "error", "intentos", "creado", "actualizado")
+        trabajo = dict(zip(claves, fila))
+        trabajo["etapas"] = json.loads(trabajo["etapas"])
+        fin = trabajo["actualizado"] if trabajo["estado"] in (OK, ERROR) else time.time()
+        trabajo["duracion_ms"] = round((fin - trabajo["creado"]) * 1000, 1)
+        return trabajo
+
+    def _tomar_siguiente(self):
+        """
+        Marca atómicamente como en_curso el pendiente más viejo (seguro entre procesos).
+        Se salta los repos que ya tienen un trabajo en curso: dos publicaciones del mismo
+        repo nunca corren a la vez (cada una pisaría el ref de la otra); quedan en orden.
+        """
+        con = self._conexion()
+        ahora = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            # Recuperar huérfanos de workers caídos
+            con.execute(
+                "UPDATE trabajos SET estado = ? WHERE estado = ? AND actualizado < ?",
+                (PENDIENTE, EN_CURSO, ahora - PUBLICACION_TIMEOUT_HUERFANO),
+            )
+            fila = con.execute(
+                "SELECT id, email, repo_name, payload FROM trabajos AS p WHERE estado = ?"
+                " AND NOT EXISTS (SELECT 1 FROM trabajos AS c"
+                "                 WHERE c.estado = ? AND c.repo_name IS p.repo_name)"
+                " ORDER BY creado LIMIT 1", (PENDIENTE, EN_CURSO)
+            ).fetchone()
+            if fila is None:
+                con.execute("COMMIT")
+                return None
+            con.execute(
+                "UPDATE trabajos SET estado = ?, etapas = '[]', intentos = intentos + 1, actualizado = ?"
+                " WHERE id = ?", (EN_CURSO, ahora, fila[0]),
+            )
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return {"id": fila[0], "email": fila[1], "repo_name": fila[2], "payload": json.loads(fila[3])}
+
+    def _guardar(self, job_id: str, etapas: list, estado: str = None, error: str = None):
+        campos, valores = ["etapas = ?", "actualizado = ?"], [json.dumps(etapas), time.time()]
+        if estado is not None:
+            campos.append("estado = ?")
+            valores.append(estado)
+        if error is not None:
+            campos.append("error = ?")
+            valores.append(error)
+        self._conexion().execute(f"UPDATE trabajos SET {', '.join(campos)} WHERE id = ?", (*valores, job_id))
+
+    # --- Ejecución ---
+
+    def asegurar_workers(self, app=None):
+        """Arranca los hilos de este proceso una sola vez (tras un fork se arrancan de nuevo)."""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._hay_trabajo = threading.Event()
+            for i in range(self.workers):
+                threading.Thread(target=self._bucle, args=(app,), name=f"publicacion-{i}", daemon=True).start()
+        self._hay_trabajo.set()  # puede haber pendientes de antes del reinicio
+
+    def _bucle(self, app):
+        while True:
+            try:
+                trabajo = self._tomar_siguiente()
+            except sqlite3.Error as e:
+                print(f"❌ Error leyendo la cola de publicación: {e}")
+                trabajo = None
+            if trabajo is None:
+                # Sondeo lento para trabajos encolados por otros procesos
+                self._hay_trabajo.wait(timeout=2.0)
+                self._hay_trabajo.clear()
+                continue
+            self._ejecutar(trabajo, app)
+
+    def _ejecutar(self, trabajo: dict, app):
+        etapas = []
+
+        @contextmanager
+        def etapa(nombre: str):
+            registro = {"nombre": nombre, "estado": EN_CURSO, "inicio": time.time(), "fin": None,
+                        "duracion_ms": None, "detalle": {}}
+            etapas.append(registro)
+            self._guardar(trabajo["id"], etapas)  # también sirve de latido
+            try:
+                yield registro["detalle"]
+                registro["estado"] = OK
+            except Exception:
+                registro["estado"] = ERROR
+                raise
+            finally:
+                registro["fin"] = time.time()
+                registro["duracion_ms"] = round((registro["fin"] - registro["inicio"]) * 1000, 1)
+                self._guardar(trabajo["id"], etapas)
+
+        try:
+            if app is not None:
+                with app.app_context():
+                    self.ejecutor(trabajo, etapa)
+            else:
+                self.ejecutor(trabajo, etapa)
+            self._guardar(trabajo["id"], etapas, estado=OK)
+            print(f"✅ Publicación {trabajo['id']} terminada para {trabajo['email']}")
+        except Exception as e:
+            print(f"❌ Publicación {trabajo['id']} falló para {trabajo['email']}: {e}")
+            self._guardar(trabajo["id"], etapas, estado=ERROR, error=str(e))
+        finally:
+            # Libera el repo: otro hilo puede tener esperando un trabajo del mismo repo
+            self._hay_trabajo.set()
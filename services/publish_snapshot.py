@@ -0,0 +1,175 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+
+from services.publish_index import PUBLICACIONES_DB, sha_blob
+from services import firebase_service as fbs
+
+# ----------------------------------------------------
+# SNAPSHOT DE LA ÚLTIMA PUBLICACIÓN (POR REPO)
+# ----------------------------------------------------
+# Guarda, por repo_name, qué productos se publicaron (hash + doc de Firestore),
+# la clave del último render y el sha de cada archivo subido. Con eso una nueva
+# publicación sólo escribe los documentos, el render y los archivos que cambiaron.
+
+# id_base no es contenido: si el formulario no lo trae se genera uno nuevo en cada envío
+_CAMPOS_NO_CONTENIDO = ("id_base",)
+
+
+def clave_producto(producto: dict) -> str:
+    """Identidad estable del producto entre publicaciones: id_base o grupo/subgrupo/nombre."""
+    if producto.get("id_base"):
+        return f"id:{producto['id_base']}"
+    return "n:{}/{}/{}".format(
+        (producto.get("grupo") or "").strip().lower(),
+        (producto.get("subgrupo") or "").strip().lower(),
+        (producto.get("nombre") or "").strip().lower(),
+    )
+
+
+def hash_contenido(datos) -> str:
+    crudo = json.dumps(datos, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return hashlib.sha256(crudo).hexdigest()[:24]
+
+
+def hash_producto(doc: dict) -> str:
+    return hash_contenido({k: v for k, v in doc.items() if k not in _CAMPOS_NO_CONTENIDO})
+
+
+class SnapshotsPublicacion:
+    """Snapshots en el mismo sqlite que el índice de publicación."""
+
+    def __init__(self, ruta: str = PUBLICACIONES_DB):
+        self.ruta = ruta
+        self._local = threading.local()
+
+    def _conexion(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "pid", None) != os.getpid():
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            con = sqlite3.connect(self.ruta, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " repo_name TEXT PRIMARY KEY, datos TEXT NOT NULL, actualizado REAL NOT NULL)"
+            )
+            con.commit()
+            self._local.con = con
+            self._local.pid = os.getpid()
+        return con
+
+    def obtener(self, repo_name: str) -> dict:
+        fila = self._conexion().execute(
+            "SELECT datos FROM snapshots WHERE repo_name = ?", (repo_name,)
+        ).fetchone()
+        vacio = {"base_time": None, "productos": {}, "render": None, "artefactos": {}}
+        return {**vacio, **json.loads(fila[0])} if fila else vacio
+
+    def guardar(self, repo_name: str, snapshot: dict):
+        con = self._conexion()
+        with con:
+            con.execute(
+                "INSERT OR REPLACE INTO snapshots (repo_name, datos, actualizado) VALUES (?, ?, ?)",
+                (repo_name, json.dumps(snapshot), time.time()),
+            )
+
+# ----------------------------------------------------
+# PLANIFICACIÓN (DIFF CONTRA EL SNAPSHOT)
+# ----------------------------------------------------
+
+def planificar_productos(snapshot: dict, productos: list, repo_name: str, borrar_faltantes: bool = False) -> dict:
+    """
+    Arma los documentos a publicar y los compara con el snapshot:
+    crear / actualizar (mismo doc_id e id_base que la vez anterior) / borrar / sin cambios.
+    orden_time sale de un base_time fijo por repo + posición, así un producto que no
+    cambió ni de lugar produce exactamente el mismo documento.
+
+    Publicar agrega y actualiza, como siempre: un producto que ya no viene en el envío
+    se conserva. Sólo con `borrar_faltantes` (el usuario pidió reemplazar el catálogo)
+    se borra, y aun así únicamente lo que creó una publicación anterior de este repo
+    (lo que está en el snapshot): lo importado o cargado desde el admin nunca se toca.
+    """
+    base_time = snapshot.get("base_time") or time.time()
+    preparados, invalidos = fbs.preparar_documentos(productos, repo_name, base_time)
+    anteriores = snapshot.get("productos", {})
+
+    plan = {"base_time": base_time, "crear": [], "actualizar": [], "borrar": [], "sin_cambios": [],
+            "conservados": [], "invalidos": invalidos, "anteriores": anteriores}
+    ocurrencias = {}
+    for indice, doc_id, doc in preparados:
+        clave = clave_producto(productos[indice])
+        # Productos repetidos en el mismo envío se distinguen por ocurrencia
+        n = ocurrencias.get(clave, 0)
+        ocurrencias[clave] = n + 1
+        if n:
+            clave = f"{clave}#{n}"
+
+        previo = anteriores.get(clave)
+        if previo is None:
+            plan["crear"].append((indice, doc_id, doc, clave))
+            continue
+        doc["id_base"] = previo["id_base"]
+        if previo["hash"] == hash_producto(doc):
+            plan["sin_cambios"].append(clave)
+        else:
+            plan["actualizar"].append((indice, previo["doc_id"], doc, clave))
+
+    vistas = {op[3] for op in plan["crear"] + plan["actualizar"]} | set(plan["sin_cambios"])
+    faltantes = [(clave, datos) for clave, datos in anteriores.items() if clave not in vistas]
+    if borrar_faltantes:
+        plan["borrar"] = faltantes
+    else:
+        plan["conservados"] = [clave for clave, _datos in faltantes]
+    return plan
+
+
+def hay_cambios_productos(plan: dict) -> bool:
+    return bool(plan["crear"] or plan["actualizar"] or plan["borrar"])
+
+
+def productos_publicados(plan: dict, fallidos: set) -> dict:
+    """
+    Parte de productos del nuevo snapshot según lo que efectivamente se escribió.
+    Lo que falló queda como estaba (se reintenta en la próxima publicación).
+    """
+    anteriores = plan["anteriores"]
+    nuevos = {clave: anteriores[clave] for clave in plan["sin_cambios"] + plan["conservados"]}
+    for _indice, doc_id, doc, clave in plan["crear"] + plan["actualizar"]:
+        if doc_id in fallidos:
+            if clave in anteriores:
+                nuevos[clave] = anteriores[clave]
+            continue
+        nuevos[clave] = {"hash": hash_producto(doc), "doc_id": doc_id, "id_base": doc["id_base"]}
+    for clave, datos in plan["borrar"]:
+        if datos["doc_id"] in fallidos:
+            nuevos[clave] = datos
+    return nuevos
+
+
+def planificar_archivos(snapshot: dict, archivos: dict) -> dict:
+    """Separa {ruta: bytes} en cambiados / sin cambios respecto de lo último publicado."""
+    anteriores = snapshot.get("artefactos", {})
+    shas = {ruta: sha_blob(contenido) for ruta, contenido in archivos.items()}
+    cambiados = [ruta for ruta in archivos if anteriores.get(ruta) != shas[ruta]]
+    return {"cambiados": cambiados, "sin_cambios": [r for r in archivos if r not in cambiados], "shas": shas}
+
+
+def resumen_plan(plan: dict) -> dict:
+    """Versión serializable del plan (para el dry-run y el detalle de la etapa)."""
+    return {
+        "crear": [{"indice": i, "nombre": doc.get("nombre")} for i, _id, doc, _c in plan["crear"]],
+        "actualizar": [{"indice": i, "nombre": doc.get("nombre"), "id_base": doc.get("id_base")}
+                       for i, _id, doc, _c in plan["actualizar"]],
+        "borrar": [{"clave": clave, "id_base": datos.get("id_base")} for clave, datos in plan["borrar"]],
+        "sin_cambios": len(plan["sin_cambios"]),
+        "conservados": len(plan["conservados"]),
+        "invalidos": [{"indice": i, "error": e} for i, e in sorted(plan["invalidos"].items())],
+    }
+
+
+snapshots = SnapshotsPublicacion()
@@ -0,0 +1,82 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+from services import firebase_service as fbs
+
+# ----------------------------------------------------
+# CACHE DE HTML RENDERIZADO DE LA TIENDA
+# ----------------------------------------------------
+# Una entrada por tienda: (versión del catálogo, html, etag). Si la versión del
+# catálogo cambió, la entrada ya no sirve; además las escrituras la descartan
+# explícitamente vía la suscripción al cache de catálogo.
+
+
+def calcular_etag(contenido: bytes) -> str:
+    """ETag fuerte (sin comillas; werkzeug las agrega) a partir del contenido."""
+    return hashlib.sha256(contenido).hexdigest()[:32]
+
+
+class RenderCache:
+    """LRU acotado por cantidad de tiendas y por bytes totales."""
+
+    def __init__(self, max_tiendas: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.max_tiendas = max_tiendas
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()  # email -> (version, html_bytes, etag)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def obtener(self, email: str, version):
+        """Devuelve (html_bytes, etag) si hay un render para esa versión del catálogo."""
+        with self._lock:
+            entrada = self._entradas.get(email)
+            if entrada is None or entrada[0] != version:
+                self._misses += 1
+                return None
+            self._entradas.move_to_end(email)
+            self._hits += 1
+            return entrada[1], entrada[2]
+
+    def guardar(self, email: str, version, html_bytes: bytes) -> str:
+        """Guarda el render y devuelve su ETag."""
+        etag = calcular_etag(html_bytes)
+        if len(html_bytes) > self.max_bytes:
+            return etag
+        with self._lock:
+            anterior = self._entradas.pop(email, None)
+            if anterior is not None:
+                self._bytes -= len(anterior[1])
+            self._entradas[email] = (version, html_bytes, etag)
+            self._bytes += len(html_bytes)
+            while len(self._entradas) > self.max_tiendas or self._bytes > self.max_bytes:
+                _email, (_v, html_viejo, _e) = self._entradas.popitem(last=False)
+                self._bytes -= len(html_viejo)
+        return etag
+
+    def invalidar(self, email: str):
+        with self._lock:
+            anterior = self._entradas.pop(email, None)
+            if anterior is not None:
+                self._bytes -= len(anterior[1])
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "tiendas": len(self._entradas),
+                "bytes": self._bytes,
+            }
+
+
+render_cache = RenderCache(
+    max_tiendas=int(os.getenv("RENDER_CACHE_MAX_TIENDAS", "256")),
+    max_bytes=int(os.getenv("RENDER_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+
+# Cualquier escritura de productos/config descarta el render de esa tienda
+fbs.catalogo_cache.suscribir(render_cache.invalidar)
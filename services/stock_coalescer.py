@@ -0,0 +1,114 @@
+import os
+import threading
+
+from services import firebase_service as fbs
+
+# ----------------------------------------------------
+# AGRUPADO DE EDICIONES DE STOCK DEL MODO ADMIN
+# ----------------------------------------------------
+# Las ediciones rápidas de un mismo producto (clicks de +1/-1 en el preview)
+# se juntan mientras hay una escritura en vuelo: la primera edición se escribe
+# en el acto (sin esperar ninguna ventana) y las que llegan durante esa escritura
+# suman sus deltas por talle (el último precio gana) en una ráfaga que sale como
+# una sola escritura con Increment apenas termina la anterior. Todas las requests
+# de una ráfaga reciben el mismo resultado. Si una request se cansa de esperar,
+# su edición sale de la ráfaga antes de responder: un error nunca se aplica
+# después (y un reintento del cliente no la duplica).
+
+STOCK_TIMEOUT_SEGUNDOS = float(os.getenv("STOCK_TIMEOUT_SEGUNDOS", "10"))
+
+
+class _Rafaga:
+    def __init__(self, db_client):
+        self.db_client = db_client
+        self.ediciones = []  # [(deltas, campos)] en orden de llegada; se suman al escribir
+        self.resultado = None
+        self.listo = threading.Event()
+
+    def sumar(self):
+        """(deltas por talle sumados y sin ceros, campos con el último valor de cada uno)."""
+        deltas, campos = {}, {}
+        for deltas_edicion, campos_edicion in self.ediciones:
+            for talle, delta in deltas_edicion.items():
+                deltas[talle] = deltas.get(talle, 0) + delta
+            campos.update(campos_edicion)
+        return {talle: delta for talle, delta in deltas.items() if delta}, campos
+
+
+class CoalescedorStock:
+    """A lo sumo una escritura en vuelo y una ráfaga esperando por (tienda, producto)."""
+
+    def __init__(self, escribir=fbs.aplicar_deltas_stock):
+        self.escribir = escribir
+        self._rafagas = {}
+        self._en_vuelo = set()
+        self._lock = threading.Lock()
+        self._escrituras = 0
+        self._ediciones = 0
+
+    def aplicar(self, db_client, email: str, id_base: str, deltas: dict, campos: dict = None,
+                timeout: float = STOCK_TIMEOUT_SEGUNDOS) -> dict:
+        """
+        Suma la edición a la ráfaga del producto y espera su escritura.
+        Devuelve {"ok", "talles_stock", "error", "deltas", "ediciones"} de la ráfaga completa.
+        """
+        clave = (email, id_base)
+        with self._lock:
+            rafaga = self._rafagas.get(clave)
+            if rafaga is None:
+                rafaga = self._rafagas[clave] = _Rafaga(db_client)
+            edicion = (dict(deltas), dict(campos or {}))
+            rafaga.ediciones.append(edicion)
+            self._ediciones += 1
+            # Nada pendiente para el producto: se escribe ya, en este mismo hilo
+            escribir_ya = clave not in self._en_vuelo
+            if escribir_ya:
+                self._en_vuelo.add(clave)
+                del self._rafagas[clave]
+
+        if escribir_ya:
+            self._escribir(clave, rafaga)
+        elif not rafaga.listo.wait(timeout):
+            with self._lock:
+                # Todavía en cola: se retira la edición y el error es definitivo
+                retirada = self._rafagas.get(clave) is rafaga
+                if retirada:
+                    rafaga.ediciones.remove(edicion)
+                    self._ediciones -= 1
+                    if not rafaga.ediciones:
+                        del self._rafagas[clave]
+            if retirada:
+                return {"ok": False, "talles_stock": None, "error": "Tiempo de espera agotado",
+                        "deltas": {}, "ediciones": 0}
+            # Ya se está escribiendo: no se puede retirar, se informa como pendiente
+            return {"ok": False, "pendiente": True, "talles_stock": None,
+                    "error": "La edición se está aplicando", "deltas": {}, "ediciones": 0}
+        return rafaga.resultado
+
+    def _escribir(self, clave, rafaga: _Rafaga):
+        with self._lock:
+            self._escrituras += 1
+        email, id_base = clave
+        deltas, campos = rafaga.sumar()
+        try:
+            resultado = self.escribir(rafaga.db_client, email, id_base, deltas, campos)
+        except Exception as e:
+            resultado = {"ok": False, "talles_stock": None, "error": str(e)}
+        rafaga.resultado = {**resultado, "deltas": deltas, "ediciones": len(rafaga.ediciones)}
+
+        with self._lock:
+            # Lo que se juntó durante esta escritura sale a continuación, en otro hilo
+            siguiente = self._rafagas.pop(clave, None)
+            if siguiente is None:
+                self._en_vuelo.discard(clave)
+        if siguiente is not None:
+            threading.Thread(target=self._escribir, args=(clave, siguiente), daemon=True).start()
+        rafaga.listo.set()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {"ediciones": self._ediciones, "escrituras": self._escrituras,
+                    "en_vuelo": len(self._en_vuelo), "rafagas_abiertas": len(self._rafagas)}
+
+
+coalescedor_stock = CoalescedorStock()
@@ -0,0 +1,139 @@
+import os
+import uuid
+import hashlib
+
+from werkzeug.formparser import FormDataParser
+
+# ----------------------------------------------------
+# SUBIDA DE IMÁGENES EN LOTE (/upload-images)
+# ----------------------------------------------------
+# Un único multipart con muchas imágenes. Cada parte se escribe una sola vez a
+# un temporal en la carpeta del usuario mientras se calcula su hash (sha256, el
+# mismo que usa imagen_service para nombrar y deduplicar variantes): ni el
+# archivo completo pasa por memoria ni hace falta releerlo para hashearlo.
+# Los límites son por lote y por archivo, no el MAX_CONTENT_LENGTH global de la
+# app (pensado para los formularios comunes). Un archivo que supera su límite
+# (o que sobra del lote) no corta la subida: se descarta y se informa en su
+# resultado.
+
+LOTE_MAX_ARCHIVOS = int(os.getenv("LOTE_MAX_ARCHIVOS", "50"))
+LOTE_MAX_MB = float(os.getenv("LOTE_MAX_MB", "100"))
+LOTE_MAX_MB_ARCHIVO = float(os.getenv("LOTE_MAX_MB_ARCHIVO", "10"))
+# Tope del buffer del parser (campos de texto y lo que todavía no se volcó a disco)
+LOTE_MAX_MEMORIA_FORM = 1024 * 1024
+
+
+class ParteEnDisco:
+    """Destino de una parte del multipart: escribe al temporal y hashea en la misma pasada."""
+
+    def __init__(self, carpeta: str, nombre_original: str, max_bytes: int, descartar: str = None):
+        self.nombre_original = nombre_original or ""
+        self.max_bytes = max_bytes
+        self.tamano = 0
+        # Motivo por el que la parte no se guarda ("excedido", "sobrante"); None si se guarda
+        self.descartada = descartar
+        self._hash = hashlib.sha256()
+        self.ruta = None
+        self._archivo = None
+        if descartar is None:
+            self.ruta = os.path.join(carpeta, f".lote-{os.getpid()}-{uuid.uuid4().hex}.tmp")
+            self._archivo = open(self.ruta, "w+b")
+
+    # --- Interfaz de archivo que usa el parser de werkzeug ---
+
+    def write(self, datos) -> int:
+        self.tamano += len(datos)
+        if self.descartada is None and self.tamano > self.max_bytes:
+            # Lo que ya se escribió no sirve: se libera el disco y el resto se ignora
+            self.descartada = "excedido"
+            self._liberar()
+        if self.descartada is None:
+            self._hash.update(datos)
+            self._archivo.write(datos)
+        return len(datos)
+
+    def seek(self, *args):
+        return self._archivo.seek(*args) if self._archivo else 0
+
+    def read(self, *args) -> bytes:
+        return self._archivo.read(*args) if self._archivo else b""
+
+    def close(self):
+        if self._archivo is not None:
+            self._archivo.close()
+
+    # --- Resultado ---
+
+    @property
+    def hash(self) -> str:
+        """Hash del contenido con el formato de imagen_service (16 hex de sha256)."""
+        return self._hash.hexdigest()[:16]
+
+    def cerrar(self):
+        """Termina la escritura: el temporal queda listo para que lo lea el pool de imágenes."""
+        if self._archivo is not None:
+            self._archivo.flush()
+            self._archivo.close()
+
+    def _liberar(self):
+        self.close()
+        self._archivo = None
+        if self.ruta:
+            try:
+                os.remove(self.ruta)
+            except OSError:
+                pass
+            self.ruta = None
+
+    def borrar(self):
+        self._liberar()
+
+
+class LoteRecibido:
+    """Partes de archivo del lote en el orden en que llegaron. Al salir del `with` se borran los temporales."""
+
+    def __init__(self, carpeta: str, max_archivos: int, max_bytes_archivo: int):
+        self.carpeta = carpeta
+        self.max_archivos = max_archivos
+        self.max_bytes_archivo = max_bytes_archivo
+        self.partes = []
+        self.form = None
+
+    def _fabrica(self, total_content_length=None, content_type=None, filename=None, content_length=None):
+        sobrante = "sobrante" if len(self.partes) >= self.max_archivos else None
+        parte = ParteEnDisco(self.carpeta, filename, self.max_bytes_archivo, descartar=sobrante)
+        self.partes.append(parte)
+        return parte
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for parte in self.partes:
+            parte.borrar()
+
+
+def recibir_lote(environ, carpeta: str, max_archivos: int = LOTE_MAX_ARCHIVOS,
+                 max_mb: float = LOTE_MAX_MB, max_mb_archivo: float = LOTE_MAX_MB_ARCHIVO) -> LoteRecibido:
+    """
+    Lee el multipart del request directo del stream WSGI, con los límites del lote.
+    Lanza RequestEntityTooLarge si el cuerpo supera max_mb y ValueError si está mal formado.
+    Usar como `with recibir_lote(...) as lote:` para que los temporales se borren siempre.
+    """
+    lote = LoteRecibido(carpeta, max_archivos, int(max_mb_archivo * 1024 * 1024))
+    parser = FormDataParser(
+        stream_factory=lote._fabrica,
+        max_form_memory_size=LOTE_MAX_MEMORIA_FORM,
+        max_content_length=int(max_mb * 1024 * 1024),
+        # Los archivos sobrantes se informan uno por uno; esto sólo corta cuerpos abusivos
+        max_form_parts=max_archivos * 2 + 100,
+        silent=False,
+    )
+    try:
+        _, lote.form, _ = parser.parse_from_environ(environ)
+    except BaseException:
+        lote.__exit__()
+        raise
+    for parte in lote.partes:
+        parte.cerrar()
+    return lote
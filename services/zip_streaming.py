@@ -0,0 +1,97 @@
+import os
+import time
+import zipfile
+
+# ----------------------------------------------------
+# ZIP EN STREAMING
+# ----------------------------------------------------
+# Arma el ZIP a medida que se envía: cada archivo se lee (o se renderiza) por
+# bloques y lo comprimido sale en trozos de ~BLOQUE bytes. ZipFile escribe sobre
+# un destino sin seek, así que usa data descriptors (tamaños y CRC después de
+# cada archivo) y nunca vuelve atrás. En memoria queda un bloque y la lista de
+# entradas del directorio central, no el sitio completo.
+
+ZIP_BLOQUE = int(os.getenv("ZIP_BLOQUE_KB", "64")) * 1024
+
+# Formatos ya comprimidos: deflate sólo gastaría CPU
+SIN_COMPRIMIR = {".webp", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".woff", ".woff2", ".gz", ".br", ".zip"}
+
+
+class _Salida:
+    """Destino write-only de ZipFile: acumula lo escrito hasta que el generador lo entrega."""
+
+    def __init__(self):
+        self._partes = []
+        self.pendiente = 0
+
+    def write(self, datos) -> int:
+        self._partes.append(bytes(datos))
+        self.pendiente += len(datos)
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes, self.pendiente = [], 0
+        return datos
+
+
+def _bloques(fuente):
+    """Una ruta de archivo se lee por bloques; cualquier otra cosa es un iterable de str/bytes."""
+    if isinstance(fuente, str):
+        with open(fuente, "rb") as f:
+            yield from iter(lambda: f.read(ZIP_BLOQUE), b"")
+        return
+    if isinstance(fuente, bytes):
+        yield fuente
+        return
+    # Los templates en stream producen miles de strings cortos: se agrupan en bloques
+    partes, tamano = [], 0
+    for parte in fuente:
+        partes.append(parte.encode("utf-8") if isinstance(parte, str) else parte)
+        tamano += len(partes[-1])
+        if tamano >= ZIP_BLOQUE:
+            yield b"".join(partes)
+            partes, tamano = [], 0
+    if partes:
+        yield b"".join(partes)
+
+
+def _info(nombre: str, fuente) -> zipfile.ZipInfo:
+    try:
+        momento = os.path.getmtime(fuente) if isinstance(fuente, str) else time.time()
+    except OSError:
+        momento = time.time()
+    info = zipfile.ZipInfo(nombre, date_time=time.localtime(max(momento, 315532800))[:6])
+    info.external_attr = 0o644 << 16
+    sin_comprimir = os.path.splitext(nombre)[1].lower() in SIN_COMPRIMIR
+    info.compress_type = zipfile.ZIP_STORED if sin_comprimir else zipfile.ZIP_DEFLATED
+    return info
+
+
+def generar_zip(entradas):
+    """
+    Generador de los bytes del ZIP. `entradas` es un iterable de (nombre_en_zip, fuente)
+    donde fuente es una ruta local, bytes o un iterable de str/bytes (p. ej. un template en stream).
+    Los archivos que desaparecen entre el listado y la lectura se omiten.
+    """
+    salida = _Salida()
+    with zipfile.ZipFile(salida, "w") as zf:
+        for nombre, fuente in entradas:
+            bloques = _bloques(fuente)
+            try:
+                primero = next(bloques, b"")  # abre el archivo antes de escribir el encabezado
+            except FileNotFoundError:
+                print(f"⚠️ {nombre} desapareció antes de la descarga, se omite")
+                continue
+            with zf.open(_info(nombre, fuente), "w") as destino:
+                destino.write(primero)
+                for bloque in bloques:
+                    if salida.pendiente >= ZIP_BLOQUE:
+                        yield salida.vaciar()
+                    destino.write(bloque)
+            if salida.pendiente >= ZIP_BLOQUE:
+                yield salida.vaciar()
+    yield salida.vaciar()  # Directorio central